@@ -0,0 +1,5 @@
+# Library version of the molecular_simulation-*.py scripts.
+# Run `python -m molecular_simulation --help` from the Python-codes folder.
+__version__ = "1.0.6"  # Part of every run cache key, change it when the results of a run change
+
+from .config import SCENARIOS, build_config, load_config_file
@@ -0,0 +1,146 @@
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from .config import build_config, dilute
+from .runner import make_simulation
+
+
+def time_steps(sim, frames):
+    """Seconds per step, measured after one warm-up step."""
+    sim.step()
+    start = time.perf_counter()
+    for _ in range(frames):
+        sim.step()
+    return (time.perf_counter() - start) / frames
+
+
+def bench_ensemble(config, replicas, frames):
+    """Ensemble of `replicas` copies against one system with replicas * NUM_DOTS dots.
+
+    The big system gets a container sqrt(replicas) times wider and taller, so both
+    runs have the same density and do the same amount of collision work per dot.
+    """
+    results = []
+    ensemble = make_simulation(config, "array", replicas)
+    results.append((f"array, {replicas} x {config['NUM_DOTS']} dots", replicas * config["NUM_DOTS"],
+                    time_steps(ensemble, frames)))
+
+    scale = math.sqrt(replicas)
+    big = build_config(config["SCENARIO"], {
+        key: value for key, value in config.items()
+        if key not in ("SCENARIO", "CONTAINER_WIDTH", "CONTAINER_HEIGHT", "PARTITION_X", "CELL_SIZE", "HGRID_LEVELS")
+    }, {
+        "NUM_DOTS": replicas * config["NUM_DOTS"],
+        "CONTAINER_WIDTH": int(config["CONTAINER_WIDTH"] * scale),
+        "CONTAINER_HEIGHT": int(config["CONTAINER_HEIGHT"] * scale),
+    })
+    single = make_simulation(big, "array", 1)
+    results.append((f"array, 1 x {big['NUM_DOTS']} dots", big["NUM_DOTS"], time_steps(single, frames)))
+    return results
+
+
+def bench_reorder(config, replicas, frames, every):
+    """Steps with the dot arrays in random order against reordering them every `every` frames.
+
+    The arrays start in random order (the initial positions are random), which is what
+    an unsorted run looks like once the gas has mixed.
+    """
+    results = []
+    for label, curve, reorder_every in (("no reordering", "morton", 0),
+                                        (f"morton order every {every}", "morton", every),
+                                        (f"cell order every {every}", "cell", every)):
+        sim = make_simulation(build_config(config["SCENARIO"], {
+            key: value for key, value in config.items() if key != "SCENARIO"
+        }, {"REORDER_EVERY": reorder_every, "REORDER_CURVE": curve}), "array", replicas)
+        if reorder_every:
+            sim.reorder()  # Start sorted, like a run that has been reordering all along
+        results.append((f"{label}, {replicas} x {config['NUM_DOTS']}", replicas * config["NUM_DOTS"],
+                        time_steps(sim, frames)))
+        if reorder_every:
+            # Cost of one reorder on its own, already included above once every `every` frames
+            start = time.perf_counter()
+            sim.reorder()
+            results.append((f"  one {curve} reorder", replicas * config["NUM_DOTS"], time.perf_counter() - start))
+    return results
+
+
+def bench_broad_phase(config, replicas, frames):
+    """Every pair search backend on the same system, then "auto" with what it picked."""
+    from .broadphase import BACKENDS, kdtree_available
+
+    results = []
+    for backend in BACKENDS + ("auto",):
+        if backend == "kdtree" and not kdtree_available():
+            continue
+        if backend == "sweep" and not dilute(config):
+            continue
+        sim = make_simulation(build_config(config["SCENARIO"], {
+            key: value for key, value in config.items() if key != "SCENARIO"
+        }, {"BROAD_PHASE": backend}), "array", replicas)
+        seconds = time_steps(sim, frames)
+        if sim.selector is not None:
+            backend = f"auto ({', '.join(sim.selector.summary())})"
+        results.append((f"{backend}, {replicas} x {config['NUM_DOTS']}", replicas * config["NUM_DOTS"], seconds))
+    return results
+
+
+# --- Worker Startup ---
+# A headless worker only needs the physics: numpy and the engine. It is timed in a
+# fresh interpreter, from the start of the imports to the end of the first step, and
+# checked for the display and video libraries, which it must never load.
+STARTUP_BUDGET = 0.5  # Seconds
+HEAVY_MODULES = ("pygame", "cv2")
+
+WORKER = """
+import json, sys, time
+start = time.perf_counter()
+from molecular_simulation.config import build_config
+from molecular_simulation.runner import make_simulation
+imported = time.perf_counter()
+sim = make_simulation(build_config({scenario!r}, {values!r}), {engine!r})
+built = time.perf_counter()
+sim.step()
+stepped = time.perf_counter()
+print(json.dumps({{"import": imported - start, "build": built - imported, "step": stepped - built,
+                  "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def bench_startup(config, engine="array", runs=5):
+    """Median import, build and first step times of a headless worker in a fresh interpreter."""
+    values = {key: value for key, value in config.items() if key != "SCENARIO"}
+    code = WORKER.format(scenario=config["SCENARIO"], values=values, engine=engine, heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, [os.path.dirname(os.path.dirname(os.path.abspath(__file__))), os.environ.get("PYTHONPATH")])))
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        sample["process"] = time.perf_counter() - start  # Interpreter start and exit included
+        samples.append(sample)
+    timings = {key: statistics.median(sample[key] for sample in samples) for key in ("import", "build", "step", "process")}
+    timings["heavy"] = sorted({name for sample in samples for name in sample["heavy"]})
+    return timings
+
+
+def print_startup(timings, budget=STARTUP_BUDGET):
+    """Prints the startup times, returns True when the worker is within budget and loads no display / video library."""
+    to_first_step = timings["import"] + timings["build"] + timings["step"]
+    print(f"imports {timings['import'] * 1000:.0f} ms, build {timings['build'] * 1000:.0f} ms, "
+          f"first step {timings['step'] * 1000:.0f} ms, whole process {timings['process'] * 1000:.0f} ms")
+    ok = to_first_step <= budget and not timings["heavy"]
+    print(f"to the first step: {to_first_step * 1000:.0f} ms (budget {budget * 1000:.0f} ms), "
+          f"loaded {', '.join(timings['heavy']) or 'no display / video library'}  {'ok' if ok else 'FAIL'}")
+    return ok
+
+
+def print_results(results):
+    print(f"{'run':34} {'ms/frame':>10} {'dot-frames/s':>14}")
+    for name, dots, seconds in results:
+        print(f"{name:34} {seconds * 1000:10.2f} {dots / seconds:14.3g}")
@@ -0,0 +1,98 @@
+import importlib.util
+import time
+
+from . import spatial
+from .config import dilute
+
+# Backends the array engine can search pairs with. The grid, sort and sweep and the
+# KD-tree give the same pairs (the same or neighbouring CELL_SIZE cells), and the
+# hierarchical grid every pair those can touch, so they only differ in speed: a run
+# is the same whichever one is used, and "auto" can switch between them at any frame.
+BACKENDS = ("grid", "hgrid", "sweep", "kdtree")
+DRIFT = 2.0  # "auto" measures again when the candidate pairs per frame change by more than this factor
+
+
+def kdtree_available():
+    """Whether SciPy is installed, without importing it."""
+    return importlib.util.find_spec("scipy") is not None
+
+
+def search(backend, x, y, radius, config, width, height, group=None, n_groups=1):
+    """Candidate pairs (i, j) from one of BACKENDS."""
+    cell_size = config["CELL_SIZE"]
+    if backend == "grid":
+        return spatial.find_pairs(x, y, cell_size, width, height, group, n_groups)
+    if backend == "hgrid":
+        return spatial.find_pairs_hierarchical(x, y, radius, cell_size, config["HGRID_LEVELS"],
+                                               width, height, group, n_groups)
+    if backend == "sweep":
+        return spatial.sweep_pairs(x, y, cell_size, width, height, group, n_groups)
+    if backend == "kdtree":
+        return spatial.kdtree_pairs(x, y, cell_size, width, height, group, n_groups)
+    raise ValueError(f"Unknown broad phase backend {backend!r}, choose from: {', '.join(BACKENDS)}")
+
+
+def shortlist(config):
+    """Backends worth timing for a system: the grid always, sort and sweep when there are
+    more cells than dots (dilute), the hierarchical grid when the sizes span several
+    levels, and the KD-tree when SciPy is there."""
+    names = ["grid"]
+    if dilute(config):
+        names.append("sweep")
+    if config["HGRID_LEVELS"] > 1:
+        names.append("hgrid")
+    if kdtree_available():
+        names.append("kdtree")
+    return names
+
+
+# --- Automatic Selection ---
+# BROAD_PHASE = "auto" times every shortlisted backend on the current state, the pair
+# search and the distance test of its candidates, and uses the fastest. The choice is
+# measured again every BROAD_PHASE_EVERY frames, or sooner when the number of candidates
+# drifts (the gas condenses, a partition opens), since that is what the costs follow.
+class BroadPhaseSelector:
+    def __init__(self, config, drift=DRIFT):
+        self.backends = shortlist(config)
+        self.every = config["BROAD_PHASE_EVERY"]
+        self.drift = drift
+        self.current = None
+        self.selected_frame = None
+        self.selected_candidates = None
+        self.history = []  # (frame, backend, {backend: seconds})
+
+    def choose(self, sim):
+        """The backend for this frame, measured again when it is due."""
+        if self.current is None or sim.frame - self.selected_frame >= self.every:
+            self.select(sim)
+        return self.current
+
+    def observe(self, candidates):
+        """Candidate pairs the chosen backend found this frame: a large drift asks for a new measurement."""
+        if self.selected_candidates is None:
+            return
+        low, high = sorted((max(candidates, 1), max(self.selected_candidates, 1)))
+        if high > self.drift * low:
+            self.selected_frame = -self.every  # Due on the next frame
+
+    def select(self, sim):
+        timings = {}
+        counts = {}
+        for backend in self.backends:
+            start = time.perf_counter()
+            i, j = sim.find_pairs(backend)
+            dx, dy, _ = sim.separation(i, j)
+            (dx**2 + dy**2 < sim.contact_distance(i, j)**2).sum()
+            timings[backend] = time.perf_counter() - start
+            counts[backend] = len(i)
+        self.current = min(timings, key=timings.get)
+        self.selected_frame = sim.frame
+        self.selected_candidates = counts[self.current]
+        self.history.append((sim.frame, self.current, timings))
+
+    def summary(self):
+        """How many times each backend was chosen."""
+        chosen = {}
+        for _, backend, _ in self.history:
+            chosen[backend] = chosen.get(backend, 0) + 1
+        return chosen
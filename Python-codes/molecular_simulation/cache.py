@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from . import __version__
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "molecular_simulation")
+DEFAULT_MAX_BYTES = 2 * 1000**3
+# Options of runner.run that only say where the files go, or how the window looks
+PATH_OPTIONS = ("observables", "manifest", "trajectory")
+DISPLAY_OPTIONS = ("headless", "preview_every", "preview_scale", "target_fps")
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def run_key(config, options):
+    """Hash of everything that decides a run's results, None when they aren't reproducible.
+
+    That is the config (but not the video's file name), the runner.run options (only
+    whether each file is written, not where), the seed or generator state and the
+    package version. A run in a window, without a frame limit or without a seed is
+    never the same twice.
+    """
+    if not options.get("headless") or options.get("frames") is None:
+        return None
+    if options.get("seed") is None and options.get("rng_state") is None:
+        return None
+    payload = {
+        "version": __version__,
+        "config": {key: value for key, value in config.items() if key != "OUTPUT"},
+        "options": {key: (value is not None) if key in PATH_OPTIONS else value
+                    for key, value in options.items() if key not in DISPLAY_OPTIONS},
+    }
+    text = json.dumps(payload, sort_keys=True, default=_json_default)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# --- Run Cache ---
+# One folder per run key under `directory`: result.json (what runner.run returned) and
+# the files the run wrote (video, observables, manifest, trajectory, clips). A folder is
+# built next to the others and renamed into place, so a half written entry is never
+# seen. Reading an entry touches its result.json; when the cache grows past `max_bytes`
+# the entries used longest ago go first.
+class RunCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def load(self, key):
+        """(result, {role: stored file}) of a cached run, None when it isn't there."""
+        entry = self.path(key)
+        try:
+            with open(os.path.join(entry, "result.json")) as f:
+                stored = json.load(f)
+            os.utime(os.path.join(entry, "result.json"))
+        except (OSError, ValueError):
+            return None
+        files = {role: os.path.join(entry, name) for role, name in stored["files"].items()}
+        return stored["result"], files
+
+    def store(self, key, result, files):
+        """Adds a run: its result and the files {role: path} it wrote. Returns False when it doesn't fit."""
+        size = sum(os.path.getsize(path) for path in files.values())
+        if size > self.max_bytes:
+            return False
+        os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+        building = tempfile.mkdtemp(prefix=".building-", dir=self.directory)
+        try:
+            names = {}
+            for role, path in files.items():
+                names[role] = role + os.path.splitext(path)[1]
+                shutil.copyfile(path, os.path.join(building, names[role]))
+            with open(os.path.join(building, "result.json"), "w") as f:
+                json.dump({"key": key, "result": result, "files": names}, f, default=_json_default)
+            try:
+                os.rename(building, self.path(key))
+            except OSError:
+                pass  # Another run stored the same key first
+        finally:
+            shutil.rmtree(building, ignore_errors=True)
+        self.evict()
+        return True
+
+    def entries(self):
+        """(last used, bytes, folder) of every entry, least recently used first."""
+        entries = []
+        for prefix in os.listdir(self.directory):
+            folder = os.path.join(self.directory, prefix)
+            if prefix.startswith(".") or not os.path.isdir(folder):
+                continue
+            for key in os.listdir(folder):
+                entry = os.path.join(folder, key)
+                try:
+                    last_used = os.path.getmtime(os.path.join(entry, "result.json"))
+                    size = sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+                except OSError:
+                    continue
+                entries.append((last_used, size, entry))
+        return sorted(entries)
+
+    def evict(self, max_bytes=None):
+        """Removes the least recently used entries until the cache fits, returns how many went."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        return self.evict(0)
+
+
+def _output_files(config, options, result):
+    """{role: path} of the files a run writes, as runner.run names them."""
+    files = {"output": result["output"], "observables": options.get("observables"),
+             "manifest": result["manifest"], "trajectory": result["trajectory"]}
+    files.update({f"clip_{frame:06d}": path for frame, path in zip(result["clip_frames"], result["clips"])})
+    return {role: path for role, path in files.items() if path and os.path.exists(path)}
+
+
+def cached_run(cache, config, **options):
+    """runner.run, unless the cache has a run with the same key.
+
+    Then its files are copied to where this run would have written them and its
+    result comes back with "cache" = "hit" (a new run has "miss", one that can't be
+    cached None).
+    """
+    from .manifest import default_manifest_path
+    from .replay import clip_path
+    from .runner import run
+
+    key = run_key(config, options)
+    cached = cache.load(key) if key is not None else None
+    if cached is None:
+        result = run(config, **options)
+        result["cache"] = None
+        if key is not None:
+            cache.store(key, result, _output_files(config, options, result))
+            result["cache"] = "miss"
+        return result
+
+    start = time.perf_counter()
+    result, files = cached
+    targets = {
+        "output": config["OUTPUT"] if config["RECORD_VIDEO"] else None,
+        "observables": options.get("observables"),
+        "manifest": options.get("manifest") or default_manifest_path(config, options.get("observables")),
+        "trajectory": options.get("trajectory"),
+    }
+    targets.update({f"clip_{frame:06d}": clip_path(config, frame) for frame in result["clip_frames"]})
+    for role, stored in files.items():
+        if targets.get(role) is None:
+            continue
+        if role == "manifest":
+            # The same run, but the video's file name may differ
+            with open(stored) as f:
+                manifest = json.load(f)
+            manifest["config"]["OUTPUT"] = config["OUTPUT"]
+            with open(targets[role], "w") as f:
+                json.dump(manifest, f, indent=2)
+        else:
+            shutil.copyfile(stored, targets[role])
+    result.update(output=targets["output"], observables=targets["observables"], trajectory=targets["trajectory"],
+                  manifest=targets["manifest"] if "manifest" in files else None,
+                  clips=[targets[f"clip_{frame:06d}"] for frame in result["clip_frames"]],
+                  wall_seconds=time.perf_counter() - start, cache="hit")
+    return result
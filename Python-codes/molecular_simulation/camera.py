@@ -0,0 +1,84 @@
+import numpy as np
+
+ZOOM_STEP = 1.25
+PAN_STEP = 0.1  # Share of the view moved by one key press
+
+
+# --- Camera ---
+# The container has its own units (CONTAINER_WIDTH x CONTAINER_HEIGHT) and the frames
+# are WIDTH x HEIGHT pixels. The camera shows the VIEW rectangle of the container,
+# scaled to fit the frame, and moves it at VIEW_VELOCITY. Without VIEW it shows the
+# whole container, shrunk to fit the frame but never enlarged, so a container the
+# size of the frame is drawn 1:1. The view stays inside the container, or around
+# all of it when it is larger.
+class Camera:
+    def __init__(self, config, frame_size):
+        self.container = (config["CONTAINER_WIDTH"], config["CONTAINER_HEIGHT"])
+        self.frame_size = frame_size
+        frame_width, frame_height = frame_size
+        if config["VIEW"] is None:
+            x, y, width, height = 0.0, 0.0, *self.container
+            self.home_scale = min(1.0, frame_width / width, frame_height / height)
+        else:
+            x, y, width, height = config["VIEW"]
+            self.home_scale = min(frame_width / width, frame_height / height)
+        self.home = (float(x), float(y))
+        self.velocity = config["VIEW_VELOCITY"]
+        self.offset = (0.0, 0.0)  # Moved by hand, on top of the panning
+        self.scale = self.home_scale
+        self.x, self.y = self.home
+
+    @property
+    def size(self):
+        """Width and height of the view in container units."""
+        return self.frame_size[0] / self.scale, self.frame_size[1] / self.scale
+
+    def update(self, seconds):
+        """Places the view for a simulated time."""
+        x = self.home[0] + self.velocity[0] * seconds + self.offset[0]
+        y = self.home[1] + self.velocity[1] * seconds + self.offset[1]
+        self.x = self._clamp(x, self.size[0], self.container[0])
+        self.y = self._clamp(y, self.size[1], self.container[1])
+        # Panning by hand past an edge doesn't pile up
+        self.offset = (self.offset[0] + self.x - x, self.offset[1] + self.y - y)
+
+    @staticmethod
+    def _clamp(start, length, container_length):
+        # A view larger than the container keeps all of it in view
+        low, high = sorted((0.0, container_length - length))
+        return min(max(start, low), high)
+
+    def to_screen(self, x, y):
+        """Container coordinates to pixels of the frame."""
+        return (x - self.x) * self.scale, (y - self.y) * self.scale
+
+    def visible(self, x, y, margin=0.0):
+        """Mask of the points within `margin` of the view."""
+        width, height = self.size
+        return ((x > self.x - margin) & (x < self.x + width + margin)
+                & (y > self.y - margin) & (y < self.y + height + margin))
+
+    def region(self):
+        """(x0, y0, x1, y1): the part of the container in view."""
+        width, height = self.size
+        return (max(self.x, 0.0), max(self.y, 0.0),
+                min(self.x + width, self.container[0]), min(self.y + height, self.container[1]))
+
+    # --- Moving by hand ---
+    def pan(self, right, down):
+        """Moves the view by a share of its size."""
+        width, height = self.size
+        self.offset = (self.offset[0] + right * width, self.offset[1] + down * height)
+
+    def zoom(self, factor):
+        """Zooms around the middle of the view."""
+        width, height = self.size
+        middle = (self.x + width / 2, self.y + height / 2)
+        self.scale = float(np.clip(self.scale * factor, self.home_scale / 64, self.home_scale * 64))
+        width, height = self.size
+        # Keep the middle where it was, whatever the panning adds
+        self.offset = (self.offset[0] + middle[0] - width / 2 - self.x, self.offset[1] + middle[1] - height / 2 - self.y)
+
+    def reset(self):
+        self.scale = self.home_scale
+        self.offset = (0.0, 0.0)
@@ -0,0 +1,284 @@
+import argparse
+
+from .cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from .config import SCENARIOS, build_config, load_config_file, parse_overrides
+from .convergence import STEADY_ACTIONS
+from .manifest import read_manifest
+from .observables import OBSERVABLES
+from .runner import ENGINES
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m molecular_simulation",
+        description="Run the molecular simulation scenarios without editing the scripts.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="list the scenarios and their output files")
+
+    run = commands.add_parser("run", help="run a scenario")
+    run.add_argument("scenario", nargs="?", choices=list(SCENARIOS),
+                     help="scenario to run (can also come from the config file)")
+    run.add_argument("-c", "--config", help="TOML or YAML file with scenario constants")
+    run.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE",
+                     help="override one constant, e.g. --set NUM_DOTS=500 (repeatable)")
+    limit = run.add_mutually_exclusive_group()
+    limit.add_argument("--frames", type=int, help="stop after this many frames")
+    limit.add_argument("--duration", type=float, help="stop after this many simulated seconds")
+    run.add_argument("--headless", action="store_true", help="no window, run as fast as possible")
+    run.add_argument("-o", "--output", help="video file to write (turns recording on)")
+    run.add_argument("--no-video", action="store_true", help="don't record a video")
+    run.add_argument("--engine", choices=ENGINES, default="reference",
+                     help="reference: per-dot Python loop, array: vectorized numpy kernels")
+    run.add_argument("--replicas", type=int, default=1,
+                     help="run an ensemble of independent copies in lockstep (array engine)")
+    run.add_argument("--observables", metavar="FILE.npz",
+                     help="save per-replica and ensemble averaged observables (array engine)")
+    run.add_argument("--sample-every", type=int, help="frames between observable samples (default: FPS)")
+    run.add_argument("--seed", type=int, help="seed for the random generator (default: a fresh one, saved in the manifest)")
+    run.add_argument("--manifest", metavar="FILE.json",
+                     help="where to save the run manifest (default: next to the video or observables)")
+    run.add_argument("--replay", metavar="FILE.json",
+                     help="run again exactly like the run that wrote this manifest")
+    run.add_argument("--transport", action="store_true",
+                     help="estimate the thermal conductivity / viscosity from the wall fluxes (array engine)")
+    run.add_argument("--target-precision", type=float, metavar="REL",
+                     help="stop once the transport estimates' 95%% interval is within REL of the value, e.g. 0.05")
+    run.add_argument("--warmup", type=float, default=0.0, metavar="SECONDS",
+                     help="simulated seconds to skip before estimating transport coefficients")
+    run.add_argument("--until-steady", action="store_true",
+                     help="watch the profiles and stop (or start sampling) once they stop changing (array engine)")
+    run.add_argument("--steady-on", action="append", choices=list(OBSERVABLES), metavar="NAME",
+                     help="observable to watch for --until-steady (repeatable, default: picked from the scenario)")
+    run.add_argument("--steady-window", type=int, default=10,
+                     help="samples per window compared by the drift test (default 10)")
+    run.add_argument("--steady-tolerance", type=float, default=0.02, metavar="REL",
+                     help="drift below this fraction of the observable's size counts as steady (default 0.02)")
+    run.add_argument("--steady-action", choices=STEADY_ACTIONS, default="stop",
+                     help="stop: end the run when steady, sample: only record observables / transport from then on")
+    run.add_argument("--preview-every", type=int, metavar="K",
+                     help="show every K-th frame in the window (default: adapt K to keep up with --target-fps)")
+    run.add_argument("--preview-scale", type=float, default=1.0,
+                     help="size of the window relative to the video, e.g. 0.5")
+    run.add_argument("--target-fps", type=float,
+                     help="frames per second the run should keep up with in a window (default: FPS)")
+    run.add_argument("--pipeline", action="store_true",
+                     help="draw and encode the video in a second process, fed through shared memory (headless)")
+    run.add_argument("--sample-duration", type=float, metavar="SECONDS",
+                     help="with --steady-action sample, stop this much simulated time after the steady state")
+    run.add_argument("--replay-buffer", type=float, metavar="SECONDS",
+                     help="keep the last SECONDS of simulated time in memory, saved as a clip with --clip-at or C in the window")
+    run.add_argument("--trajectory", metavar="FILE.traj",
+                     help="save every frame in the compact trajectory format (see the trajectory command)")
+    run.add_argument("--clip-at", type=float, action="append", default=[], metavar="SECONDS",
+                     help="save the replay buffer as a clip at this simulated time (repeatable)")
+    run.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_DIR, metavar="DIR",
+                     help=f"reuse the results of the same headless, seeded run (default folder {DEFAULT_CACHE_DIR})")
+    run.add_argument("--cache-size", type=float, default=DEFAULT_MAX_BYTES / 1e6, metavar="MB",
+                     help="evict the least recently used runs beyond this size (default %(default).0f)")
+
+    cache = commands.add_parser("cache", help="size of the run cache, or shrink / empty it")
+    cache.add_argument("--dir", default=DEFAULT_CACHE_DIR)
+    cache.add_argument("--max-size", type=float, metavar="MB", help="evict the least recently used runs beyond this size")
+    cache.add_argument("--clear", action="store_true", help="remove every cached run")
+
+    bench = commands.add_parser("bench", help="time an ensemble against one big system")
+    bench.add_argument("scenario", choices=list(SCENARIOS))
+    bench.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE")
+    bench.add_argument("--replicas", type=int, default=64)
+    bench.add_argument("--frames", type=int, default=20)
+    bench.add_argument("--reorder", type=int, metavar="EVERY",
+                       help="time reordering the dot arrays every EVERY frames instead of the ensemble")
+    bench.add_argument("--broad-phase", action="store_true",
+                       help="time every pair search backend and what BROAD_PHASE = auto picks")
+    bench.add_argument("--startup", action="store_true",
+                       help="time a headless worker from import to its first step in a fresh interpreter")
+    bench.add_argument("--budget", type=float, default=None, metavar="SECONDS",
+                       help="startup time allowed with --startup (default 0.5)")
+
+    precision = commands.add_parser("precision", help="check float32 energy / momentum drift against float64")
+    precision.add_argument("scenario", choices=list(SCENARIOS))
+    precision.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE")
+    precision.add_argument("--frames", type=int, default=600)
+    precision.add_argument("--sample-every", type=int, default=60)
+    precision.add_argument("--seed", type=int, default=0)
+
+    trajectory = commands.add_parser("trajectory", help="size and decode speed of a trajectory file, or draw it to a video")
+    trajectory.add_argument("file", metavar="FILE.traj")
+    trajectory.add_argument("--render", metavar="OUTPUT.mp4", help="draw the frames to this video")
+    trajectory.add_argument("--chunks", type=int, nargs=2, metavar=("FIRST", "LAST"),
+                            help="only draw chunks FIRST .. LAST - 1")
+
+    validate = commands.add_parser("validate", help="check a fast engine against the reference Dot loop")
+    validate.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                          help="scenarios to check (default: every one the reference engine can run)")
+    validate.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE")
+    validate.add_argument("--engine", choices=[engine for engine in ENGINES if engine != "reference"], default="array")
+    validate.add_argument("--dots", type=int, default=200,
+                          help="dots per run, the container shrinks to keep the density (default 200)")
+    validate.add_argument("--short-frames", type=int, default=30, help="frames of dot by dot comparison (default 30)")
+    validate.add_argument("--long-frames", type=int, default=600,
+                          help="frames per run for the statistics (default 600)")
+    validate.add_argument("--seeds", type=int, default=4, help="runs per engine for the statistics (default 4)")
+    validate.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def config_from_args(args, manifest=None):
+    file_values = {}
+    scenario = args.scenario
+    if manifest is not None:
+        scenario, file_values = manifest["scenario"], manifest["config"]
+    elif args.config:
+        file_scenario, file_values = load_config_file(args.config)
+        scenario = scenario or file_scenario
+    if scenario is None:
+        raise ValueError("No scenario given, pass one on the command line or set `scenario` in the config file")
+
+    overrides = parse_overrides(args.overrides)
+    if args.output:
+        overrides["OUTPUT"] = args.output
+        overrides["RECORD_VIDEO"] = True
+    if args.no_video:
+        overrides["RECORD_VIDEO"] = False
+    return build_config(scenario, file_values, overrides)
+
+
+def seconds_to_frames(seconds, config):
+    """Output frames that cover this much simulated time."""
+    frame_time = config["STEPS_PER_FRAME"] * config["TIME_STEP"]  # Simulated frames per output frame
+    return int(round(seconds * config["FPS"] / frame_time))
+
+
+def frame_limit(args, config):
+    if args.frames is not None:
+        return args.frames
+    if args.duration is not None:
+        return seconds_to_frames(args.duration, config)
+    return None
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name in SCENARIOS:
+            config = build_config(name)
+            print(f"{name:22} {config['NUM_DOTS']:6} dots  -> {config['OUTPUT']}")
+        return 0
+
+    if args.command == "trajectory":
+        from .trajectory import TrajectoryReader, print_trajectory_report, trajectory_report
+        try:
+            print_trajectory_report(trajectory_report(args.file))
+        except (ValueError, OSError) as e:
+            parser.error(str(e))
+        if args.render:
+            from .replay import render_frames
+            with TrajectoryReader(args.file) as reader:
+                first, last = args.chunks or (0, reader.chunks)
+                written = render_frames(reader.config, reader.iter_frames(first, last), args.render)
+            print(f"Drew {written} frames")
+        return 0
+
+    if args.command == "cache":
+        from .cache import RunCache
+        run_cache = RunCache(args.dir)
+        if args.clear or args.max_size is not None:
+            removed = run_cache.evict(0 if args.clear else args.max_size * 1e6)
+            print(f"Removed {removed} run(s)")
+        entries = run_cache.entries()
+        print(f"{len(entries)} run(s), {sum(size for _, size, _ in entries) / 1e6:.1f} MB in {run_cache.directory}")
+        return 0
+
+    if args.command == "validate":
+        from .validation import compare_engines, print_engine_report
+        try:
+            configs = [build_config(name, parse_overrides(args.overrides)) for name in args.scenarios or SCENARIOS]
+        except ValueError as e:
+            parser.error(str(e))
+        # The reference engine only has walls
+        configs = [config for config in configs if config["BOUNDARY"] == "walls"]
+        passed = True
+        for config in configs:
+            report = compare_engines(config, args.engine, args.dots, args.short_frames, args.long_frames,
+                                     args.seeds, args.seed)
+            print_engine_report(report)
+            passed = passed and report["ok"]
+        return 0 if passed else 1
+
+    if args.command in ("bench", "precision"):
+        try:
+            config = build_config(args.scenario, parse_overrides(args.overrides))
+        except ValueError as e:
+            parser.error(str(e))
+        if args.command == "bench":
+            from .bench import (STARTUP_BUDGET, bench_broad_phase, bench_ensemble, bench_reorder, bench_startup,
+                                print_results, print_startup)
+            if args.startup:
+                return 0 if print_startup(bench_startup(config), args.budget or STARTUP_BUDGET) else 1
+            if args.broad_phase:
+                print_results(bench_broad_phase(config, args.replicas, args.frames))
+            elif args.reorder:
+                print_results(bench_reorder(config, args.replicas, args.frames, args.reorder))
+            else:
+                print_results(bench_ensemble(config, args.replicas, args.frames))
+        else:
+            from .validation import precision_report, print_precision_report
+            rows, memory = precision_report(config, args.frames, args.seed, args.sample_every)
+            print_precision_report(rows, memory)
+        return 0
+
+    manifest = None
+    try:
+        if args.replay:
+            manifest = read_manifest(args.replay)
+        config = config_from_args(args, manifest)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    rng_state = None
+    if manifest is not None:
+        args.engine, args.replicas = manifest["engine"], manifest["replicas"]
+        rng_state = manifest["rng_state"]
+        args.seed = manifest["seed"]
+        if args.frames is None and args.duration is None:
+            args.frames = manifest["frames"]
+    transport = args.transport or args.target_precision is not None
+    if args.replicas > 1 or args.observables or transport or args.until_steady or config["BOUNDARY"] != "walls":
+        args.engine = "array"
+    frames = frame_limit(args, config)
+    if args.headless and frames is None:
+        parser.error("headless runs need --frames or --duration")
+    if args.clip_at and not args.replay_buffer:
+        parser.error("--clip-at needs --replay-buffer")
+
+    options = dict(frames=frames, headless=args.headless, engine=args.engine,
+                   replicas=args.replicas, observables=args.observables, sample_every=args.sample_every,
+                   seed=args.seed, rng_state=rng_state, manifest=args.manifest, transport=transport,
+                   target_precision=args.target_precision, warmup_frames=seconds_to_frames(args.warmup, config),
+                   until_steady=args.until_steady, steady_observables=args.steady_on, steady_window=args.steady_window,
+                   steady_tolerance=args.steady_tolerance, steady_action=args.steady_action,
+                   sample_frames=None if args.sample_duration is None else seconds_to_frames(args.sample_duration, config),
+                   preview_every=args.preview_every, preview_scale=args.preview_scale, target_fps=args.target_fps,
+                   pipeline=args.pipeline,
+                   replay_frames=seconds_to_frames(args.replay_buffer, config) if args.replay_buffer else None,
+                   clip_frames=[seconds_to_frames(seconds, config) for seconds in args.clip_at],
+                   trajectory=args.trajectory)
+    if args.cache:
+        from .cache import RunCache, cached_run
+        result = cached_run(RunCache(args.cache, args.cache_size * 1e6), config, **options)
+        if result["cache"] is None:
+            print("Not cached: only headless runs with a frame limit and a seed are reproducible")
+    else:
+        from .runner import run
+        result = run(config, **options)
+    source = " (from the cache)" if result.get("cache") == "hit" else ""
+    print(f"{result['scenario']} ({result['engine']} engine, {result['replicas']} replica(s)): {result['frames']} frames "
+          f"({result['simulated_seconds']:.1f} s simulated) in {result['wall_seconds']:.1f} s{source}, seed {result['seed']}")
+    if result["manifest"]:
+        print(f"Run manifest saved to {result['manifest']}")
+    if result["transport"] is not None:
+        from .transport import print_estimates
+        print_estimates(result["transport"])
+    return 0
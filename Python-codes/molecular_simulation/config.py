@@ -0,0 +1,428 @@
+import ast
+import math
+import os
+
+# --- Common Constants ---
+# Every scenario starts from these values, the names are the same constants the
+# standalone molecular_simulation-*.py scripts use at module level.
+COMMON = {
+    # Screen / container
+    "WIDTH": 1920,
+    "HEIGHT": 1080,
+    "CONTAINER_WIDTH": None,  # None -> same as WIDTH
+    "CONTAINER_HEIGHT": None,  # None -> same as HEIGHT
+    "FPS": 60,
+    "STEPS_PER_FRAME": 1,  # Physics steps per output (drawn / recorded) frame
+    "TIME_STEP": 1.0,  # How far one physics step moves the dots, in frames (0.25 = a quarter of a frame)
+    "CAPTION": "Molecular Movement Simulation",
+
+    # Dots
+    "NUM_DOTS": 2500,
+    "MIN_DOT_RADIUS": 1,
+    "MAX_DOT_RADIUS": 5,
+    "MASS_MODEL": "equal",  # "equal" (all masses 1) or "area" (mass = radius**2)
+    "INITIAL_VELOCITY": "box",  # "box": uniform(-range, range) per axis, "polar": random angle
+    "INITIAL_SPEED_RANGE": 5.0,
+    "INITIAL_AVERAGE_SPEED": 0.1,
+    "SPAWN_REGION": "all",  # "all", "left" or "right" of the partition
+    # Mixtures: one dict per species with its "radius" and optionally "mass" (None -> MASS_MODEL),
+    # "color", "fraction" of the dots and "region" ("all", "left" or "right" of PARTITION_X).
+    # Empty: one species with random radii between MIN_DOT_RADIUS and MAX_DOT_RADIUS
+    "SPECIES": (),
+
+    # Collisions
+    # "impulse": plain equal-mass impulse (base / spatial / partition)
+    # "separate": impulse only when approaching, then push the dots apart (partition-middle / temperature-increase)
+    # "resolve": push the dots apart first, then mass weighted impulse (thermal-conductivity / viscosity)
+    "COLLISION_MODEL": "impulse",
+    "DEDUPE_PAIRS": False,  # Resolve each pair once per frame instead of once from each side
+    "PRECISION": "float64",  # Array engine state: "float64" or "float32"
+    # "grid", "all" (every dot against every dot, like the base script) or, array engine only,
+    # "hgrid" (grids of CELL_SIZE / 2**k cells, each dot on the level that fits its radius),
+    # "sweep" (sort along x, dilute systems only), "kdtree" (needs SciPy) or "auto" (times them and picks the fastest)
+    "BROAD_PHASE": "grid",
+    "BROAD_PHASE_EVERY": 600,  # "auto": frames between two measurements of the backends
+    "CELL_SIZE": None,  # None -> CELL_SIZE_FACTOR * MAX_DOT_RADIUS
+    "CELL_SIZE_FACTOR": 4.0,
+    "HGRID_LEVELS": None,  # None -> enough for MIN_DOT_RADIUS, no finer than the mean distance between dots
+    "THREADS": 1,  # Array engine: threads for the pair search and the collision rounds
+    # Array engine: sort the dot arrays by position every REORDER_EVERY frames (0 = never),
+    # along a "morton" (Z-order) curve or "cell" by cell
+    "REORDER_EVERY": 0,
+    "REORDER_CURVE": "morton",
+
+    # Walls: "flip" (reverse speed), "clamp" (reverse speed and stop sticking),
+    # "specular" (point speed back inside), "hot" / "cold" (thermal walls), "moving" (top wall shear),
+    # "diffuse" (new random speed from the wall's temperature, Maxwell wall)
+    "LEFT_WALL": "flip",
+    "RIGHT_WALL": "flip",
+    "TOP_WALL": "flip",
+    "BOTTOM_WALL": "flip",
+    "HOT_WALL_TARGET_SPEED": 5.0,
+    "COLD_WALL_TARGET_SPEED": 1.0,
+    "SPEED_RANDOM_FACTOR": 0.2,
+    "TOP_WALL_VELOCITY_X": 10.0,
+    # Speed along the wall of "moving" and "diffuse" walls, and the temperature of
+    # "diffuse" walls (mass * speed**2 per direction, mass 1 for MASS_MODEL "equal")
+    "LEFT_WALL_VELOCITY": 0.0,
+    "RIGHT_WALL_VELOCITY": 0.0,
+    "TOP_WALL_VELOCITY": None,  # None -> TOP_WALL_VELOCITY_X
+    "BOTTOM_WALL_VELOCITY": 0.0,
+    "LEFT_WALL_TEMPERATURE": 1.0,
+    "RIGHT_WALL_TEMPERATURE": 1.0,
+    "TOP_WALL_TEMPERATURE": 1.0,
+    "BOTTOM_WALL_TEMPERATURE": 1.0,
+
+    # "walls" or "lees-edwards": periodic box without walls, the copies above and below
+    # slide past at SHEAR_VELOCITY (array engine)
+    "BOUNDARY": "walls",
+    "SHEAR_VELOCITY": None,  # None -> TOP_WALL_VELOCITY_X
+    "SHEAR_THERMOSTAT": True,  # Remove the heat made by shearing
+
+    # Partition: None, "gate" (one sided, dots are kept right of PARTITION_X)
+    # or "slab" (PARTITION_THICKNESS wide wall that blocks both sides)
+    "PARTITION": None,
+    "PARTITION_X": None,  # None -> middle of the container
+    "PARTITION_THICKNESS": 2,
+    "PARTITION_DURATION_MS": 0,
+    # More obstacles (walls, baffles, nozzles, ...), each one a dict with "segment": (x1, y1, x2, y2)
+    # or "rect": (x, y, width, height), and optionally "from_ms" / "until_ms" and "color"
+    "OBSTACLES": (),
+
+    # Start from equilibrated positions: a folder of states (states.StateLibrary) keyed by the
+    # dots, the box and what is in it at time 0. A missing state is equilibrated for
+    # WARM_START_FRAMES (elastic walls, no shear) and saved. The speeds are rescaled to the run's energy.
+    "WARM_START": None,
+    "WARM_START_FRAMES": 600,
+    # States kept per key. Each run picks its replicas among them with its own generator,
+    # so runs with different seeds only share positions when they pick the same state.
+    "WARM_START_STATES": 8,
+
+    # Speed ramp
+    "INITIAL_SPEED_MULTIPLIER": 1.0,
+    "FINAL_SPEED_MULTIPLIER": 1.0,
+    "TIME_TO_REACH_FINAL_SPEED_MS": 0,
+
+    # Colors / drawing
+    "DOT_COLOR": (0, 0, 255),
+    "COLLISION_COLOR": (255, 0, 0),
+    "BACKGROUND_COLOR": (255, 255, 255),
+    "WALL_COLOR": (0, 0, 0),
+    "PARTITION_COLOR": (0, 0, 0),
+    "HOT_WALL_COLOR": (255, 50, 0),
+    "COLD_WALL_COLOR": (0, 100, 255),
+    "COLOR_MODE": "collision",  # "collision" (red when hitting something), "speed" or "species"
+    "MIN_SPEED_COLOR": 1.0,
+    "MAX_SPEED_COLOR": 5.0,
+    "DRAW_COLOR_BAR": False,
+    "COLOR_BAR_LABEL": "Particle Speed",
+    "TEXT_COLOR": (230, 230, 230),
+    "FONT_SIZE": 18,
+    "DRAW_MOVING_WALL_MARKERS": False,
+    "NUM_WALL_MARKERS": 20,
+    "WALL_MARKER_HEIGHT": 8,
+    "WALL_MARKER_COLOR": (100, 100, 100),
+
+    # Camera: the part of the container the WIDTH x HEIGHT frames show, as (x, y, width, height)
+    # in container units, scaled to fit the frame. None -> the whole container, shrunk to fit
+    # the frame (never enlarged). In the window the arrow keys pan, + / - zoom and 0 resets.
+    "VIEW": None,
+    "VIEW_VELOCITY": (0.0, 0.0),  # Container units per simulated second, the view stops at the edges
+
+    # "circles" draws every dot, "density" splats them into a per-pixel histogram,
+    # "auto" switches to density above DENSITY_THRESHOLD dots
+    "RENDER_MODE": "auto",
+    "DENSITY_THRESHOLD": 100000,
+    "DENSITY_SCALE": 1.0,  # Histogram bins per pixel (2 = sub-pixel, 0.5 = 2x2 pixels per bin)
+    "DENSITY_WEIGHT": "count",  # "count", "speed" or "kinetic_energy" (mean per bin)
+    "DENSITY_RANGE": None,  # (low, high) of the color bar, None -> automatic
+
+    # Output
+    "RECORD_VIDEO": True,
+    "OUTPUT": "simulation.mp4",
+}
+
+# --- Scenarios ---
+# Only the constants that differ from COMMON, one entry per standalone script.
+SCENARIOS = {
+    "base": {
+        "WIDTH": 1600,
+        "HEIGHT": 800,
+        "NUM_DOTS": 250,
+        "MIN_DOT_RADIUS": 5,
+        "MAX_DOT_RADIUS": 5,
+        "BROAD_PHASE": "all",
+        "RECORD_VIDEO": False,
+    },
+    "spatial": {
+        "CAPTION": "Molecular Movement Simulation with Spatial Partitioning and Random Radius",
+    },
+    "partition": {
+        "CAPTION": "Molecular Movement Simulation with Spatial Partitioning and Random Radius",
+        "SPAWN_REGION": "right",
+        "PARTITION": "gate",
+        "PARTITION_DURATION_MS": 20000,
+        "OUTPUT": "partition.mp4",
+    },
+    "partition-middle": {
+        "CAPTION": "Simulation: Speed Ramp + Temp Partition + Video Recording",
+        "COLLISION_MODEL": "separate",
+        "DEDUPE_PAIRS": True,
+        "LEFT_WALL": "clamp",
+        "RIGHT_WALL": "clamp",
+        "TOP_WALL": "clamp",
+        "BOTTOM_WALL": "clamp",
+        "PARTITION": "slab",
+        "PARTITION_THICKNESS": 4,
+        "PARTITION_DURATION_MS": 15000,
+        "PARTITION_COLOR": (0, 255, 0),
+        "TIME_TO_REACH_FINAL_SPEED_MS": 1000,
+        "OUTPUT": "partition.mp4",
+    },
+    # partition-middle with a different gas on each side: small light red dots on the
+    # left, big heavy blue ones on the right, mixing once the partition is gone
+    "partition-mixture": {
+        "CAPTION": "Two Gases Mixing After the Partition Is Removed",
+        "COLLISION_MODEL": "separate",
+        "DEDUPE_PAIRS": True,
+        "LEFT_WALL": "clamp",
+        "RIGHT_WALL": "clamp",
+        "TOP_WALL": "clamp",
+        "BOTTOM_WALL": "clamp",
+        "PARTITION": "slab",
+        "PARTITION_THICKNESS": 4,
+        "PARTITION_DURATION_MS": 5000,
+        "PARTITION_COLOR": (0, 255, 0),
+        "SPECIES": (
+            {"name": "light", "radius": 2, "mass": 1.0, "color": (220, 40, 40), "region": "left"},
+            {"name": "heavy", "radius": 4, "mass": 4.0, "color": (40, 70, 220), "region": "right"},
+        ),
+        "COLOR_MODE": "species",
+        "OUTPUT": "partition_mixture.mp4",
+    },
+    "temperature-increase": {
+        "CAPTION": "Molecular Movement Simulation with Speed Ramp-up",
+        "COLLISION_MODEL": "separate",
+        "LEFT_WALL": "clamp",
+        "RIGHT_WALL": "clamp",
+        "TOP_WALL": "clamp",
+        "BOTTOM_WALL": "clamp",
+        "INITIAL_SPEED_MULTIPLIER": 0.001,
+        "FINAL_SPEED_MULTIPLIER": 2.0,
+        "TIME_TO_REACH_FINAL_SPEED_MS": 1000000,
+        "OUTPUT": "simulation_speed_ramp.mp4",
+    },
+    "thermal-conductivity": {
+        "CAPTION": "Thermal Conductivity Simulation with Color Bar",
+        "NUM_DOTS": 1000,
+        "MIN_DOT_RADIUS": 2,
+        "MAX_DOT_RADIUS": 4,
+        "MASS_MODEL": "area",
+        "INITIAL_VELOCITY": "polar",
+        "INITIAL_AVERAGE_SPEED": 0.1,  # Low thermal conductivity - 0.1 | High - (HOT + COLD) / 2
+        "COLLISION_MODEL": "resolve",
+        "DEDUPE_PAIRS": True,
+        "CELL_SIZE_FACTOR": 2.1,
+        "LEFT_WALL": "hot",
+        "RIGHT_WALL": "cold",
+        "TOP_WALL": "specular",
+        "BOTTOM_WALL": "specular",
+        "BACKGROUND_COLOR": (20, 20, 20),
+        "WALL_COLOR": (150, 150, 150),
+        "COLOR_MODE": "speed",
+        "DRAW_COLOR_BAR": True,
+        "OUTPUT": "thermal_conductivity-low.mp4",
+    },
+    "viscosity": {
+        "CAPTION": "Shear Flow Simulation with Visual Moving Wall",
+        "NUM_DOTS": 5000,
+        "MIN_DOT_RADIUS": 2,
+        "MAX_DOT_RADIUS": 5,
+        "MASS_MODEL": "area",
+        "INITIAL_SPEED_RANGE": 0.5,
+        "COLLISION_MODEL": "resolve",
+        "DEDUPE_PAIRS": True,
+        "CELL_SIZE_FACTOR": 2.1,
+        "LEFT_WALL": "specular",
+        "RIGHT_WALL": "specular",
+        "TOP_WALL": "moving",
+        "BOTTOM_WALL": "specular",
+        "DRAW_MOVING_WALL_MARKERS": True,
+        "OUTPUT": "shear_flow_simulation_moving_wall.mp4",
+    },
+    # Same gas as "viscosity" in a small periodic box, sheared by Lees-Edwards
+    # boundaries instead of a wall: no wall transient, the whole box shears at once
+    "viscosity-periodic": {
+        "CAPTION": "Shear Flow Simulation with Lees-Edwards Boundaries",
+        "WIDTH": 640,
+        "HEIGHT": 360,
+        "NUM_DOTS": 550,
+        "MIN_DOT_RADIUS": 2,
+        "MAX_DOT_RADIUS": 5,
+        "MASS_MODEL": "area",
+        "INITIAL_SPEED_RANGE": 0.5,
+        "COLLISION_MODEL": "resolve",
+        "DEDUPE_PAIRS": True,
+        "CELL_SIZE_FACTOR": 2.1,
+        "BOUNDARY": "lees-edwards",
+        "SHEAR_VELOCITY": 1.0,
+        "DRAW_MOVING_WALL_MARKERS": True,
+        "OUTPUT": "shear_flow_simulation_periodic.mp4",
+    },
+}
+
+WALL_KINDS = ("flip", "clamp", "specular", "hot", "cold", "moving", "diffuse")
+RENDER_MODES = ("auto", "circles", "density")
+DENSITY_WEIGHTS = ("count", "speed", "kinetic_energy")
+PRECISIONS = ("float64", "float32")
+BOUNDARIES = ("walls", "lees-edwards")
+REORDER_CURVES = ("morton", "cell")
+SPECIES_REGIONS = ("all", "left", "right")
+BROAD_PHASES = ("grid", "all", "hgrid", "sweep", "kdtree", "auto")
+
+
+def dilute(config):
+    """Whether there are more CELL_SIZE grid cells than dots, what sort and sweep needs."""
+    cells = (config["CONTAINER_WIDTH"] / config["CELL_SIZE"]) * (config["CONTAINER_HEIGHT"] / config["CELL_SIZE"])
+    return cells > config["NUM_DOTS"]
+
+
+def parse_value(text):
+    """Turns a command line value into a Python value, plain strings stay strings."""
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_overrides(items):
+    """Parses a list of KEY=VALUE strings (from --set) into a dict."""
+    overrides = {}
+    for item in items:
+        if "=" not in item:
+            raise ValueError(f"Expected KEY=VALUE, got {item!r}")
+        key, value = item.split("=", 1)
+        overrides[key.strip().upper()] = parse_value(value.strip())
+    return overrides
+
+
+def load_config_file(path):
+    """Reads a TOML or YAML scenario file. Returns (scenario name or None, constants)."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".toml":
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    elif extension in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("Reading YAML configs needs PyYAML (pip install pyyaml)")
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+    else:
+        raise ValueError(f"Unsupported config file {path!r}, use .toml, .yaml or .yml")
+
+    if not isinstance(data, dict):
+        raise ValueError(f"Config file {path!r} must contain a table of constants")
+    values = {str(key).upper(): value for key, value in data.items()}
+    scenario = values.pop("SCENARIO", None)
+    return scenario, values
+
+
+def build_config(scenario, *layers):
+    """Scenario defaults, then each layer of overrides (config file, --set) in order."""
+    if scenario not in SCENARIOS:
+        raise ValueError(f"Unknown scenario {scenario!r}, choose from: {', '.join(SCENARIOS)}")
+
+    config = dict(COMMON)
+    config.update(SCENARIOS[scenario])
+    for layer in layers:
+        for key, value in layer.items():
+            if key not in config:
+                raise ValueError(f"Unknown setting {key!r} for scenario {scenario!r}")
+            config[key] = value
+    config["SCENARIO"] = scenario
+
+    # --- Derived values ---
+    if config["CONTAINER_WIDTH"] is None:
+        config["CONTAINER_WIDTH"] = config["WIDTH"]
+    if config["CONTAINER_HEIGHT"] is None:
+        config["CONTAINER_HEIGHT"] = config["HEIGHT"]
+    if config["PARTITION_X"] is None:
+        config["PARTITION_X"] = config["CONTAINER_WIDTH"] // 2
+    for species in config["SPECIES"]:
+        if not isinstance(species, dict) or not species.get("radius", 0) > 0:
+            raise ValueError(f"Species {species!r} needs a positive 'radius'")
+        if species.get("region", "all") not in SPECIES_REGIONS:
+            raise ValueError(f"A species' region must be one of {', '.join(SPECIES_REGIONS)}")
+        if not (species.get("mass") is None or species["mass"] > 0) or not species.get("fraction", 1) > 0:
+            raise ValueError(f"Species {species!r} needs a positive 'mass' and 'fraction'")
+    if config["SPECIES"]:
+        if len(config["SPECIES"]) > 127:
+            raise ValueError("At most 127 species")
+        # The margins and the grid cells follow the species' sizes
+        config["MIN_DOT_RADIUS"] = min(species["radius"] for species in config["SPECIES"])
+        config["MAX_DOT_RADIUS"] = max(species["radius"] for species in config["SPECIES"])
+    if config["CELL_SIZE"] is None:
+        # Faster dots travel further per frame, so scale the cells with the speed ramp
+        ramp = max(1.0, config["INITIAL_SPEED_MULTIPLIER"], config["FINAL_SPEED_MULTIPLIER"])
+        config["CELL_SIZE"] = config["CELL_SIZE_FACTOR"] * config["MAX_DOT_RADIUS"] * ramp
+    if config["HGRID_LEVELS"] is None:
+        # Cells smaller than the mean distance between the dots would be mostly empty
+        spacing = math.sqrt(config["CONTAINER_WIDTH"] * config["CONTAINER_HEIGHT"] / max(1, config["NUM_DOTS"]))
+        by_size = math.floor(math.log2(config["MAX_DOT_RADIUS"] / max(config["MIN_DOT_RADIUS"], 1e-9)))
+        by_spacing = math.floor(math.log2(max(1.0, config["CELL_SIZE"] / spacing)))
+        config["HGRID_LEVELS"] = 1 + max(0, min(by_size, by_spacing))
+    if config["TOP_WALL_VELOCITY"] is None:
+        config["TOP_WALL_VELOCITY"] = config["TOP_WALL_VELOCITY_X"]
+    if config["SHEAR_VELOCITY"] is None:
+        config["SHEAR_VELOCITY"] = config["TOP_WALL_VELOCITY_X"]
+
+    for side in ("LEFT", "RIGHT", "TOP", "BOTTOM"):
+        if config[f"{side}_WALL"] not in WALL_KINDS:
+            raise ValueError(f"{side}_WALL must be one of {', '.join(WALL_KINDS)}")
+    if config["BOUNDARY"] not in BOUNDARIES:
+        raise ValueError(f"BOUNDARY must be one of {', '.join(BOUNDARIES)}")
+    if config["BOUNDARY"] == "lees-edwards" and config["PARTITION"] is not None:
+        raise ValueError("A Lees-Edwards box has no walls for a partition, set PARTITION = None")
+    if config["BROAD_PHASE"] not in BROAD_PHASES:
+        raise ValueError(f"BROAD_PHASE must be one of {', '.join(BROAD_PHASES)}")
+    if config["BROAD_PHASE"] == "sweep" and not dilute(config):
+        raise ValueError('BROAD_PHASE = "sweep" needs more grid cells than dots, its candidate pairs grow '
+                         'with the dots per column; use "grid" or "auto" for dense systems')
+    if not isinstance(config["BROAD_PHASE_EVERY"], int) or config["BROAD_PHASE_EVERY"] < 1:
+        raise ValueError("BROAD_PHASE_EVERY must be a whole number of at least 1")
+    if not isinstance(config["THREADS"], int) or config["THREADS"] < 1:
+        raise ValueError("THREADS must be a whole number of at least 1")
+    if not isinstance(config["HGRID_LEVELS"], int) or config["HGRID_LEVELS"] < 1:
+        raise ValueError("HGRID_LEVELS must be a whole number of at least 1")
+    if config["REORDER_CURVE"] not in REORDER_CURVES:
+        raise ValueError(f"REORDER_CURVE must be one of {', '.join(REORDER_CURVES)}")
+    if config["PRECISION"] not in PRECISIONS:
+        raise ValueError(f"PRECISION must be one of {', '.join(PRECISIONS)}")
+    if not isinstance(config["WARM_START_FRAMES"], int) or config["WARM_START_FRAMES"] < 1:
+        raise ValueError("WARM_START_FRAMES must be a whole number of at least 1")
+    if not isinstance(config["WARM_START_STATES"], int) or config["WARM_START_STATES"] < 1:
+        raise ValueError("WARM_START_STATES must be a whole number of at least 1")
+    if config["VIEW"] is not None and (len(config["VIEW"]) != 4 or min(config["VIEW"][2:]) <= 0):
+        raise ValueError("VIEW must be None or (x, y, width, height) with a positive width and height")
+    if len(config["VIEW_VELOCITY"]) != 2:
+        raise ValueError("VIEW_VELOCITY must be (x, y)")
+    if config["RENDER_MODE"] not in RENDER_MODES:
+        raise ValueError(f"RENDER_MODE must be one of {', '.join(RENDER_MODES)}")
+    if config["DENSITY_WEIGHT"] not in DENSITY_WEIGHTS:
+        raise ValueError(f"DENSITY_WEIGHT must be one of {', '.join(DENSITY_WEIGHTS)}")
+    if not isinstance(config["STEPS_PER_FRAME"], int) or config["STEPS_PER_FRAME"] < 1:
+        raise ValueError("STEPS_PER_FRAME must be a whole number of at least 1")
+    if config["TIME_STEP"] <= 0:
+        raise ValueError("TIME_STEP must be positive")
+    for obstacle in config["OBSTACLES"]:
+        if not isinstance(obstacle, dict) or ("segment" in obstacle) == ("rect" in obstacle):
+            raise ValueError(f"Obstacle {obstacle!r} needs either a 'segment' or a 'rect'")
+    if config["MIN_DOT_RADIUS"] > config["MAX_DOT_RADIUS"]:
+        raise ValueError("MIN_DOT_RADIUS can't be larger than MAX_DOT_RADIUS")
+    return config
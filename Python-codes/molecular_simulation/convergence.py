@@ -0,0 +1,68 @@
+from collections import deque
+
+import numpy as np
+
+from .observables import OBSERVABLES
+from .transport import SHEAR_WALLS, wall_temperature
+
+STEADY_ACTIONS = ("stop", "sample")
+
+
+def default_observables(config):
+    """What to watch when nothing is asked for: the profile the walls drive, or the mixing after a partition."""
+    names = []
+    if wall_temperature(config, "LEFT") is not None and wall_temperature(config, "RIGHT") is not None:
+        names.append("temperature_profile")
+    if config["BOUNDARY"] == "lees-edwards" or config["TOP_WALL"] in SHEAR_WALLS or config["BOTTOM_WALL"] in SHEAR_WALLS:
+        names.append("velocity_profile")
+    if len(config["SPECIES"]) > 1:
+        names.append("mixing_index")
+    elif config["PARTITION"] is not None:
+        names.append("mixing_fraction")
+    return names or ["kinetic_energy"]
+
+
+# --- Steady State Monitor ---
+# Samples the chosen observables (averaged over the replicas) every `every` frames and
+# compares the mean of the last window of samples with the window before it. The run
+# is steady once no bin of any observable has moved by more than `z` standard errors
+# or `tolerance` times the observable's size, whichever is larger. Profiles that are
+# still building up fail the test; noise alone passes it.
+class SteadyStateMonitor:
+    def __init__(self, names, every, window, tolerance=0.02, z=3.0):
+        self.names = list(names)
+        self.every = every
+        self.window = window
+        self.tolerance = tolerance
+        self.z = z
+        self.samples = {name: deque(maxlen=2 * window) for name in self.names}
+        self.steady_frame = None
+
+    @property
+    def steady(self):
+        return self.steady_frame is not None
+
+    def update(self, sim):
+        """Call after every step, returns True on the frame the run becomes steady."""
+        if self.steady or sim.frame % self.every or sim.partition_active:
+            return False
+        for name in self.names:
+            with np.errstate(invalid="ignore"):
+                value = np.nanmean(np.asarray(OBSERVABLES[name](sim), dtype=float), axis=0)
+            self.samples[name].append(np.atleast_1d(value))
+        if all(self.drift_ok(samples) for samples in self.samples.values()):
+            self.steady_frame = sim.frame
+            return True
+        return False
+
+    def drift_ok(self, samples):
+        if len(samples) < 2 * self.window:
+            return False
+        values = np.array(samples)
+        older, recent = values[:self.window], values[self.window:]
+        with np.errstate(invalid="ignore"):
+            drift = np.abs(np.nanmean(recent, axis=0) - np.nanmean(older, axis=0))
+            error = np.sqrt((np.nanvar(older, axis=0, ddof=1) + np.nanvar(recent, axis=0, ddof=1)) / self.window)
+            scale = np.nanmax(np.abs(values))
+        allowed = np.maximum(self.z * error, self.tolerance * scale)
+        return bool(np.all(np.nan_to_num(drift) <= np.nan_to_num(allowed)))
@@ -0,0 +1,533 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import broadphase, spatial
+from .simulation import Simulation
+from .walls import RANDOMS_PER_HIT, SIDES, Wall
+
+
+def conflict_free_rounds(i, j, size):
+    """Splits pairs (i, j) into rounds in which no dot appears twice, keeping their order.
+
+    Yields the indices of each round's pairs.
+    """
+    pair_index = np.arange(len(i))
+    while len(pair_index):
+        # A pair goes in this round when it is the first remaining pair of both its dots
+        first = np.full(size, len(i))
+        np.minimum.at(first, i[pair_index], pair_index)
+        np.minimum.at(first, j[pair_index], pair_index)
+        selected = (first[i[pair_index]] == pair_index) & (first[j[pair_index]] == pair_index)
+        yield pair_index[selected]
+        pair_index = pair_index[~selected]
+
+
+# Every per-dot array, they are all reordered together
+PARTICLE_ARRAYS = ("radius", "x", "y", "speed_x", "speed_y", "mass", "species", "colliding", "ids")
+# Rounds of fewer pairs than this per thread are resolved by one thread, and boxes
+# of fewer dots than MIN_STRIP_DOTS per thread are searched by one thread
+MIN_CHUNK = 512
+MIN_STRIP_DOTS = 4096
+SEED_LEVELS = 2  # Rounds of pushes bounce_off_dots allows for before it checks the rest
+
+
+# --- Array Simulation ---
+# Same physics as the reference Dot loop, but the state of every dot lives in numpy
+# arrays of shape (replicas, NUM_DOTS) and each step is a handful of vectorized kernels.
+# Replicas are independent copies of the scenario (an ensemble) that are advanced
+# together: the kernels work on the flattened arrays, and the pair search keeps
+# every replica in its own copy of the grid. Touching pairs are resolved in the order
+# of the Dot loop, once per frame with DEDUPE_PAIRS and once from each dot without.
+# With BOUNDARY = "lees-edwards" there are no walls: the box is periodic and the copies
+# above and below it slide at +/- SHEAR_VELOCITY, which shears the whole box evenly.
+class ArraySimulation(Simulation):
+    def __init__(self, config, replicas=1, rng=None):
+        super().__init__(config)
+        self.replicas = replicas
+        self.num_dots = config["NUM_DOTS"]
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.dtype = np.dtype(config["PRECISION"])
+        self._create_dots()
+        # Replica index of every flat particle, keeps replicas apart in the pair search
+        self.replica_index = np.repeat(np.arange(replicas), self.num_dots)
+        # Which dot (of the initial order) sits in each column, changes when the arrays are reordered
+        self.ids = np.tile(np.arange(self.num_dots), (replicas, 1))
+        self.random_column = np.arange(replicas * self.num_dots)
+        if self.species_table is not None:
+            # Pair tables (species.SpeciesTable) at the precision of the run
+            self.pair_contact = self.species_table.pair_contact.astype(self.dtype)
+            self.pair_reduced_mass = self.species_table.pair_reduced_mass.astype(self.dtype)
+            self.inverse_mass = self.species_table.inverse_mass.astype(self.dtype)
+
+        # With THREADS > 1 the pair search and the collision rounds are split over a thread pool
+        self.threads = config["THREADS"]
+        self.pool = ThreadPoolExecutor(self.threads) if self.threads > 1 else None
+        # With BROAD_PHASE = "auto" the pair search backend is measured and picked as the run goes
+        self.selector = broadphase.BroadPhaseSelector(config) if config["BROAD_PHASE"] == "auto" else None
+
+        self.walls = {side: Wall(config, side) for side in SIDES}
+        # Running totals per replica for the transport estimators: energy and momentum
+        # along the wall each wall has given to the dots, the x momentum carried down
+        # through the Lees-Edwards edge, and the time the dots have moved for (in frames)
+        self.wall_energy = {side: np.zeros(replicas) for side in SIDES}
+        self.wall_momentum = {side: np.zeros(replicas) for side in SIDES}
+        # x momentum the left / right walls have given to the dots, weighted by the share
+        # of the height below (TOP) / above (BOTTOM) each hit: what they take out of the
+        # flow between the top / bottom wall and the average height of the box
+        self.side_momentum = {"TOP": np.zeros(replicas), "BOTTOM": np.zeros(replicas)}
+        self.shear_momentum = np.zeros(replicas)
+        self.motion_time = 0.0
+        self.lees_edwards = config["BOUNDARY"] == "lees-edwards"
+        self.shear_velocity = config["SHEAR_VELOCITY"]
+        # The thermostat keeps the thermal (non-shear) energy at its starting value
+        self.thermal_energy = 0.5 * (self.mass * (self.speed_x**2 + self.speed_y**2)).sum(axis=1, dtype=np.float64)
+        if self.lees_edwards:
+            # Start on the linear shear profile so there is no start-up transient
+            self.speed_x += self.shear_profile()
+
+    # --- Dot Creation ---
+    def _create_dots(self):
+        # Drawn in float64 like the reference, then stored at the PRECISION of the run.
+        # float32 halves the memory traffic of every kernel.
+        state = self.initial_state(self.rng, self.replicas)
+        dtype = self.dtype
+        self.radius = state["radius"].astype(dtype)
+        self.x = state["x"].astype(dtype)
+        self.y = state["y"].astype(dtype)
+        self.speed_x = state["speed_x"].astype(dtype)
+        self.speed_y = state["speed_y"].astype(dtype)
+        self.mass = state["mass"].astype(dtype)
+        self.species = state["species"]
+        self.colliding = np.zeros(self.radius.shape, dtype=bool)
+
+    # --- Walls ---
+    def bounce_off_walls(self):
+        # Each wall's kernel (walls.py) handles all of its hits at once
+        x, y = self.x.reshape(-1), self.y.reshape(-1)
+        speed_x, speed_y = self.speed_x.reshape(-1), self.speed_y.reshape(-1)
+        radius, mass = self.radius.reshape(-1), self.mass.reshape(-1)
+
+        left = x <= radius
+        right = ~left & (x >= self.width - radius)
+        top = y <= radius
+        bottom = ~top & (y >= self.height - radius)
+        hits = (("LEFT", left, x, speed_x, speed_y, radius),
+                ("RIGHT", right, x, speed_x, speed_y, self.width - radius),
+                ("TOP", top, y, speed_y, speed_x, radius),
+                ("BOTTOM", bottom, y, speed_y, speed_x, self.height - radius))
+        hits = [(side, np.nonzero(hit)[0], *rest) for side, hit, *rest in hits]
+
+        # Numbers only for the hits on random walls, ordered by dot id (so reordering
+        # doesn't change which dot gets which), the left / right wall first
+        keys = [2 * self.random_column[hit] + (self.walls[side].axis == "y")
+                for side, hit, *_ in hits if self.walls[side].kind in RANDOMS_PER_HIT]
+        random_key = np.sort(np.concatenate(keys)) if keys else np.zeros(0, dtype=np.int64)
+        randoms = self.draw_wall_randoms(self.rng, len(random_key)) if keys else None
+
+        for side, hit, position, normal, tangent, limit in hits:
+            if len(hit) == 0:
+                continue
+            wall = self.walls[side]
+            wall_randoms = None
+            if wall.kind in RANDOMS_PER_HIT:
+                key = 2 * self.random_column[hit] + (wall.axis == "y")
+                wall_randoms = randoms[np.searchsorted(random_key, key)].T
+            energy_before = 0.5 * mass[hit] * (normal[hit]**2 + tangent[hit]**2)
+            momentum_before = mass[hit] * tangent[hit]
+            normal_before = mass[hit] * normal[hit]
+            wall.kernel(wall, hit, position, normal, tangent, limit, mass, wall_randoms)
+            self.colliding.reshape(-1)[hit] = True
+
+            replica = self.replica_index[hit]
+            energy_after = 0.5 * mass[hit] * (normal[hit]**2 + tangent[hit]**2)
+            self.wall_energy[side] += np.bincount(replica, energy_after - energy_before, self.replicas)
+            self.wall_momentum[side] += np.bincount(replica, mass[hit] * tangent[hit] - momentum_before, self.replicas)
+            if wall.axis == "x":
+                change = mass[hit] * normal[hit] - normal_before
+                below = (self.height - y[hit]) / self.height
+                self.side_momentum["TOP"] += np.bincount(replica, change * below, self.replicas)
+                self.side_momentum["BOTTOM"] += np.bincount(replica, change * (1 - below), self.replicas)
+
+    # --- Partition ---
+    def bounce_off_partition(self):
+        x, speed_x = self.x.reshape(-1), self.speed_x.reshape(-1)
+        radius = self.radius.reshape(-1)
+        colliding = self.colliding.reshape(-1)
+
+        if self.config["PARTITION"] == "gate":
+            hit = x - radius <= self.config["PARTITION_X"]
+            speed_x[hit] *= -1
+            colliding[hit] = True
+            return
+
+        partition_left, partition_right = self.partition_edges()
+        prev_x = x - speed_x * self.time_step  # Estimate previous position
+        # Moving right towards partition
+        from_left = ((speed_x > 0) & (x + radius >= partition_left) & (x < partition_left)
+                     & (prev_x + radius < partition_left))
+        # Moving left towards partition
+        from_right = ((speed_x < 0) & (x - radius <= partition_right) & (x > partition_right)
+                      & (prev_x - radius > partition_right))
+        x[from_left] = partition_left - radius[from_left]
+        x[from_right] = partition_right + radius[from_right]
+        hit = from_left | from_right
+        speed_x[hit] *= -1
+        colliding[hit] = True
+
+    # --- Obstacles ---
+    def bounce_off_obstacles(self, travel):
+        # Every obstacle is made of segments in geometry.Obstacles
+        hit = self.obstacles.collide(self.x.reshape(-1), self.y.reshape(-1), self.speed_x.reshape(-1),
+                                     self.speed_y.reshape(-1), self.radius.reshape(-1), travel, self.time_ms)
+        self.colliding.reshape(-1)[hit] = True
+
+    # --- Lees-Edwards Boundary ---
+    def wrap_lees_edwards(self):
+        # Leaving through the top puts a dot in the upper copy of the box, which is
+        # shifted by +offset and moves at +SHEAR_VELOCITY: bring it back from there.
+        crossings = np.floor(self.y / self.height)
+        self.y -= crossings * self.height
+        self.x += crossings * self.shear_offset
+        self.x %= self.width
+        self.speed_x += crossings * self.shear_velocity
+
+        # Momentum carried down through the top edge: dots coming in from the copy
+        # above bring their new speed, dots leaving upwards take their old one
+        crossed = crossings != 0
+        if crossed.any():
+            carried = np.where(crossings > 0, self.speed_x, -(self.speed_x - crossings * self.shear_velocity))
+            self.shear_momentum += np.where(crossed, self.mass * carried, 0).sum(axis=1, dtype=np.float64)
+
+    def shear_profile(self):
+        """Streaming velocity at each dot's height: +SHEAR_VELOCITY / 2 at the top, -SHEAR_VELOCITY / 2 at the bottom."""
+        return self.shear_velocity * (0.5 - self.y / self.height)
+
+    def apply_shear_thermostat(self):
+        # Shearing heats the gas, scale the speeds relative to the shear profile back
+        flow = self.shear_profile()
+        thermal_x = self.speed_x - flow
+        energy = 0.5 * (self.mass * (thermal_x**2 + self.speed_y**2)).sum(axis=1, dtype=np.float64)
+        scale = np.sqrt(self.thermal_energy / np.maximum(energy, 1e-12)).astype(self.dtype)[:, None]
+        self.speed_x[:] = flow + thermal_x * scale
+        self.speed_y *= scale
+
+    def separation(self, i, j):
+        """Displacement from dot i to dot j, and whether j's nearest image is in the copy above (+1) or below (-1)."""
+        dx = self.x.reshape(-1)[j] - self.x.reshape(-1)[i]
+        dy = self.y.reshape(-1)[j] - self.y.reshape(-1)[i]
+        if not self.lees_edwards:
+            return dx, dy, 0
+        return spatial.lees_edwards_separation(dx, dy, self.width, self.height, self.shear_offset)
+
+    # --- Dot vs Dot ---
+    def broad_phase(self):
+        """The pair search backend for this frame."""
+        if self.selector is not None:
+            return self.selector.choose(self)
+        return self.config["BROAD_PHASE"]
+
+    def find_pairs(self, backend=None):
+        backend = backend or self.broad_phase()
+        if backend == "all":
+            return spatial.all_pairs(self.num_dots, self.replicas)
+        x, y, radius = self.x.reshape(-1), self.y.reshape(-1), self.radius.reshape(-1)
+        if self.lees_edwards:
+            def search(xs, ys, source, width, height, group):
+                return broadphase.search(backend, xs, ys, radius[source], self.config, width, height,
+                                         group, self.replicas)
+            return spatial.find_pairs_lees_edwards(x, y, self.config["CELL_SIZE"], self.width, self.height,
+                                                   self.shear_offset, self.replica_index, self.replicas, search)
+        return broadphase.search(backend, x, y, radius, self.config, self.width, self.height,
+                                 self.replica_index, self.replicas)
+
+    def contact_distance(self, i, j):
+        """Distance at which the dots of each pair touch."""
+        if self.species_table is None:
+            radius = self.radius.reshape(-1)
+            return radius[i] + radius[j]
+        species = self.species.reshape(-1)
+        return self.pair_contact[species[i], species[j]]
+
+    # --- Threads ---
+    # The pair search and the distance test only read the state, so every thread takes a
+    # vertical strip of the grid. The writes happen in the collision rounds, and no dot
+    # is in a round twice: the pairs of a round can be split over the threads with no
+    # locks, and the result is the same as with one thread. numpy releases the GIL in
+    # its kernels; on a free-threaded Python the code between them runs in parallel too.
+    def run_parallel(self, function, items):
+        if self.pool is None or len(items) < 2:
+            return [function(item) for item in items]
+        return list(self.pool.map(function, items))
+
+    def pair_strips(self, backend):
+        """Cell columns (first, last) searched by each thread, [None] for one search of the whole box."""
+        if self.pool is None or backend != "grid" or self.lees_edwards:
+            return [None]
+        cols = max(1, int(math.ceil(self.width / self.config["CELL_SIZE"])))
+        strips = min(self.threads, cols, self.replicas * self.num_dots // MIN_STRIP_DOTS)
+        if strips < 2:
+            return [None]
+        bounds = np.linspace(0, cols, strips + 1).round().astype(int)
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def measure_pairs(self, strip, backend):
+        """Candidate pairs of a strip, their squared distance and the distance at which they touch."""
+        if strip is None:
+            i, j = self.find_pairs(backend)
+        else:
+            i, j = spatial.find_pairs_in_strip(self.x.reshape(-1), self.y.reshape(-1), self.config["CELL_SIZE"],
+                                               self.width, self.height, *strip, self.replica_index, self.replicas)
+        dx, dy, _ = self.separation(i, j)
+        return i, j, dx**2 + dy**2, self.contact_distance(i, j)
+
+    def resolve_round(self, i, j):
+        chunks = min(self.threads, len(i) // MIN_CHUNK)
+        if chunks < 2:
+            received = [self.resolve_pairs(i, j)]
+        else:
+            bounds = np.linspace(0, len(i), chunks + 1).astype(int)
+            received = self.run_parallel(lambda k: self.resolve_pairs(i[bounds[k]:bounds[k + 1]], j[bounds[k]:bounds[k + 1]]),
+                                         range(chunks))
+        for momentum in received:
+            if momentum is not None:
+                self.shear_momentum += momentum
+
+    def bounce_off_dots(self):
+        num_dots = self.replicas * self.num_dots
+        lower = 1e-6 if self.config["COLLISION_MODEL"] == "resolve" else 0
+
+        # Cheap distance test for every candidate pair first
+        backend = self.broad_phase()
+        measured = self.run_parallel(lambda strip: self.measure_pairs(strip, backend), self.pair_strips(backend))
+        i, j, distance_sq, reach = (np.concatenate(parts) for parts in zip(*measured))
+        if self.selector is not None:
+            self.selector.observe(len(i))
+        touching = (distance_sq > lower) & (distance_sq < reach**2)
+        if self.config["COLLISION_MODEL"] == "impulse" or not touching.any():
+            self.resolve_touching(i[touching], j[touching])
+            return
+
+        # Pushing a touching pair apart can bring a dot into contact with another one
+        # before the Dot loop gets to that pair, and those pushes can close more pairs in
+        # turn. Start with the pairs SEED_LEVELS rounds of pushes from the touching ones
+        # can close, then check the others where the Dot loop would have met them: if one of them
+        # was touching then, the frame is resolved again with it.
+        grown = reach
+        for _ in range(SEED_LEVELS):
+            push = (grown[touching] - np.sqrt(distance_sq[touching])) / 2
+            pushed = np.bincount(i[touching], push, num_dots) + np.bincount(j[touching], push, num_dots)
+            grown = reach + pushed[i] + pushed[j]
+            touching = (distance_sq > lower) & (distance_sq < grown**2)
+        start = {name: getattr(self, name).copy() for name in ("x", "y", "speed_x", "speed_y", "colliding", "shear_momentum")}
+        while True:
+            resolved = self.resolve_touching(i[touching], j[touching])
+            missed = self.missed_contacts(i, j, distance_sq, reach, touching, resolved, start, lower)
+            if not missed.any():
+                break
+            touching |= missed
+            for name, values in start.items():
+                getattr(self, name)[...] = values
+
+    def resolve_touching(self, i, j):
+        """Resolves pairs in the order of the Dot loop.
+
+        Returns the pairs in that order and where their dots were right after each
+        one, (4, pairs): x and y of i, x and y of j.
+        """
+        # A dot touching several others must see the result of its first collision
+        # before the next one, so the touching pairs are put in the order of the Dot
+        # loop and resolved in rounds in which every dot appears at most once. That
+        # gives the same result as handling them one by one in that order.
+        i, j = self.loop_order(i, j)
+        x, y = self.x.reshape(-1), self.y.reshape(-1)
+        after = np.empty((4, len(i)), dtype=self.x.dtype)
+        for chosen in conflict_free_rounds(i, j, self.replicas * self.num_dots):
+            self.resolve_round(i[chosen], j[chosen])
+            after[:, chosen] = x[i[chosen]], y[i[chosen]], x[j[chosen]], y[j[chosen]]
+        return i, j, after
+
+    def missed_contacts(self, i, j, distance_sq, reach, touching, resolved, start, lower):
+        """Candidate pairs left out of `touching` that were in contact when the Dot loop got to them."""
+        start_x, start_y = start["x"].reshape(-1), start["y"].reshape(-1)
+        resolved_i, resolved_j, after = resolved
+        dots = np.concatenate([resolved_i, resolved_j])
+        after_x, after_y = np.concatenate([after[0], after[2]]), np.concatenate([after[1], after[3]])
+
+        # Only a pair whose dots got that much closer can have touched
+        furthest = np.zeros(self.replicas * self.num_dots)
+        np.maximum.at(furthest, dots, np.hypot(after_x - start_x[dots], after_y - start_y[dots]))
+        closer = furthest[i] + furthest[j]
+        flagged = ~touching & (distance_sq < (reach + closer)**2) & ((distance_sq > lower) | (closer > 0))
+        if not flagged.any():
+            return flagged
+
+        # Where the flagged pairs come in the loop among the resolved ones, and where
+        # each of their dots was then: after its last resolved pair before that point
+        count = len(resolved_i)
+        all_i = np.concatenate([i[touching], i[flagged]])
+        all_j = np.concatenate([j[touching], j[flagged]])
+        loop_i, loop_j, index = self.loop_order(all_i, all_j, start_x, start_y, return_index=True)
+        is_resolved = index < np.count_nonzero(touching)
+        before = np.cumsum(is_resolved) - is_resolved
+        query = ~is_resolved
+        key = dots * (count + 1) + np.tile(np.arange(count), 2)
+        by_key = np.argsort(key)
+        key = key[by_key]
+
+        def position(dot, before):
+            last = np.searchsorted(key, dot * (count + 1) + before) - 1
+            found = (last >= 0) & (key[np.maximum(last, 0)] // (count + 1) == dot)
+            last = by_key[np.maximum(last, 0)]
+            return np.where(found, after_x[last], start_x[dot]), np.where(found, after_y[last], start_y[dot])
+
+        first_x, first_y = position(loop_i[query], before[query])
+        second_x, second_y = position(loop_j[query], before[query])
+        dx, dy = second_x - first_x, second_y - first_y
+        if self.lees_edwards:
+            dx, dy, _ = spatial.lees_edwards_separation(dx, dy, self.width, self.height, self.shear_offset)
+        gap_sq = dx**2 + dy**2
+        contact = (gap_sq > lower) & (gap_sq < self.contact_distance(loop_i[query], loop_j[query])**2)
+
+        missed = np.zeros(len(i), dtype=bool)
+        missed[np.nonzero(flagged)[0][index[query][contact] - np.count_nonzero(touching)]] = True
+        return missed
+
+    def loop_order(self, i, j, x=None, y=None, return_index=False):
+        config = self.config
+        # The Dot loop has no cells for the all pairs search, and the Lees-Edwards box has no Dot loop
+        cells = config["BROAD_PHASE"] != "all" and not self.lees_edwards
+        if cells and x is None:
+            x, y = self.x.reshape(-1), self.y.reshape(-1)
+        return spatial.loop_order(i, j, self.ids.reshape(-1), x if cells else None, y if cells else None,
+                                  config["CELL_SIZE"], self.width, self.height, self.replica_index,
+                                  both_ways=not config["DEDUPE_PAIRS"], return_index=return_index)
+
+    def resolve_pairs(self, i, j):
+        """Collision response for pairs that don't share a dot.
+
+        Returns the x momentum pushed down through the Lees-Edwards edge per replica (None without it).
+        """
+        model = self.config["COLLISION_MODEL"]
+        x, y = self.x.reshape(-1), self.y.reshape(-1)
+        speed_x, speed_y = self.speed_x.reshape(-1), self.speed_y.reshape(-1)
+        mass, species = self.mass.reshape(-1), self.species.reshape(-1)
+
+        # Earlier rounds may have moved the dots, so check the distance again
+        dx, dy, crossings = self.separation(i, j)
+        distance_sq = dx**2 + dy**2
+        min_dist = self.contact_distance(i, j)
+        lower = 1e-6 if model == "resolve" else 0
+        touching = (distance_sq > lower) & (distance_sq < min_dist**2)
+        i, j = i[touching], j[touching]
+        if self.lees_edwards:
+            crossings = crossings[touching]
+        image_speed_x = crossings * self.shear_velocity  # j's image moves with its copy of the box
+        distance = np.sqrt(distance_sq[touching])
+        nx = dx[touching] / distance
+        ny = dy[touching] / distance
+        overlap = min_dist[touching] - distance
+
+        # Normal points from i to j, so approaching dots have a positive dot product here
+        dp = (speed_x[i] - speed_x[j] - image_speed_x) * nx + (speed_y[i] - speed_y[j]) * ny
+        if model == "impulse":
+            bouncing = np.ones(len(i), dtype=bool)
+        elif model == "separate":
+            bouncing = dp > 0
+        else:
+            bouncing = dp < 0  # Same test as Dot._bounce_resolve (from the thermal / viscosity scripts)
+
+        if model != "impulse":
+            # Push the dots apart, each one half of the overlap
+            pushed = bouncing if model == "separate" else np.ones(len(i), dtype=bool)
+            move = np.where(pushed, overlap * 0.5, 0.0)
+            x[i] -= move * nx
+            y[i] -= move * ny
+            x[j] += move * nx
+            y[j] += move * ny
+
+        # Momentum the pair exchanges along the normal, and the speed change of each dot
+        if self.species_table is None:
+            m1, m2 = mass[i], mass[j]
+            impulse = np.where(bouncing, 2 * dp / (m1 + m2), 0.0)
+            transfer, kick_i, kick_j = impulse * m1 * m2, impulse * m2, impulse * m1
+        else:
+            species_i, species_j = species[i], species[j]
+            transfer = np.where(bouncing, 2 * self.pair_reduced_mass[species_i, species_j] * dp, 0.0)
+            kick_i, kick_j = transfer * self.inverse_mass[species_i], transfer * self.inverse_mass[species_j]
+        speed_x[i] -= kick_i * nx
+        speed_y[i] -= kick_i * ny
+        speed_x[j] += kick_j * nx
+        speed_y[j] += kick_j * ny
+
+        colliding = self.colliding.reshape(-1)
+        colliding[i[bouncing]] = True
+        colliding[j[bouncing]] = True
+
+        if self.lees_edwards:
+            # A collision with a dot's image above / below pushes momentum through the edge:
+            # count what the lower dot of the pair received
+            across = crossings != 0
+            if across.any():
+                received = -crossings[across] * transfer[across] * nx[across]
+                return np.bincount(self.replica_index[i[across]], received, self.replicas)
+        return None
+
+    # --- Memory Order ---
+    def reorder(self):
+        """Sorts the dots of each replica by position, so neighbours are close in memory too."""
+        config = self.config
+        order = spatial.spatial_order(self.x, self.y, config["CELL_SIZE"], self.width, self.height,
+                                      config["REORDER_CURVE"])
+        for name in PARTICLE_ARRAYS:
+            setattr(self, name, np.take_along_axis(getattr(self, name), order, axis=1))
+        self.random_column = (self.ids + (self.replica_index * self.num_dots).reshape(self.ids.shape)).reshape(-1)
+
+    # --- Game Logic ---
+    def step(self):
+        super().step()
+        every = self.config["REORDER_EVERY"]
+        if every and self.frame % every == 0:
+            self.reorder()
+
+    def physics_step(self):
+        speed_multiplier = self.speed_multiplier() * self.time_step
+
+        self.colliding[:] = False
+        self.x += self.speed_x * speed_multiplier
+        self.y += self.speed_y * speed_multiplier
+        self.motion_time += speed_multiplier
+        if self.lees_edwards:
+            self.shear_offset = (self.shear_offset + self.shear_velocity * speed_multiplier) % self.width
+            self.wrap_lees_edwards()
+        else:
+            self.bounce_off_walls()
+            if self.partition_active:
+                self.bounce_off_partition()
+        if self.obstacles is not None:
+            self.bounce_off_obstacles(speed_multiplier)
+        self.bounce_off_dots()
+        if self.lees_edwards and self.config["SHEAR_THERMOSTAT"]:
+            self.apply_shear_thermostat()
+
+    @property
+    def nbytes(self):
+        """Memory the dot state holds: the per dot arrays at the PRECISION of the run."""
+        arrays = (self.x, self.y, self.speed_x, self.speed_y, self.radius, self.mass,
+                  self.colliding, self.species, self.ids, self.random_column, self.replica_index)
+        return sum(array.nbytes for array in arrays)
+
+    def snapshot(self, replica=0):
+        """One replica's dot state as arrays, which is what the renderer draws."""
+        return {
+            "x": self.x[replica],
+            "y": self.y[replica],
+            "radius": self.radius[replica],
+            "speed_x": self.speed_x[replica],
+            "speed_y": self.speed_y[replica],
+            "mass": self.mass[replica],
+            "species": self.species[replica],
+            "colliding": self.colliding[replica],
+            "ids": self.ids[replica],
+        }
@@ -0,0 +1,263 @@
+import math
+
+import numpy as np
+
+from .spatial import ragged_arange
+
+
+def obstacle_shapes(config):
+    """The scenario's obstacles to draw: the partition (if any) plus the OBSTACLES list.
+
+    Each shape is a dict with either "segment": (x1, y1, x2, y2) or "rect": (x, y, width, height),
+    and optionally "from_ms" / "until_ms", the simulated time it appears / disappears, and "color".
+    The partition is only drawn from here, the engines keep the one sided bounce of the
+    original scripts for it (Simulation.bounce_off_partition).
+    """
+    shapes = []
+    height = config["CONTAINER_HEIGHT"]
+    partition_x = config["PARTITION_X"]
+    partition = {"until_ms": config["PARTITION_DURATION_MS"], "color": config["PARTITION_COLOR"]}
+    if config["PARTITION"] == "gate":
+        shapes.append({"segment": (partition_x, 0, partition_x, height), **partition})
+    elif config["PARTITION"] == "slab":
+        thickness = config["PARTITION_THICKNESS"]
+        shapes.append({"rect": (partition_x - thickness / 2, 0, thickness, height), **partition})
+    shapes.extend(config["OBSTACLES"])
+    return shapes
+
+
+def shape_segments(shape):
+    """(x1, y1, x2, y2) of each side of a shape."""
+    if "segment" in shape:
+        return [tuple(shape["segment"])]
+    x, y, width, height = shape["rect"]
+    corners = [(x, y), (x + width, y), (x + width, y + height), (x, y + height)]
+    return [corners[k] + corners[(k + 1) % 4] for k in range(4)]
+
+
+# --- Obstacles ---
+# Every obstacle is made of line segments. Each segment is listed in every grid cell it
+# passes through plus the cells around them (a compressed list per cell), so a dot only
+# tests the few segments listed in its own cell, however many obstacles there are.
+class Obstacles:
+    def __init__(self, shapes, cell_size, width, height):
+        self.shapes = shapes
+        self.cell_size = cell_size
+        self.cols = max(1, int(math.ceil(width / cell_size)))
+        self.rows = max(1, int(math.ceil(height / cell_size)))
+        self.from_ms = np.array([shape.get("from_ms", 0) for shape in shapes], dtype=float)
+        self.until_ms = np.array([math.inf if shape.get("until_ms") is None else shape["until_ms"]
+                                  for shape in shapes], dtype=float)
+
+        segments, owner = [], []
+        for index, shape in enumerate(shapes):
+            for segment in shape_segments(shape):
+                segments.append(segment)
+                owner.append(index)
+        segments = np.array(segments, dtype=float).reshape(-1, 4)
+        self.ax, self.ay, self.bx, self.by = segments.T
+        self.owner = np.array(owner, dtype=np.int64)
+        self.rect_shapes = [index for index, shape in enumerate(shapes) if "rect" in shape]
+        self._build_index()
+
+    def _build_index(self):
+        cells, segment_ids = [], []
+        for k in range(len(self.ax)):
+            length = math.hypot(self.bx[k] - self.ax[k], self.by[k] - self.ay[k])
+            # Points every half cell along the segment, then their 3x3 neighbourhoods
+            t = np.linspace(0, 1, int(math.ceil(2 * length / self.cell_size)) + 2)
+            cell_x = ((self.ax[k] + t * (self.bx[k] - self.ax[k])) // self.cell_size).astype(np.int64)
+            cell_y = ((self.ay[k] + t * (self.by[k] - self.ay[k])) // self.cell_size).astype(np.int64)
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    nx, ny = cell_x + dx, cell_y + dy
+                    inside = (nx >= 0) & (nx < self.cols) & (ny >= 0) & (ny < self.rows)
+                    cells.append(np.unique(ny[inside] * self.cols + nx[inside]))
+                    segment_ids.append(np.full(len(cells[-1]), k))
+        cells = np.concatenate(cells) if cells else np.zeros(0, dtype=np.int64)
+        segment_ids = np.concatenate(segment_ids) if segment_ids else np.zeros(0, dtype=np.int64)
+        # A cell can get the same segment from several points
+        key = np.unique(cells * max(1, len(self.ax)) + segment_ids)
+        cells, segment_ids = key // max(1, len(self.ax)), key % max(1, len(self.ax))
+        counts = np.bincount(cells, minlength=self.rows * self.cols)
+        self.cell_start = np.concatenate([[0], np.cumsum(counts)])
+        self.cell_segments = segment_ids  # Sorted by cell
+
+    def shape_active(self, time_ms):
+        """Which shapes are there at this time."""
+        return (self.from_ms <= time_ms) & (time_ms < self.until_ms)
+
+    def active(self, time_ms):
+        """Which segments are there at this time."""
+        return self.shape_active(time_ms)[self.owner]
+
+    def cell_of(self, x, y):
+        cell_x = np.clip((np.asarray(x) // self.cell_size).astype(np.int64), 0, self.cols - 1)
+        cell_y = np.clip((np.asarray(y) // self.cell_size).astype(np.int64), 0, self.rows - 1)
+        return cell_y * self.cols + cell_x
+
+    def candidates(self, x, y, active):
+        """(dot, segment) pairs for the active segments listed in each dot's cell, grouped by dot."""
+        cell = self.cell_of(x, y)
+        counts = self.cell_start[cell + 1] - self.cell_start[cell]
+        dot = np.repeat(np.arange(len(x)), counts)
+        segment = self.cell_segments[np.repeat(self.cell_start[cell], counts) + ragged_arange(counts)]
+        keep = active[segment]
+        return dot[keep], segment[keep]
+
+    def overlapping(self, x, y, radius, time_ms=0):
+        """Which dots (flat arrays) touch an active segment or sit inside an active rect."""
+        active = self.active(time_ms)
+        result = np.zeros(len(x), dtype=bool)
+        dot, k = self.candidates(x, y, active)
+        ax, ay = self.ax[k], self.ay[k]
+        ex, ey = self.bx[k] - ax, self.by[k] - ay
+        t = np.clip(((x[dot] - ax) * ex + (y[dot] - ay) * ey) / np.maximum(ex * ex + ey * ey, 1e-12), 0, 1)
+        distance = np.hypot(x[dot] - (ax + t * ex), y[dot] - (ay + t * ey))
+        result[dot[distance < radius[dot]]] = True
+        shape_active = self.shape_active(time_ms)
+        for index in self.rect_shapes:
+            if shape_active[index]:
+                rect_x, rect_y, width, height = self.shapes[index]["rect"]
+                result |= (rect_x < x) & (x < rect_x + width) & (rect_y < y) & (y < rect_y + height)
+        return result
+
+    def collide(self, x, y, speed_x, speed_y, radius, travel, time_ms):
+        """Bounces the dots (flat arrays) off the active segments, returns the indices of the dots that hit one."""
+        shape_active = self.shape_active(time_ms)
+        active = shape_active[self.owner]
+        if not active.any():
+            return np.zeros(0, dtype=np.int64)
+        # Where the dots came from, before any bounce of this step changes their speed
+        prev_x, prev_y = x - speed_x * travel, y - speed_y * travel
+        dot, segment = self.candidates(x, y, active)
+        hits = []
+        # A dot next to a corner can touch two segments, handle them one after the other
+        rank = ragged_arange(np.bincount(dot, minlength=len(x)))
+        for k in range(int(rank.max()) + 1 if len(rank) else 0):
+            this_round = rank == k
+            hits.append(self._bounce(dot[this_round], segment[this_round], x, y, speed_x, speed_y, radius,
+                                     prev_x, prev_y))
+        # A dot that still ends up inside a rect (it stepped past a corner, say) is pushed out of it
+        hits.append(self._push_out(x, y, speed_x, speed_y, radius, shape_active))
+        return np.unique(np.concatenate(hits))
+
+    def _push_out(self, x, y, speed_x, speed_y, radius, shape_active):
+        # Out through the nearest side (left, right, top, bottom on a tie), reflected if moving in
+        pushed = []
+        for index in self.rect_shapes:
+            if not shape_active[index]:
+                continue
+            rect_x, rect_y, width, height = self.shapes[index]["rect"]
+            i = np.flatnonzero((rect_x < x) & (x < rect_x + width) & (rect_y < y) & (y < rect_y + height))
+            if len(i) == 0:
+                continue
+            depth = np.stack([x[i] - rect_x, rect_x + width - x[i], y[i] - rect_y, rect_y + height - y[i]])
+            side = np.argmin(depth, axis=0)
+            sides = ((x, speed_x, rect_x, -1), (x, speed_x, rect_x + width, 1),
+                     (y, speed_y, rect_y, -1), (y, speed_y, rect_y + height, 1))
+            for k, (position, speed, edge, outward) in enumerate(sides):
+                j = i[side == k]
+                position[j] = edge + outward * radius[j]
+                speed[j] = np.where(speed[j] * outward < 0, -speed[j], speed[j])
+            pushed.append(i)
+        return np.unique(np.concatenate(pushed)) if pushed else np.zeros(0, dtype=np.int64)
+
+    def _bounce(self, i, k, x, y, speed_x, speed_y, radius, prev_x, prev_y):
+        ax, ay = self.ax[k], self.ay[k]
+        ex, ey = self.bx[k] - ax, self.by[k] - ay
+        length_sq = np.maximum(ex * ex + ey * ey, 1e-12)
+        px, py = x[i], y[i]
+        # Closest point of the segment to the dot
+        t = np.clip(((px - ax) * ex + (py - ay) * ey) / length_sq, 0, 1)
+        dx, dy = px - (ax + t * ex), py - (ay + t * ey)
+        distance = np.sqrt(dx * dx + dy * dy)
+
+        # A fast dot can jump over a thin segment in one step: compare the side it was on
+        side_now = ex * (py - ay) - ey * (px - ax)
+        side_before = ex * (prev_y[i] - ay) - ey * (prev_x[i] - ax)
+        # ... and that the step went between the two ends of the segment, not past one of them
+        mx, my = px - prev_x[i], py - prev_y[i]
+        side_a = mx * (ay - prev_y[i]) - my * (ax - prev_x[i])
+        side_b = mx * (ay + ey - prev_y[i]) - my * (ax + ex - prev_x[i])
+        crossed = (side_now * side_before < 0) & (side_a * side_b < 0) & (t > 0) & (t < 1)
+
+        touching = ((distance < radius[i]) & (distance > 1e-9)) | crossed
+        i, t, dx, dy, distance = i[touching], t[touching], dx[touching], dy[touching], distance[touching]
+        ex, ey, ax, ay, length_sq = ex[touching], ey[touching], ax[touching], ay[touching], length_sq[touching]
+        crossed, side_before = crossed[touching], side_before[touching]
+
+        # Normal from the segment to the dot, for a crossing dot towards the side it came from
+        length = np.sqrt(length_sq)
+        side = np.sign(side_before)
+        nx = np.where(crossed, -ey / length * side, dx / np.where(distance > 0, distance, 1))
+        ny = np.where(crossed, ex / length * side, dy / np.where(distance > 0, distance, 1))
+
+        # Push the dot out to touching distance, and reflect it if it's moving in
+        x[i] = ax + t * ex + nx * radius[i]
+        y[i] = ay + t * ey + ny * radius[i]
+        normal_speed = speed_x[i] * nx + speed_y[i] * ny
+        approaching = normal_speed < 0
+        speed_x[i] -= np.where(approaching, 2 * normal_speed * nx, 0)
+        speed_y[i] -= np.where(approaching, 2 * normal_speed * ny, 0)
+        return i
+
+    # Same as _bounce for one Dot and one segment, for the reference engine
+    def bounce_dot(self, k, dot, prev_x, prev_y):
+        """Bounces a Dot off segment k, returns True if it touched it."""
+        ax, ay = float(self.ax[k]), float(self.ay[k])
+        ex, ey = float(self.bx[k]) - ax, float(self.by[k]) - ay
+        length_sq = max(ex * ex + ey * ey, 1e-12)
+        px, py = dot.x, dot.y
+        t = min(max(((px - ax) * ex + (py - ay) * ey) / length_sq, 0.0), 1.0)
+        dx, dy = px - (ax + t * ex), py - (ay + t * ey)
+        distance = math.sqrt(dx * dx + dy * dy)
+
+        side_now = ex * (py - ay) - ey * (px - ax)
+        side_before = ex * (prev_y - ay) - ey * (prev_x - ax)
+        mx, my = px - prev_x, py - prev_y
+        side_a = mx * (ay - prev_y) - my * (ax - prev_x)
+        side_b = mx * (ay + ey - prev_y) - my * (ax + ex - prev_x)
+        crossed = side_now * side_before < 0 and side_a * side_b < 0 and 0 < t < 1
+        if not ((dot.radius > distance > 1e-9) or crossed):
+            return False
+
+        if crossed:
+            length = math.sqrt(length_sq)
+            side = math.copysign(1.0, side_before)
+            nx, ny = -ey / length * side, ex / length * side
+        else:
+            nx, ny = dx / distance, dy / distance
+        dot.x = ax + t * ex + nx * dot.radius
+        dot.y = ay + t * ey + ny * dot.radius
+        normal_speed = dot.speed_x * nx + dot.speed_y * ny
+        if normal_speed < 0:
+            dot.speed_x -= 2 * normal_speed * nx
+            dot.speed_y -= 2 * normal_speed * ny
+        return True
+
+    # Same as _push_out for one Dot, for the reference engine
+    def push_out_dot(self, dot, shape_active):
+        """Pushes a Dot out of every active rect its centre is in, returns True if it was in one."""
+        pushed = False
+        for index in self.rect_shapes:
+            if not shape_active[index]:
+                continue
+            rect_x, rect_y, width, height = self.shapes[index]["rect"]
+            if not (rect_x < dot.x < rect_x + width and rect_y < dot.y < rect_y + height):
+                continue
+            depth = [dot.x - rect_x, rect_x + width - dot.x, dot.y - rect_y, rect_y + height - dot.y]
+            side = depth.index(min(depth))
+            axis, edge, outward = (("x", rect_x, -1), ("x", rect_x + width, 1),
+                                   ("y", rect_y, -1), ("y", rect_y + height, 1))[side]
+            setattr(dot, axis, edge + outward * dot.radius)
+            speed = getattr(dot, "speed_" + axis)
+            if speed * outward < 0:
+                setattr(dot, "speed_" + axis, -speed)
+            pushed = True
+        return pushed
+
+    def segments_near(self, x, y):
+        """Segment indices listed in the cell of the point (x, y)."""
+        cell = int(self.cell_of(x, y))
+        return self.cell_segments[self.cell_start[cell]:self.cell_start[cell + 1]].tolist()
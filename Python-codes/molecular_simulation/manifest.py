@@ -0,0 +1,57 @@
+import json
+import os
+
+import numpy as np
+
+
+# --- Run Manifest ---
+# Everything needed to replay a run bit for bit: the full config, the engine and
+# the state of the random generator before the first draw.
+
+def new_rng(seed=None):
+    """A Generator and the seed it came from (a fresh random seed when none is given)."""
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    return np.random.default_rng(seed), seed
+
+
+def rng_from_state(state):
+    rng = np.random.default_rng()
+    rng.bit_generator.state = state
+    return rng
+
+
+def make_manifest(config, engine, replicas, frames, seed, rng_state):
+    return {
+        "scenario": config["SCENARIO"],
+        "engine": engine,
+        "replicas": replicas,
+        "frames": frames,
+        "seed": seed,
+        "rng_state": rng_state,
+        "numpy_version": np.__version__,
+        "config": {key: value for key, value in config.items() if key != "SCENARIO"},
+    }
+
+
+def default_manifest_path(config, observables=None):
+    """Next to the video (or the observables file) with a .json extension."""
+    if config["RECORD_VIDEO"]:
+        return os.path.splitext(config["OUTPUT"])[0] + ".json"
+    if observables:
+        return os.path.splitext(observables)[0] + ".json"
+    return None
+
+
+def write_manifest(filename, manifest):
+    with open(filename, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_manifest(filename):
+    with open(filename) as f:
+        manifest = json.load(f)
+    for key in ("scenario", "engine", "replicas", "frames", "rng_state", "config"):
+        if key not in manifest:
+            raise ValueError(f"{filename} is not a run manifest (no {key!r})")
+    return manifest
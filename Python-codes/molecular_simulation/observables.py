@@ -0,0 +1,148 @@
+import numpy as np
+
+
+# --- Observables ---
+# Every function takes an ArraySimulation and returns one value (or profile) per
+# replica, so the first axis is always the replica.
+
+def _binned_mean(sim, values, position, length, bins):
+    replicas = sim.replicas
+    bin_index = np.clip((position / length * bins).astype(np.int64), 0, bins - 1)
+    flat = (np.arange(replicas)[:, None] * bins + bin_index).ravel()
+    sums = np.bincount(flat, values.ravel().astype(np.float64), replicas * bins).reshape(replicas, bins)
+    counts = np.bincount(flat, minlength=replicas * bins).reshape(replicas, bins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def temperature_profile(sim, bins=20):
+    """Mean kinetic energy per dot in vertical slices from the left to the right wall."""
+    kinetic = 0.5 * sim.mass * (sim.speed_x**2 + sim.speed_y**2)
+    return _binned_mean(sim, kinetic, sim.x, sim.width, bins)
+
+
+def velocity_profile(sim, bins=20):
+    """Mean horizontal speed in horizontal slices from the top to the bottom wall."""
+    return _binned_mean(sim, sim.speed_x, sim.y, sim.height, bins)
+
+
+def mixing_fraction(sim):
+    """Fraction of the dots left of the partition position (0.5 when fully mixed)."""
+    return (sim.x < sim.config["PARTITION_X"]).mean(axis=1)
+
+
+def _species_counts(sim, bins):
+    # Dots of each species in vertical slices from the left to the right wall, (replicas, species, bins)
+    num_species = len(sim.species_table) if sim.species_table is not None else 1
+    bin_index = np.clip((sim.x / sim.width * bins).astype(np.int64), 0, bins - 1)
+    flat = ((np.arange(sim.replicas)[:, None] * num_species + sim.species) * bins + bin_index).ravel()
+    return np.bincount(flat, minlength=sim.replicas * num_species * bins).reshape(sim.replicas, num_species, bins)
+
+
+def concentration_profile(sim, bins=20):
+    """Fraction of the dots of each species in vertical slices, shape (replicas, species, bins)."""
+    counts = _species_counts(sim, bins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return counts / counts.sum(axis=1, keepdims=True)
+
+
+def mixing_index(sim, bins=20):
+    """0 when every slice holds one species only, 1 when every slice has the overall composition.
+
+    1 - (squared deviation of the slices' composition from the overall one, weighted by
+    the dots in each slice) / (the same for fully separated species). Needs two species or more.
+    """
+    counts = _species_counts(sim, bins).astype(np.float64)
+    per_slice = counts.sum(axis=1, keepdims=True)
+    overall = counts.sum(axis=2, keepdims=True) / counts.sum(axis=(1, 2), keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        composition = np.where(per_slice > 0, counts / per_slice, overall)
+        deviation = (per_slice * (composition - overall)**2).sum(axis=(1, 2)) / per_slice.sum(axis=(1, 2))
+        separated = (overall * (1 - overall)).sum(axis=(1, 2))
+        return 1 - deviation / separated
+
+
+# Totals are summed in float64 whatever the precision of the state
+def kinetic_energy(sim):
+    return 0.5 * (sim.mass * (sim.speed_x**2 + sim.speed_y**2)).sum(axis=1, dtype=np.float64)
+
+
+def momentum(sim):
+    """Total momentum (px, py) per replica, shape (replicas, 2)."""
+    return np.stack([(sim.mass * sim.speed_x).sum(axis=1, dtype=np.float64),
+                     (sim.mass * sim.speed_y).sum(axis=1, dtype=np.float64)], axis=1)
+
+
+def momentum_scale(sim):
+    """Sum of |m v| per replica, to express momentum errors as a fraction."""
+    return (sim.mass * np.hypot(sim.speed_x, sim.speed_y)).sum(axis=1, dtype=np.float64)
+
+
+OBSERVABLES = {
+    "temperature_profile": temperature_profile,
+    "velocity_profile": velocity_profile,
+    "mixing_fraction": mixing_fraction,
+    "concentration_profile": concentration_profile,
+    "mixing_index": mixing_index,
+    "kinetic_energy": kinetic_energy,
+}
+SPECIES_OBSERVABLES = ("concentration_profile", "mixing_index")  # Only mean something with two species or more
+
+
+def recorded_observables(config):
+    """Names of the OBSERVABLES a run records: all of them, but the species ones only with several species."""
+    if len(config["SPECIES"]) > 1:
+        return tuple(OBSERVABLES)
+    return tuple(name for name in OBSERVABLES if name not in SPECIES_OBSERVABLES)
+
+
+def _nanmean(values, axis=0):
+    # np.nanmean, but an all-NaN slice is NaN without a warning; also returns how many values each mean has
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(valid, values, 0.0).sum(axis=axis) / count, count
+
+
+def ensemble_average(values):
+    """Mean over the replicas and its standard error, ignoring empty bins.
+
+    The error is NaN where fewer than two replicas have a value (one replica has no spread).
+    """
+    values = np.asarray(values, dtype=float)
+    mean, count = _nanmean(values)
+    deviation = np.where(np.isnan(values), 0.0, values - mean)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = (deviation**2).sum(axis=0) / (count - 1)
+        error = np.where(count >= 2, np.sqrt(variance / count), np.nan)
+    return mean, error
+
+
+# Collects the observables every `every` frames during a run
+class ObservableRecorder:
+    def __init__(self, every, names=tuple(OBSERVABLES)):
+        self.every = every
+        self.names = names
+        self.frames = []
+        self.samples = {name: [] for name in names}
+
+    def sample(self, sim):
+        if sim.frame % self.every:
+            return
+        self.frames.append(sim.frame)
+        for name in self.names:
+            self.samples[name].append(OBSERVABLES[name](sim))
+
+    def save(self, filename, **extra):
+        """Writes per-replica samples (frames, replicas, ...) and the ensemble average of the time mean."""
+        data = {"frames": np.array(self.frames)}
+        data.update(extra)
+        for name, samples in self.samples.items():
+            per_replica = np.array(samples, dtype=float)
+            data[name] = per_replica
+            if not len(samples):
+                continue  # The run ended before the first sample
+            time_mean, _ = _nanmean(per_replica)
+            data[name + "_mean"], data[name + "_error"] = ensemble_average(time_mean)
+        np.savez(filename, **data)
+        return data
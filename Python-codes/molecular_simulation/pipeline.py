@@ -0,0 +1,128 @@
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+FIELDS = ("x", "y", "radius", "speed_x", "speed_y", "mass")
+HEADER = ("sequence", "frame", "time_frames", "shear_offset")
+END = -1  # Sequence number that tells the renderer to finish
+
+
+# --- Shared Frame Buffers ---
+# One slot holds everything the renderer needs for one frame: a small header and the
+# dot arrays, all in one shared memory block, so nothing is pickled between the
+# processes. The simulation writes one slot while the renderer draws the other.
+class FrameBuffer:
+    def __init__(self, num_dots, name=None):
+        if name is None:
+            size = 8 * (len(HEADER) + len(FIELDS) * num_dots) + 2 * num_dots  # + colliding and species
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        buffer = self.shm.buf
+        self.header = np.ndarray(len(HEADER), np.float64, buffer)
+        self.arrays = {}
+        offset = 8 * len(HEADER)
+        for field in FIELDS:
+            self.arrays[field] = np.ndarray(num_dots, np.float64, buffer, offset)
+            offset += 8 * num_dots
+        self.arrays["colliding"] = np.ndarray(num_dots, np.bool_, buffer, offset)
+        self.arrays["species"] = np.ndarray(num_dots, np.int8, buffer, offset + num_dots)
+
+    def write(self, sequence, sim):
+        state = sim.snapshot()
+        for field, array in self.arrays.items():
+            array[:] = state[field]
+        self.header[:] = (sequence, sim.frame, sim.time_frames, sim.shear_offset)
+
+    def close(self, unlink=False):
+        # The numpy views have to go before the memory can be released
+        del self.header, self.arrays
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class SharedFrame:
+    """What Renderer.draw needs from a simulation, read from a frame buffer."""
+
+    def __init__(self, buffer):
+        header = dict(zip(HEADER, buffer.header.tolist()))
+        self.frame = int(header["frame"])
+        self.time_frames = header["time_frames"]
+        self.shear_offset = header["shear_offset"]
+        self._state = buffer.arrays
+
+    def snapshot(self):
+        return self._state
+
+
+def render_frames(config, names, free, filled):
+    """Renderer process: draws and encodes the frames in sequence order until the END marker."""
+    from .render import Renderer
+    from .video import VideoWriter
+
+    renderer = Renderer(config, headless=True)
+    video = VideoWriter(config["OUTPUT"], config["FPS"], renderer.size)
+    buffers = [FrameBuffer(config["NUM_DOTS"], name) for name in names]
+    expected = 0
+    try:
+        while True:
+            slot = expected % len(buffers)
+            filled[slot].acquire()
+            sequence = int(buffers[slot].header[0])
+            if sequence == END:
+                break
+            if sequence != expected:
+                raise RuntimeError(f"Render process expected frame {expected}, got {sequence}")
+            renderer.draw(SharedFrame(buffers[slot]))
+            frame = renderer.frame_bgr()
+            # The frame is copied out, the simulation can reuse the slot while this one is encoded
+            free[slot].release()
+            video.write(frame)
+            expected += 1
+    finally:
+        video.release()
+        renderer.close()
+        for buffer in buffers:
+            buffer.close()
+
+
+# --- Render Pipeline ---
+# The simulation process publishes a snapshot per frame, a second process draws and
+# encodes it. With two slots the next step runs while the last frame is drawn, so a
+# frame costs about max(step, draw + encode) instead of their sum.
+class RenderPipeline:
+    def __init__(self, config, slots=2):
+        context = multiprocessing.get_context("spawn")
+        self.buffers = [FrameBuffer(config["NUM_DOTS"]) for _ in range(slots)]
+        self.free = [context.Semaphore(1) for _ in range(slots)]
+        self.filled = [context.Semaphore(0) for _ in range(slots)]
+        self.sequence = 0
+        self.process = context.Process(
+            target=render_frames, args=(config, [buffer.shm.name for buffer in self.buffers], self.free, self.filled),
+            daemon=True)
+        self.process.start()
+
+    def _acquire(self, slot):
+        # Waits for the renderer to let go of the slot, fails if the renderer died
+        while not self.free[slot].acquire(timeout=1.0):
+            if not self.process.is_alive():
+                raise RuntimeError("The render process stopped")
+
+    def publish(self, sim):
+        slot = self.sequence % len(self.buffers)
+        self._acquire(slot)
+        self.buffers[slot].write(self.sequence, sim)
+        self.filled[slot].release()
+        self.sequence += 1
+
+    def close(self):
+        if self.process.is_alive():
+            slot = self.sequence % len(self.buffers)
+            self._acquire(slot)
+            self.buffers[slot].header[0] = END
+            self.filled[slot].release()
+            self.process.join()
+        for buffer in self.buffers:
+            buffer.close(unlink=True)
@@ -0,0 +1,307 @@
+import math
+
+import numpy as np
+
+from .simulation import THERMAL_WALLS, Simulation
+from .walls import RANDOMS_PER_HIT
+
+
+# Dot class (one class for every scenario, the scenario config picks the behaviour)
+class Dot:
+    def __init__(self, index, x, y, radius, speed_x, speed_y, mass=1.0):
+        self.index = index
+        self.x = x
+        self.y = y
+        self.radius = radius
+        self.mass = mass
+        self.speed_x = speed_x
+        self.speed_y = speed_y
+        self.colliding = False
+
+    def get_speed(self):
+        return math.sqrt(self.speed_x**2 + self.speed_y**2)
+
+    def set_speed(self, new_speed, angle):
+        # `angle` is only used when the dot stands still and has no direction to keep
+        current_speed = self.get_speed()
+        if current_speed > 1e-6:
+            factor = new_speed / current_speed
+            self.speed_x *= factor
+            self.speed_y *= factor
+        else:
+            self.speed_x = new_speed * math.cos(angle)
+            self.speed_y = new_speed * math.sin(angle)
+
+    def move(self, speed_multiplier=1.0):
+        # The multiplier only scales the position update, not the stored speed
+        self.x += self.speed_x * speed_multiplier
+        self.y += self.speed_y * speed_multiplier
+
+    def bounce_off_dot(self, other, model):
+        if model == "impulse":
+            self._bounce_impulse(other)
+        elif model == "separate":
+            self._bounce_separate(other)
+        else:
+            self._bounce_resolve(other)
+
+    # base / spatial / partition
+    def _bounce_impulse(self, other):
+        dx = self.x - other.x
+        dy = self.y - other.y
+        distance = math.sqrt(dx**2 + dy**2)
+
+        if 0 < distance < self.radius + other.radius:
+            nx = dx / distance
+            ny = dy / distance
+            dp = (self.speed_x - other.speed_x) * nx + (self.speed_y - other.speed_y) * ny
+            impulse = (2 * dp) / (self.mass + other.mass)  # dp for the default equal masses
+            self.speed_x -= impulse * other.mass * nx
+            self.speed_y -= impulse * other.mass * ny
+            other.speed_x += impulse * self.mass * nx
+            other.speed_y += impulse * self.mass * ny
+            self.colliding = True
+            other.colliding = True
+
+    # partition-middle / temperature-increase
+    def _bounce_separate(self, other):
+        dx = self.x - other.x
+        dy = self.y - other.y
+        distance_sq = dx**2 + dy**2
+        min_dist = self.radius + other.radius
+
+        if 0 < distance_sq < min_dist**2:
+            distance = math.sqrt(distance_sq)
+            nx = dx / distance
+            ny = dy / distance
+            dp = (self.speed_x - other.speed_x) * nx + (self.speed_y - other.speed_y) * ny
+
+            # Only when the dots are moving towards each other
+            if dp < 0:
+                impulse = (2 * dp) / (self.mass + other.mass)
+                self.speed_x -= impulse * other.mass * nx
+                self.speed_y -= impulse * other.mass * ny
+                other.speed_x += impulse * self.mass * nx
+                other.speed_y += impulse * self.mass * ny
+                self.colliding = True
+                other.colliding = True
+
+                # Prevent sticking, move each dot half the overlap
+                move_amount = (min_dist - distance) * 0.5
+                self.x += move_amount * nx
+                self.y += move_amount * ny
+                other.x -= move_amount * nx
+                other.y -= move_amount * ny
+
+    # thermal-conductivity / viscosity
+    def _bounce_resolve(self, other):
+        dx = other.x - self.x
+        dy = other.y - self.y
+        distance_sq = dx**2 + dy**2
+        min_dist = self.radius + other.radius
+
+        if 1e-6 < distance_sq < min_dist**2:
+            distance = math.sqrt(distance_sq)
+            overlap = (min_dist - distance) / 2.0
+            nx = dx / distance
+            ny = dy / distance
+            self.x -= overlap * nx
+            self.y -= overlap * ny
+            other.x += overlap * nx
+            other.y += overlap * ny
+
+            dot_product = (self.speed_x - other.speed_x) * nx + (self.speed_y - other.speed_y) * ny
+            if dot_product < 0:
+                m1 = self.mass
+                m2 = other.mass
+                impulse_scalar = (2 * dot_product) / (m1 + m2)
+                self.speed_x -= impulse_scalar * m2 * nx
+                self.speed_y -= impulse_scalar * m2 * ny
+                other.speed_x += impulse_scalar * m1 * nx
+                other.speed_y += impulse_scalar * m1 * ny
+                self.colliding = True
+                other.colliding = True
+
+
+# Grid class for spatial partitioning
+class Grid:
+    def __init__(self, width, height, cell_size):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.cols = int(math.ceil(width / cell_size))
+        self.rows = int(math.ceil(height / cell_size))
+        self.grid = {}
+
+    def get_cell_coordinates(self, x, y):
+        col = max(0, min(self.cols - 1, int(x // self.cell_size)))
+        row = max(0, min(self.rows - 1, int(y // self.cell_size)))
+        return col, row
+
+    def add_dot(self, dot):
+        cell_coords = self.get_cell_coordinates(dot.x, dot.y)
+        if cell_coords not in self.grid:
+            self.grid[cell_coords] = []
+        self.grid[cell_coords].append(dot)
+
+    def clear(self):
+        self.grid = {}
+
+    def get_nearby_dots(self, dot):
+        nearby_dots = []
+        center_col, center_row = self.get_cell_coordinates(dot.x, dot.y)
+        for i in range(-1, 2):
+            for j in range(-1, 2):
+                cell_coords = (center_col + i, center_row + j)
+                if cell_coords in self.grid:
+                    nearby_dots.extend(self.grid[cell_coords])
+        return [d for d in nearby_dots if d is not dot]
+
+
+# --- Reference Simulation ---
+# The per-dot Python loop of the original scripts, driven by a scenario config.
+class ReferenceSimulation(Simulation):
+    def __init__(self, config, rng=None):
+        super().__init__(config)
+        if config["BOUNDARY"] != "walls":
+            raise ValueError("Lees-Edwards boundaries need the array engine")
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.dots = self._create_dots()
+        self.grid = Grid(self.width, self.height, config["CELL_SIZE"])
+
+    # --- Dot Creation ---
+    def _create_dots(self):
+        # Same batched draws as the array engine, then one Dot per row entry
+        state = self.initial_state(self.rng)
+        self.species = state["species"][0]  # Only for drawing, the radius and mass are on the Dot
+        columns = [state[key][0].tolist() for key in ("x", "y", "radius", "speed_x", "speed_y", "mass")]
+        return [Dot(index, *values) for index, values in enumerate(zip(*columns))]
+
+    # --- Walls ---
+    def bounce_off_walls(self, dot):
+        # Left / right walls
+        if dot.x <= dot.radius:
+            self._wall_hit(dot, "LEFT", "x", dot.radius, 1)
+        elif dot.x >= self.width - dot.radius:
+            self._wall_hit(dot, "RIGHT", "x", self.width - dot.radius, -1)
+        # Top / bottom walls
+        if dot.y <= dot.radius:
+            self._wall_hit(dot, "TOP", "y", dot.radius, 1)
+        elif dot.y >= self.height - dot.radius:
+            self._wall_hit(dot, "BOTTOM", "y", self.height - dot.radius, -1)
+
+    def _wall_hit(self, dot, side, axis, limit, inward):
+        config = self.config
+        kind = config[f"{side}_WALL"]
+        speed_attr = "speed_" + axis
+        tangent_attr = "speed_y" if axis == "x" else "speed_x"
+        speed = getattr(dot, speed_attr)
+        # Drawn as the hit happens, dots go by id and the left / right wall comes first like in the array engine
+        randoms = None
+        if kind in RANDOMS_PER_HIT:
+            randoms = self.draw_wall_randoms(self.rng, 1)[0]
+        if kind == "flip":
+            setattr(dot, speed_attr, -speed)
+        elif kind == "clamp":
+            setattr(dot, axis, limit)  # Prevent sticking
+            setattr(dot, speed_attr, -speed)
+        elif kind == "diffuse":
+            # New speed drawn from the wall's temperature (see walls.diffuse_wall)
+            setattr(dot, axis, limit)
+            sigma = math.sqrt(config[f"{side}_WALL_TEMPERATURE"] / dot.mass)
+            setattr(dot, speed_attr, inward * sigma * math.sqrt(-2 * math.log1p(-randoms[0])))
+            setattr(dot, tangent_attr, config[f"{side}_WALL_VELOCITY"]
+                    + sigma * math.sqrt(-2 * math.log1p(-randoms[1])) * math.cos(2 * math.pi * randoms[2]))
+        else:
+            setattr(dot, axis, limit)
+            setattr(dot, speed_attr, inward * abs(speed))
+            if kind in THERMAL_WALLS:
+                target_speed = float(self.thermal_target_speed(kind, randoms[0]))
+                dot.set_speed(target_speed, 2 * math.pi * randoms[1])
+            elif kind == "moving":
+                setattr(dot, tangent_attr, config[f"{side}_WALL_VELOCITY"])  # Apply wall's velocity
+        dot.colliding = True
+
+    # --- Partition ---
+    def bounce_off_partition(self, dot):
+        if self.config["PARTITION"] == "gate":
+            if dot.x - dot.radius <= self.config["PARTITION_X"]:
+                dot.speed_x *= -1
+                dot.colliding = True
+            return
+
+        partition_left, partition_right = self.partition_edges()
+        # Moving right towards partition
+        if dot.speed_x > 0 and dot.x + dot.radius >= partition_left and dot.x < partition_left:
+            prev_x = dot.x - dot.speed_x * self.time_step  # Estimate previous position
+            if prev_x + dot.radius < partition_left:
+                dot.x = partition_left - dot.radius
+                dot.speed_x *= -1
+                dot.colliding = True
+        # Moving left towards partition
+        elif dot.speed_x < 0 and dot.x - dot.radius <= partition_right and dot.x > partition_right:
+            prev_x = dot.x - dot.speed_x * self.time_step
+            if prev_x - dot.radius > partition_right:
+                dot.x = partition_right + dot.radius
+                dot.speed_x *= -1
+                dot.colliding = True
+
+    # --- Obstacles ---
+    def bounce_off_obstacles(self, dot, shape_active, travel):
+        prev_x, prev_y = dot.x - dot.speed_x * travel, dot.y - dot.speed_y * travel
+        # Only the segments listed in the dot's cell, in the same order as the array engine
+        active = shape_active[self.obstacles.owner]
+        for segment in self.obstacles.segments_near(dot.x, dot.y):
+            if active[segment] and self.obstacles.bounce_dot(segment, dot, prev_x, prev_y):
+                dot.colliding = True
+        # Then out of any rect it still ends up in, like geometry.Obstacles.collide
+        if self.obstacles.push_out_dot(dot, shape_active):
+            dot.colliding = True
+
+    # --- Game Logic ---
+    def physics_step(self):
+        config = self.config
+        speed_multiplier = self.speed_multiplier() * self.time_step
+        partition_active = self.partition_active
+        shape_active = self.obstacles.shape_active(self.time_ms) if self.obstacles is not None else None
+
+        self.grid.clear()
+        for dot in self.dots:
+            dot.colliding = False
+            dot.move(speed_multiplier)
+            self.bounce_off_walls(dot)
+            if partition_active:
+                self.bounce_off_partition(dot)
+            if shape_active is not None and shape_active.any():
+                self.bounce_off_obstacles(dot, shape_active, speed_multiplier)
+            self.grid.add_dot(dot)
+
+        model = config["COLLISION_MODEL"]
+        dedupe = config["DEDUPE_PAIRS"]
+        for dot in self.dots:
+            if config["BROAD_PHASE"] == "all":
+                nearby_dots = self.dots
+            else:
+                nearby_dots = self.grid.get_nearby_dots(dot)
+            for other_dot in nearby_dots:
+                if dot is other_dot:
+                    continue
+                # Each pair once, from the dot that comes first
+                if dedupe and other_dot.index < dot.index:
+                    continue
+                dot.bounce_off_dot(other_dot, model)
+
+    def snapshot(self):
+        """Current dot state as arrays, which is what the renderer draws."""
+        dots = self.dots
+        return {
+            "x": np.array([dot.x for dot in dots]),
+            "y": np.array([dot.y for dot in dots]),
+            "radius": np.array([dot.radius for dot in dots]),
+            "speed_x": np.array([dot.speed_x for dot in dots]),
+            "speed_y": np.array([dot.speed_y for dot in dots]),
+            "mass": np.array([dot.mass for dot in dots]),
+            "species": self.species,
+            "colliding": np.array([dot.colliding for dot in dots], dtype=bool),
+            "ids": np.array([dot.index for dot in dots]),
+        }
@@ -0,0 +1,375 @@
+import os
+
+import numpy as np
+
+from .camera import PAN_STEP, ZOOM_STEP, Camera
+from .geometry import obstacle_shapes
+from .species import species_entries
+from .spatial import lees_edwards_images
+
+pygame = None  # Imported by load_pygame when the first Renderer is made
+
+
+def load_pygame():
+    """Imports pygame on first use, so importing this module changes nothing."""
+    global pygame
+    if pygame is None:
+        os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # No banner when the package is used as a library
+        import pygame as module
+        pygame = module
+    return pygame
+
+
+# Helper function for color interpolation
+def lerp_color(color1, color2, t):
+    t = max(0, min(1, t))
+    r = int(color1[0] + (color2[0] - color1[0]) * t)
+    g = int(color1[1] + (color2[1] - color1[1]) * t)
+    b = int(color1[2] + (color2[2] - color1[2]) * t)
+    return (r, g, b)
+
+
+# Helper function to map speed to color (blue -> green -> yellow -> red)
+def get_color_from_speed(speed, min_speed, max_speed):
+    if max_speed <= min_speed: return (0, 255, 0)
+    normalized_speed = max(0, min(1, (speed - min_speed) / (max_speed - min_speed)))
+    blue, green, yellow, red = (0, 0, 255), (0, 255, 0), (255, 255, 0), (255, 0, 0)
+    if normalized_speed < 0.33: return lerp_color(blue, green, normalized_speed / 0.33)
+    elif normalized_speed < 0.66: return lerp_color(green, yellow, (normalized_speed - 0.33) / 0.33)
+    else: return lerp_color(yellow, red, (normalized_speed - 0.66) / 0.34)
+
+
+def draw_color_bar(surface, font, x, y, width, height, min_val, max_val, text_color, label_text="Speed"):
+    """Draws a horizontal color bar legend."""
+    for i in range(width):
+        current_val = min_val + (i / width) * (max_val - min_val)
+        color = get_color_from_speed(current_val, min_val, max_val)
+        pygame.draw.line(surface, color, (x + i, y), (x + i, y + height - 1))
+
+    pygame.draw.rect(surface, text_color, (x, y, width, height), 1)
+
+    label_surf = font.render(label_text, True, text_color)
+    min_surf = font.render(f"{min_val:.1f}", True, text_color)
+    max_surf = font.render(f"{max_val:.1f}", True, text_color)
+    surface.blit(label_surf, label_surf.get_rect(midbottom=(x + width / 2, y - 2)))
+    surface.blit(min_surf, min_surf.get_rect(midtop=(x, y + height + 2)))
+    surface.blit(max_surf, max_surf.get_rect(midtop=(x + width, y + height + 2)))
+
+
+def speed_colormap(levels=256):
+    """get_color_from_speed as a (levels, 3) lookup table for whole arrays."""
+    return np.array([get_color_from_speed(i, 0, levels - 1) for i in range(levels)], dtype=np.uint8)
+
+
+# Keys that move the camera in the window
+PAN_KEYS = {"left": (-PAN_STEP, 0), "right": (PAN_STEP, 0), "up": (0, -PAN_STEP), "down": (0, PAN_STEP)}
+ZOOM_KEYS = {"=": ZOOM_STEP, "+": ZOOM_STEP, "[+]": ZOOM_STEP, "-": 1 / ZOOM_STEP, "[-]": 1 / ZOOM_STEP}
+RESET_KEYS = ("0", "[0]", "home")
+
+DENSITY_LABELS = {
+    "count": "Dots per {bin}",
+    "speed": "Mean Particle Speed",
+    "kinetic_energy": "Mean Kinetic Energy",
+}
+
+
+def density_label(config):
+    """Legend of the density colour bar; counts are per histogram bin, which is 1/DENSITY_SCALE pixels wide."""
+    side = 1 / config["DENSITY_SCALE"]
+    return DENSITY_LABELS[config["DENSITY_WEIGHT"]].format(bin="pixel" if side == 1 else f"{side:g}x{side:g} pixels")
+
+
+# --- Renderer ---
+# Draws a simulation snapshot the same way the standalone scripts do.
+# Frames are always drawn off-screen at full size (that's what gets recorded), the
+# window only shows a copy, scaled down by `preview_scale`, when flip() is called.
+# What part of the container the frame shows is up to the camera (camera.Camera),
+# and only the dots in view are drawn.
+class Renderer:
+    def __init__(self, config, headless=False, preview_scale=1.0):
+        self.config = config
+        self.headless = headless
+        self.size = (config["WIDTH"], config["HEIGHT"])
+        load_pygame()
+
+        # Drawing into a surface needs no pygame module at all, only a window needs the
+        # display (and only text needs fonts), so headless runs don't start SDL video or audio
+        self.screen = pygame.Surface(self.size)
+        self.window = None
+        self.keys = []  # Names of the keys pressed since the last handle_events
+        if not headless:
+            pygame.display.init()
+            window_size = (max(1, int(self.size[0] * preview_scale)), max(1, int(self.size[1] * preview_scale)))
+            self.window = pygame.display.set_mode(window_size)
+            pygame.display.set_caption(config["CAPTION"])
+
+        self.font = None
+        if config["DRAW_COLOR_BAR"] or config["RENDER_MODE"] != "circles":
+            pygame.font.init()
+            try:
+                self.font = pygame.font.SysFont("Arial", config["FONT_SIZE"])
+            except Exception:
+                print("Arial font not found, using default pygame font.")
+                self.font = pygame.font.Font(None, config["FONT_SIZE"] + 4)
+        self.colormap = speed_colormap()
+        self.obstacles = obstacle_shapes(config)
+        self.species_colors = [entry["color"] for entry in species_entries(config)]
+        self.camera = Camera(config, self.size)
+
+    def in_view(self, x, y):
+        """Mask of the dots the camera sees, with a margin for the ones partly in view."""
+        return self.camera.visible(x, y, self.config["MAX_DOT_RADIUS"])
+
+    def use_density(self, state):
+        mode = self.config["RENDER_MODE"]
+        if mode == "auto":
+            return int(self.in_view(state["x"], state["y"]).sum()) > self.config["DENSITY_THRESHOLD"]
+        return mode == "density"
+
+    def draw(self, sim):
+        config = self.config
+        screen = self.screen
+        width, height = self.size
+        self.camera.update(sim.time_frames / config["FPS"])
+        state = sim.snapshot()
+        density = self.use_density(state)
+        screen.fill(config["BACKGROUND_COLOR"])
+        if density:
+            color_range = self._draw_density(state)
+
+        # Draw the partition and the other obstacles that are there right now
+        self._draw_obstacles(sim.time_frames * 1000 / config["FPS"])
+
+        # Draw the container walls
+        if "hot" in (config["LEFT_WALL"], config["RIGHT_WALL"]):
+            self._draw_thermal_walls()
+        else:
+            left, top = self.camera.to_screen(0, 0)
+            right, bottom = self.camera.to_screen(config["CONTAINER_WIDTH"], config["CONTAINER_HEIGHT"])
+            pygame.draw.rect(screen, config["WALL_COLOR"], (round(left), round(top), round(right - left), round(bottom - top)), 2)
+
+        if config["DRAW_MOVING_WALL_MARKERS"]:
+            self._draw_wall_markers(sim)
+
+        if density:
+            draw_color_bar(screen, self.font,
+                           50, height - 50, width - 100, 20, *color_range,
+                           config["TEXT_COLOR"], label_text=density_label(config))
+            return
+
+        self._draw_dots(state, sim.shear_offset)
+
+        if config["DRAW_COLOR_BAR"]:
+            draw_color_bar(screen, self.font,
+                           50, height - 50, width - 100, 20,
+                           config["MIN_SPEED_COLOR"], config["MAX_SPEED_COLOR"],
+                           config["TEXT_COLOR"], label_text=config["COLOR_BAR_LABEL"])
+
+    def _draw_obstacles(self, time_ms):
+        for shape in self.obstacles:
+            until_ms = shape.get("until_ms")
+            if not (shape.get("from_ms", 0) <= time_ms and (until_ms is None or time_ms < until_ms)):
+                continue
+            color = shape.get("color", self.config["WALL_COLOR"])
+            scale = self.camera.scale
+            if "rect" in shape:
+                x, y, width, height = shape["rect"]
+                x, y = self.camera.to_screen(x, y)
+                pygame.draw.rect(self.screen, color, pygame.Rect(round(x), round(y), max(1, round(width * scale)),
+                                                                 max(1, round(height * scale))))
+            else:
+                x1, y1, x2, y2 = shape["segment"]
+                pygame.draw.line(self.screen, color, self.camera.to_screen(x1, y1), self.camera.to_screen(x2, y2), 2)
+
+    def _draw_thermal_walls(self):
+        config = self.config
+        left, top = self.camera.to_screen(0, 0)
+        right, bottom = self.camera.to_screen(config["CONTAINER_WIDTH"], config["CONTAINER_HEIGHT"])
+        right, bottom = right - 1, bottom - 1
+        wall_thickness = 5
+        pygame.draw.line(self.screen, config["HOT_WALL_COLOR"], (left, top), (left, bottom + 1), wall_thickness)  # Left Hot
+        pygame.draw.line(self.screen, config["COLD_WALL_COLOR"], (right, top), (right, bottom + 1), wall_thickness)  # Right Cold
+        pygame.draw.line(self.screen, config["WALL_COLOR"], (left, top), (right + 1, top), wall_thickness)  # Top
+        pygame.draw.line(self.screen, config["WALL_COLOR"], (left, bottom), (right + 1, bottom), wall_thickness)  # Bottom
+
+    def _draw_wall_markers(self, sim):
+        # Markers slide along the top wall at the wall's speed and wrap around
+        config = self.config
+        container_width = config["CONTAINER_WIDTH"]
+        spacing = container_width / config["NUM_WALL_MARKERS"]
+        if config["BOUNDARY"] == "lees-edwards":
+            offset = sim.shear_offset  # The copy of the box above slides past the top edge
+        else:
+            offset = sim.time_frames * config["TOP_WALL_VELOCITY"]
+        _, top = self.camera.to_screen(0, 0)
+        top = int(top)
+        for i in range(config["NUM_WALL_MARKERS"]):
+            marker_x, _ = self.camera.to_screen((i * spacing + offset) % container_width, 0)
+            pygame.draw.line(self.screen, config["WALL_MARKER_COLOR"],
+                             (int(marker_x), top), (int(marker_x), top + config["WALL_MARKER_HEIGHT"]), 2)
+
+    def _draw_dots(self, state, shear_offset=0.0):
+        config = self.config
+        xs, ys = state["x"], state["y"]
+        source = np.arange(len(xs))
+        if config["BOUNDARY"] == "lees-edwards":
+            # Dots crossing an edge are drawn on the other side too, where the pair search sees them
+            xs, ys, source = lees_edwards_images(xs, ys, config["MAX_DOT_RADIUS"],
+                                                 config["CONTAINER_WIDTH"], config["CONTAINER_HEIGHT"], shear_offset)
+        visible = np.nonzero(self.in_view(xs, ys))[0]
+        xs, ys = self.camera.to_screen(xs[visible], ys[visible])
+        source = source[visible]
+        xs = xs.astype(int)
+        ys = ys.astype(int)
+        radii = (state["radius"][source] * self.camera.scale).astype(int)
+
+        if config["COLOR_MODE"] == "speed":
+            speeds = np.hypot(state["speed_x"], state["speed_y"])[source]
+            min_speed, max_speed = config["MIN_SPEED_COLOR"], config["MAX_SPEED_COLOR"]
+            colors = [get_color_from_speed(speed, min_speed, max_speed) for speed in speeds]
+        elif config["COLOR_MODE"] == "species" and self.species_colors:
+            species_colors = self.species_colors
+            colors = [species_colors[species] for species in state["species"][source].tolist()]
+        else:
+            dot_color, collision_color = config["DOT_COLOR"], config["COLLISION_COLOR"]
+            colors = [collision_color if hit else dot_color for hit in state["colliding"][source]]
+
+        draw_circle = pygame.draw.circle
+        for x, y, radius, color in zip(xs.tolist(), ys.tolist(), radii.tolist(), colors):
+            draw_circle(self.screen, color, (x, y), radius)
+
+    def _draw_density(self, state):
+        # Splat the dots into a 2D histogram instead of drawing every circle, the cost
+        # depends on the number of pixels rather than the number of dots.
+        # DENSITY_SCALE is histogram bins per pixel: 2 is sub-pixel (smoothed down), 0.5 is coarser.
+        # Only the part of the container in view is binned.
+        config = self.config
+        left, top, right, bottom = self.camera.region()
+        pixels_x = max(1, round((right - left) * self.camera.scale))
+        pixels_y = max(1, round((bottom - top) * self.camera.scale))
+        scale = config["DENSITY_SCALE"]
+        bins_x = max(1, int(pixels_x * scale))
+        bins_y = max(1, int(pixels_y * scale))
+
+        visible = self.in_view(state["x"], state["y"])
+        state = {name: state[name][visible] for name in ("x", "y", "speed_x", "speed_y", "mass")}
+        x, y = state["x"], state["y"]
+        column = np.clip(((x - left) * (bins_x / max(right - left, 1e-12))).astype(np.int64), 0, bins_x - 1)
+        row = np.clip(((y - top) * (bins_y / max(bottom - top, 1e-12))).astype(np.int64), 0, bins_y - 1)
+        flat = column * bins_y + row  # (x, y) order, which is what pygame surfaces use
+        counts = np.bincount(flat, minlength=bins_x * bins_y).reshape(bins_x, bins_y)
+
+        weight = config["DENSITY_WEIGHT"]
+        if weight == "count":
+            values = counts.astype(float)
+            low, high = 0.0, float(np.percentile(counts[counts > 0], 99)) if counts.any() else 1.0
+        else:
+            if weight == "speed":
+                weights = np.hypot(state["speed_x"], state["speed_y"])
+            else:
+                weights = 0.5 * state["mass"] * (state["speed_x"]**2 + state["speed_y"]**2)
+            sums = np.bincount(flat, weights, minlength=bins_x * bins_y).reshape(bins_x, bins_y)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = sums / counts
+            if weight == "speed":
+                low, high = config["MIN_SPEED_COLOR"], config["MAX_SPEED_COLOR"]
+            else:
+                low, high = 0.5 * config["MIN_SPEED_COLOR"]**2, 0.5 * config["MAX_SPEED_COLOR"]**2
+        if config["DENSITY_RANGE"] is not None:
+            low, high = config["DENSITY_RANGE"]
+        high = max(high, low + 1e-9)
+
+        levels = len(self.colormap)
+        level = np.clip((values - low) / (high - low) * (levels - 1), 0, levels - 1)
+        image = self.colormap[np.nan_to_num(level).astype(np.int64)]
+        image[counts == 0] = config["BACKGROUND_COLOR"]
+
+        surface = pygame.surfarray.make_surface(image)
+        if (bins_x, bins_y) != (pixels_x, pixels_y):
+            resize = pygame.transform.smoothscale if scale > 1 else pygame.transform.scale
+            surface = resize(surface, (pixels_x, pixels_y))
+        self.screen.blit(surface, tuple(round(value) for value in self.camera.to_screen(left, top)))
+        return low, high
+
+    def frame_bgr(self):
+        """The current frame as an (height, width, 3) BGR array for OpenCV."""
+        frame = pygame.surfarray.array3d(self.screen)
+        # Pygame (w,h,c) RGB to OpenCV (h,w,c) BGR
+        return np.ascontiguousarray(frame.transpose([1, 0, 2])[:, :, ::-1])
+
+    def handle_events(self):
+        """Returns False when the window was closed or ESC was pressed."""
+        running = True
+        self.keys = []
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                name = pygame.key.name(event.key)
+                self.keys.append(name)
+                self._move_camera(name)
+        return running
+
+    def _move_camera(self, key):
+        if key in PAN_KEYS:
+            self.camera.pan(*PAN_KEYS[key])
+        elif key in ZOOM_KEYS:
+            self.camera.zoom(ZOOM_KEYS[key])
+        elif key in RESET_KEYS:
+            self.camera.reset()
+
+    def flip(self):
+        if self.window.get_size() == self.size:
+            self.window.blit(self.screen, (0, 0))
+        else:
+            pygame.transform.smoothscale(self.screen, self.window.get_size(), self.window)
+        pygame.display.flip()
+
+    def close(self):
+        pygame.quit()
+
+
+# --- Live Preview ---
+# Picks the frames that go to the window. With a fixed `every` it shows every k-th
+# frame; otherwise k adapts to the time the preview itself costs. The busy time of a
+# frame (simulation, recording) and the time to draw a shown frame into the window are
+# averaged apart. k doubles while the draws, spread over k frames, push a frame over
+# 1 / target_fps, and comes back down one step at a time while one step less still fits.
+# A step that is over budget on its own is not helped by a bigger k, so it doesn't raise it.
+class Preview:
+    MAX_EVERY = 64
+
+    def __init__(self, target_fps, every=None):
+        self.target_fps = target_fps
+        self.every = every or 1
+        self.adaptive = every is None
+        self.step_seconds = None  # Running average of the busy time per frame, without the preview
+        self.draw_seconds = None  # Running average of the time to show one frame
+        self.next_frame = 0
+
+    def due(self, frame):
+        return frame >= self.next_frame
+
+    def shown(self, frame):
+        self.next_frame = frame + self.every
+
+    def record(self, step_seconds, draw_seconds=None):
+        """Times of one frame: busy without the preview, and drawing it into the window (None when not shown)."""
+        self.step_seconds = _running_average(self.step_seconds, step_seconds)
+        if draw_seconds is not None:
+            self.draw_seconds = _running_average(self.draw_seconds, draw_seconds)
+        if not self.adaptive or self.draw_seconds is None:
+            return
+        budget = 1 / self.target_fps
+        if self.step_seconds >= budget:
+            return
+        if self.step_seconds + self.draw_seconds / self.every > budget and self.every < self.MAX_EVERY:
+            self.every = min(self.every * 2, self.MAX_EVERY)
+        elif self.every > 1 and self.step_seconds + self.draw_seconds / (self.every - 1) < budget:
+            self.every -= 1
+
+
+def _running_average(average, value):
+    return value if average is None else 0.9 * average + 0.1 * value
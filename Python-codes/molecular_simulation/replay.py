@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+
+CONSTANT_FIELDS = ("radius", "mass", "species")
+
+
+def clip_path(config, frame):
+    """File name for a clip that ends at `frame`, next to the scenario's video."""
+    stem, extension = os.path.splitext(config["OUTPUT"])
+    return f"{stem}_clip_{frame:06d}{extension or '.mp4'}"
+
+
+class ReplayFrame:
+    """What Renderer.draw needs from a simulation: a stored frame's header and dot state."""
+
+    def __init__(self, frame, time_frames, shear_offset, state):
+        self.frame = int(frame)
+        self.time_frames = float(time_frames)
+        self.shear_offset = float(shear_offset)
+        self._state = state
+
+    def snapshot(self):
+        return self._state
+
+
+# --- Instant Replay ---
+# Keeps the last `frames` frames in arrays allocated once, so a long run costs a
+# fixed amount of memory and nothing is drawn or encoded until a clip is asked for.
+# Only what changes is stored per frame: positions as float32, speeds as float16
+# (they only pick the colours) and the collision flags. Radius, mass and species are
+# kept once. The dots are stored in the order they were created, whatever order the
+# engine keeps them in.
+class ReplayBuffer:
+    def __init__(self, config, num_dots, frames):
+        self.config = config
+        self.capacity = max(1, int(frames))
+        shape = (self.capacity, num_dots)
+        self.x = np.zeros(shape, np.float32)
+        self.y = np.zeros(shape, np.float32)
+        self.speed_x = np.zeros(shape, np.float16)
+        self.speed_y = np.zeros(shape, np.float16)
+        self.colliding = np.zeros(shape, np.bool_)
+        self.frame = np.zeros(self.capacity, np.int64)
+        self.time_frames = np.zeros(self.capacity, np.float64)
+        self.shear_offset = np.zeros(self.capacity, np.float64)
+        self.constant = {"radius": np.zeros(num_dots, np.float64), "mass": np.zeros(num_dots, np.float64),
+                         "species": np.zeros(num_dots, np.int8)}
+        self.count = 0  # Frames recorded so far, the oldest ones are overwritten
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def nbytes(self):
+        """Memory the buffer holds: the frames and the constants."""
+        arrays = (self.x, self.y, self.speed_x, self.speed_y, self.colliding,
+                  self.frame, self.time_frames, self.shear_offset, *self.constant.values())
+        return sum(array.nbytes for array in arrays)
+
+    def record(self, sim):
+        """Stores the current frame (replica 0), overwriting the oldest one when full."""
+        state = sim.snapshot()
+        ids = np.asarray(state["ids"])
+        if not self.count:
+            for name in CONSTANT_FIELDS:
+                self.constant[name][ids] = state[name]
+        slot = self.count % self.capacity
+        self.x[slot, ids] = state["x"]
+        self.y[slot, ids] = state["y"]
+        self.speed_x[slot, ids] = state["speed_x"]
+        self.speed_y[slot, ids] = state["speed_y"]
+        self.colliding[slot, ids] = state["colliding"]
+        self.frame[slot] = sim.frame
+        self.time_frames[slot] = sim.time_frames
+        self.shear_offset[slot] = sim.shear_offset
+        self.count += 1
+
+    def frames(self):
+        """The buffered frames, oldest first."""
+        for index in range(self.count - len(self), self.count):
+            slot = index % self.capacity
+            state = dict(self.constant, x=self.x[slot], y=self.y[slot],
+                         speed_x=self.speed_x[slot].astype(np.float32), speed_y=self.speed_y[slot].astype(np.float32),
+                         colliding=self.colliding[slot])
+            yield ReplayFrame(self.frame[slot], self.time_frames[slot], self.shear_offset[slot], state)
+
+    def export(self, filename, renderer=None):
+        """Draws and encodes the buffered frames to a video file, returns how many were written.
+
+        Pass the run's Renderer to draw with it, otherwise a headless one is made for the clip.
+        """
+        return render_frames(self.config, self.frames(), filename, renderer)
+
+
+def render_frames(config, frames, filename, renderer=None):
+    """Draws and encodes stored frames (ReplayFrame) to a video file, returns how many were written."""
+    from .render import Renderer
+    from .video import VideoWriter
+
+    own_renderer = renderer is None
+    if own_renderer:
+        renderer = Renderer(config, headless=True)
+    video = VideoWriter(filename, config["FPS"], renderer.size)
+    written = 0
+    try:
+        for frame in frames:
+            renderer.draw(frame)
+            video.write(renderer.frame_bgr())
+            written += 1
+    finally:
+        video.release()
+        if own_renderer:
+            renderer.close()
+    return written
@@ -0,0 +1,233 @@
+import copy
+import json
+import time
+
+from .manifest import default_manifest_path, make_manifest, new_rng, rng_from_state, write_manifest
+
+ENGINES = ("reference", "array")
+
+
+def make_simulation(config, engine="reference", replicas=1, rng=None):
+    if engine == "reference":
+        if replicas != 1:
+            raise ValueError("Ensembles (replicas > 1) need the array engine")
+        from .reference import ReferenceSimulation
+        return ReferenceSimulation(config, rng=rng)
+    if engine == "array":
+        from .engine import ArraySimulation
+        return ArraySimulation(config, replicas=replicas, rng=rng)
+    raise ValueError(f"Unknown engine {engine!r}, choose from: {', '.join(ENGINES)}")
+
+
+def run(config, frames=None, headless=False, engine="reference", replicas=1,
+        observables=None, sample_every=None, seed=None, rng_state=None, manifest=None,
+        transport=False, target_precision=None, warmup_frames=0,
+        until_steady=False, steady_observables=None, steady_window=10, steady_tolerance=0.02,
+        steady_action="stop", sample_frames=None, preview_every=None, preview_scale=1.0, target_fps=None,
+        pipeline=False, replay_frames=None, clip_frames=(), trajectory=None):
+    """Runs one scenario until `frames` frames are done (or the window is closed).
+
+    Pass `rng_state` from a run manifest to replay that run exactly, otherwise the
+    generator is seeded with `seed` (a fresh seed when None).
+    With `transport` the conductivity / viscosity are estimated after `warmup_frames`,
+    and `target_precision` (relative 95% half width) stops the run once they are known well enough.
+    With `until_steady` the run is watched for a steady state (`steady_window` samples of
+    `sample_every` frames); then it stops, or with steady_action "sample" only then starts
+    recording observables / transport and stops `sample_frames` later.
+    In a window only every `preview_every`-th frame is shown (adaptive when None, so the
+    run keeps up with `target_fps`, default FPS), scaled by `preview_scale`.
+    `pipeline` draws and encodes the video in a second process (headless recording only).
+    `replay_frames` keeps the last that many frames in memory; they are saved as a clip
+    at each of the `clip_frames`, and when C is pressed in the window.
+    `trajectory` saves every frame to that file in the compact trajectory format.
+    """
+    if headless and frames is None:
+        raise ValueError("Headless runs need a frame limit (--frames or --duration)")
+
+    if rng_state is not None:
+        rng = rng_from_state(rng_state)
+    else:
+        rng, seed = new_rng(seed)
+    start_state = copy.deepcopy(rng.bit_generator.state)
+
+    sim = make_simulation(config, engine, replicas, rng)
+    recorder = None
+    if observables:
+        if engine != "array":
+            raise ValueError("Observables are recorded by the array engine")
+        from .observables import ObservableRecorder, recorded_observables
+        recorder = ObservableRecorder(sample_every or config["FPS"], recorded_observables(config))
+    estimator = None
+    if transport or target_precision is not None:
+        if engine != "array":
+            raise ValueError("Transport coefficients are estimated by the array engine")
+        from .transport import TransportEstimator
+        estimator = TransportEstimator(sim, warmup_frames=warmup_frames)
+    monitor = None
+    if until_steady:
+        if engine != "array":
+            raise ValueError("Steady state detection uses the array engine")
+        from .convergence import SteadyStateMonitor, default_observables
+        monitor = SteadyStateMonitor(steady_observables or default_observables(config),
+                                     sample_every or config["FPS"], steady_window, steady_tolerance)
+    # In "sample" mode nothing is measured before the run is steady
+    sampling = monitor is None or steady_action != "sample"
+    stop_frame = None
+
+    # Only draw when somebody is going to look at the frames
+    record = config["RECORD_VIDEO"]
+    renderer = None
+    video = None
+    render_pipeline = None
+    if pipeline:
+        if not (headless and record):
+            raise ValueError("The render pipeline is for headless runs that record a video")
+        from .pipeline import RenderPipeline
+        render_pipeline = RenderPipeline(config)
+    elif record or not headless:
+        from .render import Renderer
+        renderer = Renderer(config, headless=headless, preview_scale=preview_scale)
+    if record and render_pipeline is None:
+        from .video import VideoWriter
+        video = VideoWriter(config["OUTPUT"], config["FPS"], renderer.size)
+
+    replay = None
+    clip_frames = sorted(clip_frames)
+    clips = []
+    clip_ends = []  # Frame each clip ends on
+    clip_renderer = renderer
+    if replay_frames:
+        from .replay import ReplayBuffer, clip_path
+        replay = ReplayBuffer(config, config["NUM_DOTS"], replay_frames)
+        print(f"Keeping the last {replay.capacity} frames ({replay.nbytes / 1e6:.1f} MB) for clips")
+    elif clip_frames:
+        raise ValueError("Clips need a replay buffer (replay_frames)")
+
+    trajectory_writer = None
+    if trajectory:
+        from .trajectory import TrajectoryWriter
+        trajectory_writer = TrajectoryWriter(trajectory, config, config["NUM_DOTS"])
+
+    clock = None
+    preview = None
+    if not headless:
+        from .render import Preview, load_pygame
+        clock = load_pygame().time.Clock()
+        preview = Preview(target_fps or config["FPS"], preview_every)
+
+    # With BROAD_PHASE = "auto", say which pair search the engine settles on
+    selector = getattr(sim, "selector", None)
+    broad_phase = None
+
+    start = time.perf_counter()
+    running = True
+    try:
+        while running and (frames is None or sim.frame < frames):
+            frame_start = time.perf_counter()
+            if not headless:
+                running = renderer.handle_events()
+
+            sim.step()
+            if selector is not None and selector.current != broad_phase:
+                broad_phase = selector.current
+                print(f"Broad phase: {broad_phase} from frame {selector.history[-1][0]}")
+            if monitor is not None and monitor.update(sim):
+                print(f"Steady state reached at frame {sim.frame} ({sim.time_ms / 1000:.1f} s simulated)")
+                if steady_action == "stop":
+                    running = False
+                else:
+                    sampling = True
+                    if sample_frames is not None:
+                        stop_frame = sim.frame + sample_frames
+                    if estimator is not None:
+                        estimator.warmup_frames = sim.frame
+            if sampling and recorder is not None:
+                recorder.sample(sim)
+            if sampling and estimator is not None:
+                estimator.update(sim)
+                if target_precision is not None and estimator.precise_enough(target_precision):
+                    running = False
+            if stop_frame is not None and sim.frame >= stop_frame:
+                running = False
+
+            # The video gets every frame, the window only the preview frames
+            show = preview is not None and preview.due(sim.frame)
+            draw_seconds = None  # What showing this frame costs on top of the rest
+            if render_pipeline is not None:
+                render_pipeline.publish(sim)
+            if video is not None or show:
+                draw_start = time.perf_counter()
+                renderer.draw(sim)
+                if video is None:
+                    draw_seconds = time.perf_counter() - draw_start
+            if video is not None:
+                try:
+                    video.write(renderer.frame_bgr())
+                except Exception as e:
+                    print(f"Error writing video frame: {e}")
+                    running = False
+            if trajectory_writer is not None:
+                trajectory_writer.write(sim)
+            if replay is not None:
+                replay.record(sim)
+                wanted = not headless and "c" in renderer.keys
+                while clip_frames and sim.frame >= clip_frames[0]:
+                    clip_frames.pop(0)
+                    wanted = True
+                if wanted:
+                    if clip_renderer is None:
+                        from .render import Renderer
+                        clip_renderer = Renderer(config, headless=True)
+                    clip = clip_path(config, sim.frame)
+                    written = replay.export(clip, clip_renderer)
+                    print(f"Saved a clip of {written} frames to {clip}")
+                    clips.append(clip)
+                    clip_ends.append(sim.frame)
+            if show:
+                flip_start = time.perf_counter()
+                renderer.flip()
+                draw_seconds = (draw_seconds or 0.0) + time.perf_counter() - flip_start
+                preview.shown(sim.frame)
+            if preview is not None:
+                # Measured before clock.tick, its sleep is not busy time
+                busy = time.perf_counter() - frame_start
+                preview.record(busy - (draw_seconds or 0.0), draw_seconds)
+                clock.tick(preview.target_fps)
+    finally:
+        if trajectory_writer is not None:
+            trajectory_writer.close()
+            print(f"Trajectory saved to {trajectory}")
+        if render_pipeline is not None:
+            render_pipeline.close()
+        if video is not None:
+            video.release()
+        if renderer is not None:
+            renderer.close()
+        elif clip_renderer is not None:
+            clip_renderer.close()
+
+    elapsed = time.perf_counter() - start
+    run_manifest = make_manifest(config, engine, replicas, sim.frame, seed, start_state)
+    manifest = manifest or default_manifest_path(config, observables)
+    if manifest:
+        write_manifest(manifest, run_manifest)
+    if recorder is not None:
+        recorder.save(observables, manifest=json.dumps(run_manifest))
+    return {
+        "scenario": config["SCENARIO"],
+        "engine": engine,
+        "replicas": replicas,
+        "frames": sim.frame,
+        "simulated_seconds": sim.time_ms / 1000,
+        "wall_seconds": elapsed,
+        "output": config["OUTPUT"] if record else None,
+        "observables": observables,
+        "manifest": manifest,
+        "seed": seed,
+        "transport": estimator.estimates() if estimator is not None else None,
+        "steady_frame": monitor.steady_frame if monitor is not None else None,
+        "clips": clips,
+        "clip_frames": clip_ends,
+        "trajectory": trajectory,
+        "broad_phase": selector.summary() if selector is not None else config["BROAD_PHASE"],
+    }
@@ -0,0 +1,178 @@
+import numpy as np
+
+from .geometry import Obstacles
+from .species import SpeciesTable
+from .walls import random_rows
+
+THERMAL_WALLS = ("hot", "cold")
+
+
+# --- Shared Simulation Clock ---
+# Time based events (partition removal, speed ramp) of every engine run on simulated
+# time, so they happen at the same frame whatever the speed of the machine.
+# One output frame is STEPS_PER_FRAME physics steps that each move the dots for
+# TIME_STEP frames (1 / FPS seconds each): 4 steps of 0.25 for smaller steps at the
+# same speed, 4 steps of 1.0 for a 4x time-lapse.
+class Simulation:
+    def __init__(self, config):
+        self.config = config
+        self.width = config["CONTAINER_WIDTH"]
+        self.height = config["CONTAINER_HEIGHT"]
+        self.frame = 0
+        self.time_step = config["TIME_STEP"]
+        self.time_frames = 0.0  # Simulated time, in frames
+        # The partition is not one of them, see bounce_off_partition
+        shapes = config["OBSTACLES"]
+        self.obstacles = Obstacles(shapes, config["CELL_SIZE"], self.width, self.height) if shapes else None
+        self.species_table = SpeciesTable(config) if config["SPECIES"] else None
+        self.random_rows = random_rows(config)
+        # How far the copy of the box above has slid in x (Lees-Edwards boundary only)
+        self.shear_offset = 0.0
+
+    @property
+    def time_ms(self):
+        return self.time_frames * 1000 / self.config["FPS"]
+
+    def step(self):
+        """Advances one output frame."""
+        for _ in range(self.config["STEPS_PER_FRAME"]):
+            self.physics_step()
+            self.time_frames += self.time_step
+        self.frame += 1
+
+    @property
+    def partition_active(self):
+        config = self.config
+        return config["PARTITION"] is not None and self.time_ms < config["PARTITION_DURATION_MS"]
+
+    def speed_multiplier(self):
+        config = self.config
+        ramp_ms = config["TIME_TO_REACH_FINAL_SPEED_MS"]
+        if ramp_ms <= 0 or self.time_ms >= ramp_ms:
+            return config["FINAL_SPEED_MULTIPLIER"]
+        time_fraction = self.time_ms / ramp_ms
+        initial = config["INITIAL_SPEED_MULTIPLIER"]
+        return initial + (config["FINAL_SPEED_MULTIPLIER"] - initial) * time_fraction
+
+    def spawn_range(self, region=None):
+        """x range new dots are placed in, "left" / "right" keep them on one side of PARTITION_X.
+
+        Without a region, SPAWN_REGION is used when there is a partition.
+        """
+        config = self.config
+        if region is None:
+            region = config["SPAWN_REGION"] if config["PARTITION"] is not None else "all"
+        margin = config["MAX_DOT_RADIUS"]
+        x_min, x_max = margin, self.width - margin
+        if region == "right":
+            x_min = config["PARTITION_X"] + margin
+        elif region == "left":
+            x_max = config["PARTITION_X"] - margin
+        return x_min, x_max
+
+    def partition_edges(self):
+        half = self.config["PARTITION_THICKNESS"] / 2
+        return self.config["PARTITION_X"] - half, self.config["PARTITION_X"] + half
+
+    # --- Random Numbers ---
+    # Every engine draws from one numpy Generator, in whole batches, and in the same
+    # order, so a seed gives the same starting state whichever engine runs it.
+    def initial_state(self, rng, replicas=1):
+        """Radius, position, speed, mass and species of every dot as (replicas, NUM_DOTS) arrays."""
+        config = self.config
+        shape = (replicas, config["NUM_DOTS"])
+        margin = config["MAX_DOT_RADIUS"]
+        table = self.species_table
+
+        state = {}
+        side = None
+        if table is None:
+            x_min, x_max = self.spawn_range()
+            species = np.zeros(shape, dtype=np.int8)
+            radius = rng.uniform(config["MIN_DOT_RADIUS"], config["MAX_DOT_RADIUS"], shape)
+        else:
+            # Every species in its own region, the radius comes from the table
+            species = np.tile(table.species_of_dots(), (replicas, 1))
+            bounds = np.array([self.spawn_range(region) for region in table.regions])
+            x_min, x_max = bounds[species, 0], bounds[species, 1]
+            side = np.array([{"left": -1, "right": 1}.get(region, 0) for region in table.regions])[species]
+            radius = table.radius[species]
+        state["species"] = species
+        state["radius"] = radius
+        state["x"] = rng.uniform(x_min, x_max, shape)
+        state["y"] = rng.uniform(margin, self.height - margin, shape)
+        if config["PARTITION"] == "slab" and self.partition_active:
+            self._place_beside_partition(rng, state["x"], radius, side)
+        if config["OBSTACLES"]:
+            self._place_outside_obstacles(rng, state["x"], state["y"], radius, x_min, x_max)
+
+        if config["INITIAL_VELOCITY"] == "polar":
+            average = config["INITIAL_AVERAGE_SPEED"]
+            angle = rng.uniform(0, 2 * np.pi, shape)
+            initial_speed = rng.uniform(average * 0.8, average * 1.2, shape)
+            state["speed_x"] = initial_speed * np.cos(angle)
+            state["speed_y"] = initial_speed * np.sin(angle)
+        else:
+            speed_range = config["INITIAL_SPEED_RANGE"]
+            state["speed_x"] = rng.uniform(-speed_range, speed_range, shape)
+            state["speed_y"] = rng.uniform(-speed_range, speed_range, shape)
+
+        if table is None:
+            state["mass"] = radius**2 if config["MASS_MODEL"] == "area" else np.ones(shape)
+        else:
+            # The speeds above are for mass 1: scaled so that every species starts at the same temperature
+            state["mass"] = table.mass[species]
+            state["speed_x"] /= np.sqrt(state["mass"])
+            state["speed_y"] /= np.sqrt(state["mass"])
+
+        if config["WARM_START"]:
+            # Equilibrated positions instead, at the energy drawn above
+            from .states import warm_start
+            state = warm_start(config, state, rng)
+        return state
+
+    def _place_beside_partition(self, rng, x, radius, side=None):
+        # Re-draw every dot that overlaps the partition on a random side of it, or on
+        # its own side (-1 left, 1 right, 0 either) when `side` is given
+        partition_left, partition_right = self.partition_edges()
+        overlapping = (partition_left - radius < x) & (x < partition_right + radius)
+        while overlapping.any():
+            r = radius[overlapping]
+            left = rng.uniform(r + 1, partition_left - r - 1)
+            right = rng.uniform(partition_right + r + 1, self.width - r - 1)
+            go_left = rng.random(len(r)) < 0.5
+            if side is not None:
+                go_left = np.where(side[overlapping] == 0, go_left, side[overlapping] < 0)
+            x[overlapping] = np.where(go_left, left, right)
+            overlapping = (partition_left - radius < x) & (x < partition_right + radius)
+
+    def _place_outside_obstacles(self, rng, x, y, radius, x_min, x_max, attempts=1000):
+        # Re-draw every dot that starts on an obstacle somewhere else in its spawn range
+        flat_x, flat_y, flat_radius = x.reshape(-1), y.reshape(-1), radius.reshape(-1)
+        margin = self.config["MAX_DOT_RADIUS"]
+        for _ in range(attempts):
+            overlapping = np.flatnonzero(self.obstacles.overlapping(flat_x, flat_y, flat_radius))
+            if len(overlapping) == 0:
+                return
+            low, high = np.broadcast_to(x_min, x.shape).reshape(-1), np.broadcast_to(x_max, x.shape).reshape(-1)
+            flat_x[overlapping] = rng.uniform(low[overlapping], high[overlapping])
+            flat_y[overlapping] = rng.uniform(margin, self.height - margin, len(overlapping))
+        raise ValueError("The obstacles leave no room to place the dots")
+
+    def draw_wall_randoms(self, rng, hits):
+        """(hits, random_rows) uniform numbers for this many hits on the random (hot / cold / diffuse) walls.
+
+        Only the hits on random walls take numbers, in the same order in every engine:
+        by replica, then by dot id, the left / right wall before the top / bottom one.
+        The reference draws them one hit at a time as its loop gets there, which gives
+        the same numbers as one batch.
+        """
+        return rng.random((hits, self.random_rows))
+
+    def thermal_target_speed(self, kind, fraction):
+        """Random speed around a hot or cold wall's target, fraction is uniform in [0, 1)."""
+        config = self.config
+        target = config["HOT_WALL_TARGET_SPEED" if kind == "hot" else "COLD_WALL_TARGET_SPEED"]
+        low = target * (1 - config["SPEED_RANDOM_FACTOR"])
+        high = target * (1 + config["SPEED_RANDOM_FACTOR"])
+        return np.maximum(low + (high - low) * fraction, 0.1)
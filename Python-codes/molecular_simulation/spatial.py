@@ -0,0 +1,296 @@
+import math
+
+import numpy as np
+
+# Half of the 3x3 neighbourhood: the dot's own cell plus the cells to the right and below.
+# Looking only "forward" finds every pair of neighbouring cells exactly once.
+HALF_STENCIL = ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+def ragged_arange(counts):
+    """For counts [2, 3] returns [0, 1, 0, 1, 2]: a position inside each group."""
+    total = int(counts.sum())
+    group_starts = np.cumsum(counts) - counts
+    return np.arange(total) - np.repeat(group_starts, counts)
+
+
+# Particles binned in grid cells: the particles of each cell are found through
+# `order`, starting at `starts[cell]`, `counts[cell]` of them.
+class _Grid:
+    def __init__(self, x, y, cell_size, width, height, group, n_groups):
+        self.cell_size = cell_size
+        self.cols = max(1, int(math.ceil(width / cell_size)))
+        self.rows = max(1, int(math.ceil(height / cell_size)))
+        cell_x, cell_y = self.cell_of(x, y)
+        cell = (group * self.rows + cell_y) * self.cols + cell_x
+        self.order = np.argsort(cell, kind="stable")
+        self.counts = np.bincount(cell, minlength=n_groups * self.rows * self.cols)
+        self.starts = np.cumsum(self.counts) - self.counts
+
+    def cell_of(self, x, y):
+        cell_x = np.clip((x // self.cell_size).astype(np.int64), 0, self.cols - 1)
+        cell_y = np.clip((y // self.cell_size).astype(np.int64), 0, self.rows - 1)
+        return cell_x, cell_y
+
+    def neighbours(self, cell_x, cell_y, group, dx, dy):
+        """(k, particle) for every point k and every particle in the cell (dx, dy) away from the point's cell."""
+        neighbor_x = cell_x + dx
+        neighbor_y = cell_y + dy
+        valid = (neighbor_x >= 0) & (neighbor_x < self.cols) & (neighbor_y >= 0) & (neighbor_y < self.rows)
+        source = np.nonzero(valid)[0]
+        neighbor = (group[source] * self.rows + neighbor_y[source]) * self.cols + neighbor_x[source]
+        neighbor_counts = self.counts[neighbor]
+        i = np.repeat(source, neighbor_counts)
+        j = self.order[np.repeat(self.starts[neighbor], neighbor_counts) + ragged_arange(neighbor_counts)]
+        return i, j
+
+
+# Grid based pair search for flat particle arrays.
+# `group` (e.g. the replica index) puts particles in separate copies of the grid,
+# so particles of different groups never become a pair.
+def find_pairs(x, y, cell_size, width, height, group=None, n_groups=1):
+    """Candidate pairs (i, j), i != j, of particles in the same or neighbouring cells."""
+    if group is None:
+        group = np.zeros(len(x), dtype=np.int64)
+    grid = _Grid(x, y, cell_size, width, height, group, n_groups)
+    cell_x, cell_y = grid.cell_of(x, y)
+
+    pairs_i = []
+    pairs_j = []
+    for dx, dy in HALF_STENCIL:
+        i, j = grid.neighbours(cell_x, cell_y, group, dx, dy)
+        if dx == 0 and dy == 0:
+            # Same cell: keep each pair once and skip the dot itself
+            keep = i < j
+            i, j = i[keep], j[keep]
+        pairs_i.append(i)
+        pairs_j.append(j)
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def find_pairs_in_strip(x, y, cell_size, width, height, first_col, last_col, group=None, n_groups=1):
+    """The pairs of find_pairs that are found from a particle in the cell columns first_col .. last_col - 1.
+
+    Only the particles of those columns and the one column on each side are binned, so
+    strips that cover the grid can be searched in parallel and give every pair once.
+    """
+    cols = max(1, int(math.ceil(width / cell_size)))
+    cell_x = np.clip((x // cell_size).astype(np.int64), 0, cols - 1)
+    near = np.nonzero((cell_x >= first_col - 1) & (cell_x <= last_col))[0]
+    i, j = find_pairs(x[near], y[near], cell_size, width, height, None if group is None else group[near], n_groups)
+    owned = (cell_x[near[i]] >= first_col) & (cell_x[near[i]] < last_col)
+    return near[i[owned]], near[j[owned]]
+
+
+def grid_levels(radius, max_radius, levels):
+    """Level of each particle in a hierarchical grid: the finest one whose cells still fit it."""
+    level = np.floor(np.log2(max_radius / np.maximum(radius, 1e-12)))
+    return np.clip(level, 0, levels - 1).astype(np.int64)
+
+
+# --- Hierarchical Grid ---
+# One cell size for all particles has to fit the largest one, so small particles
+# test far more neighbours than they can touch. Level k of the hierarchy has cells
+# of cell_size / 2**k and holds the particles up to max_radius / 2**k. Pairs inside
+# a level come from its own half stencil. A pair of a small and a large particle is
+# found from the small one, in the 3x3 cells around it on the large one's level:
+# those cells fit the large particle, so they also fit the pair.
+def find_pairs_hierarchical(x, y, radius, cell_size, levels, width, height, group=None, n_groups=1):
+    """Like find_pairs, with each particle binned at the level of the grid that matches its radius."""
+    if group is None:
+        group = np.zeros(len(x), dtype=np.int64)
+    level = grid_levels(radius, radius.max() if len(radius) else 1.0, levels)
+
+    pairs_i = [np.zeros(0, dtype=np.int64)]
+    pairs_j = [np.zeros(0, dtype=np.int64)]
+    for k in range(levels):
+        members = np.nonzero(level == k)[0]
+        if not len(members):
+            continue
+        size = cell_size / 2**k
+        i, j = find_pairs(x[members], y[members], size, width, height, group[members], n_groups)
+        pairs_i.append(members[i])
+        pairs_j.append(members[j])
+
+        smaller = np.nonzero(level > k)[0]
+        if not len(smaller):
+            continue
+        grid = _Grid(x[members], y[members], size, width, height, group[members], n_groups)
+        cell_x, cell_y = grid.cell_of(x[smaller], y[smaller])
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                i, j = grid.neighbours(cell_x, cell_y, group[smaller], dx, dy)
+                pairs_i.append(smaller[i])
+                pairs_j.append(members[j])
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+# --- Sort and Sweep / KD-Tree ---
+# Both give exactly the pairs of find_pairs (the same or neighbouring cells), which is
+# what the reference Dot loop tests, without binning every cell of the box: sort and
+# sweep only sorts the particles, the KD-tree splits the space where they are. Like in
+# the grid, particles pushed past an edge count as being in the edge cells.
+def _cells(x, y, cell_size, width, height):
+    cols = max(1, int(math.ceil(width / cell_size)))
+    rows = max(1, int(math.ceil(height / cell_size)))
+    cell_x = np.clip((x // cell_size).astype(np.int64), 0, cols - 1)
+    cell_y = np.clip((y // cell_size).astype(np.int64), 0, rows - 1)
+    return cell_x, cell_y, cols, rows
+
+
+def sweep_pairs(x, y, cell_size, width, height, group=None, n_groups=1):
+    """Like find_pairs: sort by cell column, pair each particle with the ones after it in its
+    own column and the next one, and keep the pairs whose rows are neighbours too.
+
+    The candidates before that filter are every pair of a column window, N times the dots
+    in two columns, so memory grows with the density: it is for dilute systems only
+    (config.dilute, which BROAD_PHASE = "sweep" checks and "auto" shortlists by)."""
+    cell_x, cell_y, cols, rows = _cells(x, y, cell_size, width, height)
+    column = cell_x if group is None else group * (cols + 1) + cell_x  # A gap between groups
+    order = np.argsort(column, kind="stable")
+    sorted_column = column[order]
+    end = np.searchsorted(sorted_column, sorted_column + 1, side="right")
+    counts = end - np.arange(len(x)) - 1
+    first = np.repeat(np.arange(len(x)), counts)
+    i = order[first]
+    j = order[first + 1 + ragged_arange(counts)]
+    keep = np.abs(cell_y[i] - cell_y[j]) <= 1
+    return i[keep], j[keep]
+
+
+def kdtree_pairs(x, y, cell_size, width, height, group=None, n_groups=1):
+    """Like find_pairs, from a KD-tree (needs SciPy)."""
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        raise ValueError('BROAD_PHASE = "kdtree" needs SciPy (pip install scipy)') from None
+    cell_x, cell_y, cols, rows = _cells(x, y, cell_size, width, height)
+    # Clamped to the grid, two particles of neighbouring cells are at most two cells apart
+    # along each axis; the groups are laid side by side further apart than that
+    px = np.clip(x, 0, cols * cell_size)
+    if group is not None:
+        px = px + group * (cols + 3) * cell_size
+    points = np.column_stack([px, np.clip(y, 0, rows * cell_size)])
+    pairs = cKDTree(points).query_pairs(2 * cell_size, p=np.inf, output_type="ndarray")
+    i, j = pairs[:, 0].astype(np.int64), pairs[:, 1].astype(np.int64)
+    keep = (np.abs(cell_x[i] - cell_x[j]) <= 1) & (np.abs(cell_y[i] - cell_y[j]) <= 1)
+    return i[keep], j[keep]
+
+
+def loop_order(i, j, ids, x, y, cell_size, width, height, group=None, both_ways=False, return_index=False):
+    """Pairs (i, j) in the order the reference Dot loop meets them.
+
+    The loop takes the dots by id, and for each dot its neighbours cell by cell
+    (column offset, then row offset) and by id inside a cell. With `both_ways` every
+    pair comes twice, once from each of its dots (DEDUPE_PAIRS off), otherwise once,
+    from the dot with the smaller id. Pass x = None for the all pairs loop (no cells).
+    With `return_index` the index of each pair in the input comes back too.
+    """
+    index = np.arange(len(i))
+    if both_ways:
+        index = np.concatenate([index, index])
+        i, j = np.concatenate([i, j]), np.concatenate([j, i])
+    else:
+        swap = ids[i] > ids[j]
+        i, j = np.where(swap, j, i), np.where(swap, i, j)
+    if x is None:
+        neighbour_rank = np.zeros(len(i), dtype=np.int64)
+    else:
+        cols = max(1, int(math.ceil(width / cell_size)))
+        rows = max(1, int(math.ceil(height / cell_size)))
+        cell_x = np.clip((x // cell_size).astype(np.int64), 0, cols - 1)
+        cell_y = np.clip((y // cell_size).astype(np.int64), 0, rows - 1)
+        neighbour_rank = (cell_x[j] - cell_x[i] + 1) * 3 + (cell_y[j] - cell_y[i] + 1)
+    group = np.zeros(len(ids), dtype=np.int64) if group is None else group
+    order = np.lexsort((ids[j], neighbour_rank, ids[i], group[i]))
+    if return_index:
+        return i[order], j[order], index[order]
+    return i[order], j[order]
+
+
+def _spread_bits(n):
+    # 16 bit integer -> the same bits with a zero between each of them
+    n = n & 0xFFFF
+    n = (n | (n << 8)) & 0x00FF00FF
+    n = (n | (n << 4)) & 0x0F0F0F0F
+    n = (n | (n << 2)) & 0x33333333
+    return (n | (n << 1)) & 0x55555555
+
+
+def spatial_order(x, y, cell_size, width, height, curve="morton"):
+    """Order of the particles along each row of x, y that puts neighbours next to each other in memory.
+
+    "cell" sorts by grid cell row by row, "morton" along a Z-order curve over the
+    cells, which also keeps cells of neighbouring rows close.
+    """
+    cols = max(1, int(math.ceil(width / cell_size)))
+    rows = max(1, int(math.ceil(height / cell_size)))
+    cell_x = np.clip((x // cell_size).astype(np.int64), 0, cols - 1)
+    cell_y = np.clip((y // cell_size).astype(np.int64), 0, rows - 1)
+    if curve == "morton":
+        key = _spread_bits(cell_x) | (_spread_bits(cell_y) << 1)
+    else:
+        key = cell_y * cols + cell_x
+    return np.argsort(key, axis=-1, kind="stable")
+
+
+def all_pairs(n, n_groups=1):
+    """Every pair inside each group of n particles (the base script's O(N^2) loop)."""
+    i, j = np.triu_indices(n, k=1)
+    offsets = np.arange(n_groups)[:, None] * n
+    return (i[None, :] + offsets).ravel(), (j[None, :] + offsets).ravel()
+
+
+# --- Lees-Edwards Images ---
+# In a sheared periodic box the copy of the box above slides by +offset in x (and moves
+# at +shear velocity), the copy below by -offset. Particles close to an edge get ghost
+# copies on the other side, so the same grid search finds pairs across the edges.
+def lees_edwards_images(x, y, cutoff, width, height, offset):
+    """Positions of every particle plus its ghosts within `cutoff` of the box, and the original index of each."""
+    index = np.arange(len(x))
+    near_top = y < cutoff
+    near_bottom = y >= height - cutoff
+    # A dot near the top reappears below the box (in the lower copy, shifted by -offset)
+    xs = np.concatenate([x, (x[near_top] - offset) % width, (x[near_bottom] + offset) % width])
+    ys = np.concatenate([y, y[near_top] + height, y[near_bottom] - height])
+    source = np.concatenate([index, index[near_top], index[near_bottom]])
+
+    near_left = xs < cutoff
+    near_right = xs >= width - cutoff
+    xs = np.concatenate([xs, xs[near_left] + width, xs[near_right] - width])
+    ys = np.concatenate([ys, ys[near_left], ys[near_right]])
+    source = np.concatenate([source, source[near_left], source[near_right]])
+    return xs, ys, source
+
+
+def find_pairs_lees_edwards(x, y, cell_size, width, height, offset, group=None, n_groups=1, search=None):
+    """Like find_pairs, but pairs also reach across the periodic, sheared edges.
+
+    `search(xs, ys, source, width, height, group)` finds the pairs among the images
+    (`source` is the original index of each image), find_pairs by default.
+    """
+    n = len(x)
+    xs, ys, source = lees_edwards_images(x, y, cell_size, width, height, offset)
+    if group is not None:
+        group = group[source]
+    if search is None:
+        def search(xs, ys, source, width, height, group):
+            return find_pairs(xs, ys, cell_size, width, height, group, n_groups)
+    # Shift so the ghosts are inside the box
+    i, j = search(xs + cell_size, ys + cell_size, source, width + 2 * cell_size, height + 2 * cell_size, group)
+    real = (i < n) | (j < n)
+    i, j = source[i[real]], source[j[real]]
+    # The same pair can be found through several images
+    keep = i != j
+    low, high = np.minimum(i[keep], j[keep]), np.maximum(i[keep], j[keep])
+    key = np.unique(low * n + high)
+    return key // n, key % n
+
+
+def lees_edwards_separation(dx, dy, width, height, offset):
+    """Minimum image of the displacements dx, dy. Also returns how many boxes up or down the image is."""
+    crossings = np.round(dy / height)
+    dy = dy - crossings * height
+    dx = dx + crossings * offset
+    dx = dx - np.round(dx / width) * width
+    return dx, dy, crossings
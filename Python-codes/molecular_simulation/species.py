@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def species_entries(config):
+    """The SPECIES list with the defaults filled in (one entry per species)."""
+    entries = []
+    for index, entry in enumerate(config["SPECIES"]):
+        radius = entry["radius"]
+        mass = entry.get("mass")
+        if mass is None:
+            mass = radius**2 if config["MASS_MODEL"] == "area" else 1.0
+        entries.append({
+            "name": entry.get("name", f"species {index}"),
+            "fraction": entry.get("fraction", 1.0),
+            "radius": float(radius),
+            "mass": float(mass),
+            "color": tuple(entry.get("color", config["DOT_COLOR"])),
+            "region": entry.get("region", "all"),
+        })
+    return entries
+
+
+def species_counts(fractions, total):
+    """Dots per species: the fractions (normalized) of `total`, rounded so they add up."""
+    fractions = np.asarray(fractions, dtype=float)
+    bounds = np.round(np.cumsum(fractions) / fractions.sum() * total).astype(np.int64)
+    return np.diff(np.concatenate([[0], bounds]))
+
+
+# --- Species Table ---
+# Every dot has an int species index. What a collision needs from a pair only depends
+# on the two species, so it is looked up in S x S tables made once at the start:
+#   pair_contact[a, b]       distance at which dots of species a and b touch
+#   pair_reduced_mass[a, b]  m_a m_b / (m_a + m_b), the momentum a collision exchanges
+#                            is 2 * reduced mass * normal speed
+#   inverse_mass[a]          turns that momentum back into a speed change
+class SpeciesTable:
+    def __init__(self, config):
+        entries = species_entries(config)
+        self.names = [entry["name"] for entry in entries]
+        self.regions = [entry["region"] for entry in entries]
+        self.counts = species_counts([entry["fraction"] for entry in entries], config["NUM_DOTS"])
+        self.radius = np.array([entry["radius"] for entry in entries])
+        self.mass = np.array([entry["mass"] for entry in entries])
+        self.colors = np.array([entry["color"] for entry in entries], dtype=np.uint8)
+
+        self.pair_contact = self.radius[:, None] + self.radius[None, :]
+        self.pair_reduced_mass = self.mass[:, None] * self.mass[None, :] / (self.mass[:, None] + self.mass[None, :])
+        self.inverse_mass = 1.0 / self.mass
+
+    def __len__(self):
+        return len(self.names)
+
+    def species_of_dots(self):
+        """Species index of every dot, the species in order of the table."""
+        return np.repeat(np.arange(len(self), dtype=np.int8), self.counts)
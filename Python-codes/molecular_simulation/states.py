@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+STATE_VERSION = 2
+STATE_FIELDS = ("x", "y", "radius", "mass", "species")
+# What the dots start in: the equilibrium positions of hard dots depend on these, not on the temperature
+STRUCTURE_KEYS = ("NUM_DOTS", "SPECIES", "MIN_DOT_RADIUS", "MAX_DOT_RADIUS", "MASS_MODEL",
+                  "CONTAINER_WIDTH", "CONTAINER_HEIGHT", "BOUNDARY", "SPAWN_REGION",
+                  "COLLISION_MODEL", "STEPS_PER_FRAME", "TIME_STEP", "WARM_START_FRAMES")
+ELASTIC_WALLS = ("flip", "clamp", "specular")
+EQUILIBRATION_PACE = 0.5  # Distance the dots move per frame while equilibrating, in MAX_DOT_RADIUS
+
+
+def starting_obstacles(config):
+    """The obstacles there at time 0, kept for good."""
+    shapes = []
+    for shape in config["OBSTACLES"]:
+        until_ms = shape.get("until_ms")
+        if shape.get("from_ms", 0) <= 0 and (until_ms is None or until_ms > 0):
+            shapes.append({key: value for key, value in shape.items() if key not in ("from_ms", "until_ms")})
+    return shapes
+
+
+def state_key(config):
+    """Hash of what an equilibrated state depends on: the dots, the box and what is in it at time 0."""
+    partition = config["PARTITION"] if config["PARTITION_DURATION_MS"] > 0 else None
+    structure = {key: config[key] for key in STRUCTURE_KEYS}
+    structure.update(version=STATE_VERSION, obstacles=starting_obstacles(config), partition=partition,
+                     partition_x=config["PARTITION_X"] if partition else None,
+                     partition_thickness=config["PARTITION_THICKNESS"] if partition else None)
+    return hashlib.sha256(json.dumps(structure, sort_keys=True).encode()).hexdigest()
+
+
+def equilibration_config(config):
+    """The scenario with nothing that drives it: elastic walls, no shear, no speed ramp,
+    and the partition and obstacles of time 0 held in place. The energy stays put, so
+    the dots relax to equilibrium at the temperature they start with."""
+    from .config import build_config
+
+    values = {key: value for key, value in config.items()
+              if key not in ("SCENARIO", "CELL_SIZE", "HGRID_LEVELS", "OUTPUT")}
+    for side in ("LEFT", "RIGHT", "TOP", "BOTTOM"):
+        if values[f"{side}_WALL"] not in ELASTIC_WALLS:
+            values[f"{side}_WALL"] = "specular"
+    values.update(WARM_START=None, RECORD_VIDEO=False, SHEAR_VELOCITY=0.0, SHEAR_THERMOSTAT=False,
+                  INITIAL_SPEED_MULTIPLIER=1.0, FINAL_SPEED_MULTIPLIER=1.0, TIME_TO_REACH_FINAL_SPEED_MS=0,
+                  OBSTACLES=starting_obstacles(config))
+    if config["PARTITION_DURATION_MS"] > 0:
+        values["PARTITION_DURATION_MS"] = float("inf")
+    return build_config(config["SCENARIO"], values)
+
+
+def equilibrate(config, replicas, rng):
+    """(replicas, NUM_DOTS) arrays of STATE_FIELDS after WARM_START_FRAMES of equilibration.
+
+    The positions hard dots settle in don't depend on how fast they move, so a slow
+    scenario is sped up (speed multiplier) until the dots cover EQUILIBRATION_PACE * MAX_DOT_RADIUS per frame.
+    """
+    from .runner import make_simulation
+
+    equilibrium = equilibration_config(config)
+    sim = make_simulation(equilibrium, "array", replicas, rng)
+    typical_speed = np.sqrt(np.mean(sim.speed_x**2 + sim.speed_y**2))
+    equilibrium["FINAL_SPEED_MULTIPLIER"] = EQUILIBRATION_PACE * config["MAX_DOT_RADIUS"] / max(typical_speed, 1e-12)
+    for _ in range(config["WARM_START_FRAMES"]):
+        sim.step()
+    order = np.argsort(sim.ids, axis=1)  # Back to the order the dots were created in
+    state = {field: np.take_along_axis(getattr(sim, field), order, axis=1) for field in STATE_FIELDS}
+    return {field: values if field == "species" else values.astype(np.float64) for field, values in state.items()}
+
+
+# --- Warm Start Library ---
+# A folder of equilibrated states, one file per state_key. A file holds at least
+# WARM_START_STATES independent states, or as many as the largest ensemble that has
+# asked for it; asking for more equilibrates the missing ones and adds them. The states
+# are made from a generator seeded by the key, so every machine builds the same library.
+# A run picks which of them its replicas start from with its own generator.
+class StateLibrary:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def load(self, config, replicas, rng=None):
+        """Equilibrated STATE_FIELDS for `replicas` replicas, made and saved when missing.
+
+        With `rng` the replicas are a random pick of distinct stored states, otherwise the first ones.
+        """
+        key = state_key(config)
+        stored = None
+        if os.path.exists(self.path(key)):
+            with np.load(self.path(key)) as data:
+                stored = {field: data[field] for field in STATE_FIELDS}
+        have = 0 if stored is None else len(stored["x"])
+        wanted = max(replicas, config["WARM_START_STATES"])
+        if have < wanted:
+            print(f"Equilibrating {wanted - have} warm start state(s) for {config['WARM_START_FRAMES']} frames")
+            seeded = np.random.default_rng([int(key[:16], 16), have])
+            new = equilibrate(config, wanted - have, seeded)
+            stored = new if stored is None else {field: np.concatenate([stored[field], new[field]]) for field in STATE_FIELDS}
+            self.save(key, stored)
+            have = wanted
+        picked = np.arange(replicas) if rng is None else rng.choice(have, replicas, replace=False)
+        return {field: values[picked] for field, values in stored.items()}
+
+    def save(self, key, state):
+        handle, temporary = tempfile.mkstemp(suffix=".npz", dir=self.directory)
+        with os.fdopen(handle, "wb") as f:
+            np.savez(f, **state)
+        os.replace(temporary, self.path(key))
+
+
+def warm_start(config, fresh, rng):
+    """The state a run starts from with WARM_START: equilibrated positions from the library,
+    with the run's own energy.
+
+    `fresh` is the state the run would start from otherwise (simulation.initial_state),
+    each replica keeps its kinetic energy. Which stored states the replicas start from is
+    picked with `rng`. In equilibrium the speeds of hard dots don't depend on where they
+    are: they are drawn from `rng` as a Maxwell distribution (the same temperature for
+    every mass) and scaled to that energy, so runs that pick the same state still part
+    ways at once.
+    """
+    replicas = fresh["x"].shape[0]
+    state = StateLibrary(config["WARM_START"]).load(config, replicas, rng)
+    thermal_x, thermal_y = rng.standard_normal((2,) + state["x"].shape) / np.sqrt(state["mass"])
+    energy = 0.5 * (fresh["mass"] * (fresh["speed_x"]**2 + fresh["speed_y"]**2)).sum(axis=1, keepdims=True)
+    drawn = 0.5 * (state["mass"] * (thermal_x**2 + thermal_y**2)).sum(axis=1, keepdims=True)
+    scale = np.sqrt(energy / np.maximum(drawn, 1e-300))
+    return {
+        "x": state["x"], "y": state["y"], "radius": state["radius"], "mass": state["mass"],
+        "species": state["species"].astype(fresh["species"].dtype),
+        "speed_x": thermal_x * scale, "speed_y": thermal_y * scale,
+    }
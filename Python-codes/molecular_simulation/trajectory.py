@@ -0,0 +1,220 @@
+import io
+import json
+import os
+import time
+import zipfile
+
+import numpy as np
+
+from .replay import CONSTANT_FIELDS, ReplayFrame
+
+TRAJECTORY_VERSION = 1
+POSITION_STEPS = 65535  # uint16 fixed point across the container (plus MAX_DOT_RADIUS on each side)
+SPEED_STEPS = 32767  # int16 fixed point, scaled per chunk
+QUANTIZED_FIELDS = ("x", "y", "speed_x", "speed_y")
+HEADER_FIELDS = ("frame", "time_frames", "shear_offset")
+RAW_BYTES_PER_DOT = 8 * len(QUANTIZED_FIELDS)  # float64 positions and speeds
+COMPRESSIONS = {"deflate": zipfile.ZIP_DEFLATED, "lzma": zipfile.ZIP_LZMA}
+
+
+def position_range(config, axis):
+    """(lowest, span) of the fixed point positions along "x" or "y": dots pushed a little past an edge still fit."""
+    margin = config["MAX_DOT_RADIUS"]
+    length = config["CONTAINER_WIDTH"] if axis == "x" else config["CONTAINER_HEIGHT"]
+    return -margin, length + 2 * margin
+
+
+def delta_encode(quantized):
+    """(frames, dots) 16 bit values -> the first frame, then the change from the frame before (mod 2**16)."""
+    values = quantized.astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=np.zeros((1,) + values.shape[1:], np.int64))
+    return ((deltas + 32768) % 65536 - 32768).astype(np.int16)
+
+
+def delta_decode(deltas):
+    """Inverse of delta_encode, as int64 values in 0 .. 2**16 - 1."""
+    return np.cumsum(deltas.astype(np.int64), axis=0) % 65536
+
+
+def _write_array(archive, name, array):
+    with archive.open(name, "w") as f:
+        np.lib.format.write_array(f, np.asarray(array), allow_pickle=False)
+
+
+def _read_array(archive, name):
+    with archive.open(name) as f:
+        return np.lib.format.read_array(io.BytesIO(f.read()), allow_pickle=False)
+
+
+# --- Trajectory Writer ---
+# A trajectory is a zip file: meta.json, the per-dot constants (radius, mass, species)
+# and one folder per chunk of `chunk_frames` frames. Each member is compressed on its
+# own, so a chunk can be read without the rest of the file. Inside a chunk:
+#   positions  uint16 fixed point, POSITION_STEPS across the container and a margin
+#   speeds     int16 fixed point, SPEED_STEPS for the fastest dot of the chunk
+#   the first frame as is (the keyframe), then every frame as the change from the one
+#   before, mod 2**16 so a dot crossing a periodic edge doesn't overflow
+#   collision flags packed to bits, and the frame number / time / shear offset
+# The dots are stored in the order they were created, whatever order the engine keeps them in.
+class TrajectoryWriter:
+    def __init__(self, filename, config, num_dots, chunk_frames=60, compression="deflate"):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression!r}, choose from: {', '.join(COMPRESSIONS)}")
+        self.filename = filename
+        self.config = config
+        self.num_dots = num_dots
+        self.chunk_frames = chunk_frames
+        self.compression = compression
+        self.archive = zipfile.ZipFile(filename, "w", COMPRESSIONS[compression])
+        self.pending = {field: [] for field in QUANTIZED_FIELDS + ("colliding",) + HEADER_FIELDS}
+        self.frames = 0
+        self.chunks = 0
+        self.constant_written = False
+
+    def write(self, sim):
+        """Adds the current frame (replica 0)."""
+        state = sim.snapshot()
+        ids = np.asarray(state["ids"])
+        if not self.constant_written:
+            order = np.argsort(ids)
+            for name in CONSTANT_FIELDS:
+                _write_array(self.archive, f"{name}.npy", np.asarray(state[name])[order])
+            self.constant_written = True
+        for field in QUANTIZED_FIELDS + ("colliding",):
+            values = np.empty(self.num_dots, dtype=np.asarray(state[field]).dtype)
+            values[ids] = state[field]
+            self.pending[field].append(values)
+        self.pending["frame"].append(sim.frame)
+        self.pending["time_frames"].append(sim.time_frames)
+        self.pending["shear_offset"].append(sim.shear_offset)
+        self.frames += 1
+        if len(self.pending["frame"]) == self.chunk_frames:
+            self._write_chunk()
+
+    def _write_chunk(self):
+        pending = {field: np.array(values) for field, values in self.pending.items()}
+        folder = f"chunk{self.chunks:05d}/"
+        for field in ("x", "y"):
+            lowest, span = position_range(self.config, field)
+            quantized = np.round(np.clip((pending[field] - lowest) / span, 0, 1) * POSITION_STEPS)
+            _write_array(self.archive, folder + f"{field}.npy", delta_encode(quantized))
+        speed_scale = max(np.abs(pending["speed_x"]).max(), np.abs(pending["speed_y"]).max(), 1e-12) / SPEED_STEPS
+        for field in ("speed_x", "speed_y"):
+            quantized = np.round(pending[field] / speed_scale).astype(np.int64) % 65536
+            _write_array(self.archive, folder + f"{field}.npy", delta_encode(quantized))
+        _write_array(self.archive, folder + "speed_scale.npy", np.float64(speed_scale))
+        _write_array(self.archive, folder + "colliding.npy", np.packbits(pending["colliding"], axis=1))
+        for field in HEADER_FIELDS:
+            _write_array(self.archive, folder + f"{field}.npy", pending[field])
+        self.pending = {field: [] for field in self.pending}
+        self.chunks += 1
+
+    def close(self):
+        if self.pending["frame"]:
+            self._write_chunk()
+        meta = {
+            "version": TRAJECTORY_VERSION,
+            "scenario": self.config["SCENARIO"],
+            "num_dots": self.num_dots,
+            "frames": self.frames,
+            "chunks": self.chunks,
+            "chunk_frames": self.chunk_frames,
+            "compression": self.compression,
+            "config": {key: value for key, value in self.config.items() if key != "SCENARIO"},
+        }
+        self.archive.writestr("meta.json", json.dumps(meta))
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# --- Trajectory Reader ---
+class TrajectoryReader:
+    def __init__(self, filename):
+        self.filename = filename
+        try:
+            self.archive = zipfile.ZipFile(filename)
+            meta = json.loads(self.archive.read("meta.json"))
+        except (zipfile.BadZipFile, KeyError):
+            raise ValueError(f"{filename} is not a trajectory file") from None
+        if meta["version"] != TRAJECTORY_VERSION:
+            raise ValueError(f"{filename} is trajectory version {meta['version']}, expected {TRAJECTORY_VERSION}")
+        self.meta = meta
+        self.config = dict(meta["config"], SCENARIO=meta["scenario"])
+        self.num_dots = meta["num_dots"]
+        self.frames = meta["frames"]
+        self.chunks = meta["chunks"]
+        self.chunk_frames = meta["chunk_frames"]
+        self.constant = {name: _read_array(self.archive, f"{name}.npy") for name in CONSTANT_FIELDS}
+
+    def read_chunk(self, index):
+        """Decoded arrays of one chunk: (frames, dots) for the dot state, (frames,) for the header."""
+        if not 0 <= index < self.chunks:
+            raise IndexError(f"Chunk {index} out of range, the trajectory has {self.chunks}")
+        folder = f"chunk{index:05d}/"
+        chunk = {}
+        for field in ("x", "y"):
+            lowest, span = position_range(self.config, field)
+            quantized = delta_decode(_read_array(self.archive, folder + f"{field}.npy"))
+            chunk[field] = lowest + quantized * (span / POSITION_STEPS)
+        speed_scale = float(_read_array(self.archive, folder + "speed_scale.npy"))
+        for field in ("speed_x", "speed_y"):
+            quantized = delta_decode(_read_array(self.archive, folder + f"{field}.npy"))
+            chunk[field] = np.where(quantized >= 32768, quantized - 65536, quantized) * speed_scale
+        packed = _read_array(self.archive, folder + "colliding.npy")
+        chunk["colliding"] = np.unpackbits(packed, axis=1, count=self.num_dots).astype(bool)
+        for field in HEADER_FIELDS:
+            chunk[field] = _read_array(self.archive, folder + f"{field}.npy")
+        return chunk
+
+    def iter_frames(self, first_chunk=0, last_chunk=None):
+        """The frames of chunks first_chunk .. last_chunk - 1 as ReplayFrames, for Renderer.draw."""
+        for index in range(first_chunk, self.chunks if last_chunk is None else last_chunk):
+            chunk = self.read_chunk(index)
+            for k in range(len(chunk["frame"])):
+                state = dict(self.constant, **{field: chunk[field][k] for field in QUANTIZED_FIELDS + ("colliding",)})
+                yield ReplayFrame(chunk["frame"][k], chunk["time_frames"][k], chunk["shear_offset"][k], state)
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def trajectory_report(filename):
+    """Size against raw float64 positions and speeds, and how fast the file decodes."""
+    with TrajectoryReader(filename) as reader:
+        start = time.perf_counter()
+        for index in range(reader.chunks):
+            reader.read_chunk(index)
+        seconds = time.perf_counter() - start
+        raw_bytes = reader.frames * reader.num_dots * RAW_BYTES_PER_DOT
+        return {
+            "scenario": reader.meta["scenario"],
+            "frames": reader.frames,
+            "dots": reader.num_dots,
+            "chunks": reader.chunks,
+            "bytes": os.path.getsize(filename),
+            "raw_bytes": raw_bytes,
+            "ratio": raw_bytes / os.path.getsize(filename),
+            "decode_seconds": seconds,
+            "frames_per_second": reader.frames / max(seconds, 1e-12),
+            "raw_megabytes_per_second": raw_bytes / 1e6 / max(seconds, 1e-12),
+            "position_step": tuple(position_range(reader.config, axis)[1] / POSITION_STEPS for axis in ("x", "y")),
+        }
+
+
+def print_trajectory_report(report):
+    print(f"{report['scenario']}: {report['frames']} frames of {report['dots']} dots in {report['chunks']} chunks")
+    print(f"  {report['bytes'] / 1e6:.2f} MB, raw float64 positions and speeds {report['raw_bytes'] / 1e6:.2f} MB"
+          f" ({report['ratio']:.1f}x smaller)")
+    print(f"  decodes at {report['frames_per_second']:.0f} frames/s ({report['raw_megabytes_per_second']:.0f} MB/s of raw state)")
+    print(f"  position step {report['position_step'][0]:.4f} x {report['position_step'][1]:.4f} px")
@@ -0,0 +1,183 @@
+import math
+
+import numpy as np
+
+from .observables import temperature_profile, velocity_profile
+
+SHEAR_WALLS = ("moving", "diffuse")
+Z_95 = 1.96  # Normal quantile of a 95% interval
+
+
+# --- Streaming Statistics ---
+# Running mean and covariance (Welford) of the (flux, gradient) pair of every batch,
+# so the memory stays the same however long the run is.
+class RunningCovariance:
+    def __init__(self, size):
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros((size, size))
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += np.outer(delta, values - self.mean)
+
+    @property
+    def covariance(self):
+        return self.m2 / max(self.count - 1, 1)
+
+
+def wall_temperature(config, side):
+    """What sets the temperature of a wall: "hot", "cold", a diffuse wall's temperature, or None."""
+    kind = config[f"{side}_WALL"]
+    if kind == "diffuse":
+        return config[f"{side}_WALL_TEMPERATURE"]
+    return kind if kind in ("hot", "cold") else None
+
+
+def fit_slope(profile, length, edge_bins):
+    """Slope of a binned profile over its length, leaving out `edge_bins` at each end."""
+    bins = len(profile)
+    centers = (np.arange(bins) + 0.5) * length / bins
+    keep = slice(edge_bins, bins - edge_bins)
+    centers, profile = centers[keep], profile[keep]
+    valid = ~np.isnan(profile)
+    if valid.sum() < 2:
+        return np.nan
+    return np.polyfit(centers[valid], profile[valid], 1)[0]
+
+
+# --- Transport Coefficient ---
+# One coefficient = flux / -gradient. The flux comes from the running totals of the
+# engine (energy or momentum given by the walls / the Lees-Edwards edge), the gradient
+# from a straight line through the binned profile. Every `batch` frames both are
+# averaged over the replicas and added to the running covariance; the ratio of the
+# means is the estimate, its confidence interval comes from the batch spread (delta method).
+class TransportCoefficient:
+    def __init__(self, name, flux, profile, length, edge_bins, bins):
+        self.name = name
+        self.flux = flux  # sim -> running total of the flux per replica (already divided by the area)
+        self.profile = profile
+        self.length = length
+        self.edge_bins = edge_bins
+        self.bins = bins
+        self.stats = RunningCovariance(2)
+        self.start_flux = None
+        self.start_time = 0.0
+        self.profile_sum = np.zeros(bins)
+        self.profile_count = 0
+
+    def start_batch(self, sim):
+        self.start_flux = self.flux(sim).copy()
+        self.start_time = sim.motion_time
+        self.profile_sum[:] = 0
+        self.profile_count = 0
+
+    def sample(self, sim):
+        with np.errstate(invalid="ignore"):
+            profile = np.nanmean(self.profile(sim, self.bins), axis=0)
+        self.profile_sum += np.nan_to_num(profile)
+        self.profile_count += 1
+
+    def end_batch(self, sim):
+        elapsed = sim.motion_time - self.start_time
+        if elapsed <= 0 or self.profile_count == 0:
+            return
+        flux = np.mean(self.flux(sim) - self.start_flux) / elapsed
+        gradient = fit_slope(self.profile_sum / self.profile_count, self.length, self.edge_bins)
+        if not np.isnan(gradient):
+            self.stats.add((flux, gradient))
+
+    def estimate(self):
+        """(value, half width of the 95% interval, batches), nan until there are two batches."""
+        stats = self.stats
+        if stats.count < 2:
+            return math.nan, math.nan, stats.count
+        flux, gradient = stats.mean
+        if gradient == 0:
+            return math.nan, math.nan, stats.count
+        value = float(-flux / gradient)
+        # Delta method for the ratio of two correlated means
+        var_flux, cov, var_gradient = stats.covariance[0, 0], stats.covariance[0, 1], stats.covariance[1, 1]
+        variance = (var_flux + 2 * value * cov + value**2 * var_gradient) / gradient**2 / stats.count
+        return value, Z_95 * math.sqrt(max(variance, 0.0)), stats.count
+
+
+class TransportEstimator:
+    """Thermal conductivity and / or viscosity of an ArraySimulation, whichever the walls drive.
+
+    Call update(sim) after every step. Batches of `batch_frames` frames start after
+    `warmup_frames`; a batch is one sample of flux and gradient averaged over the replicas.
+    """
+
+    def __init__(self, sim, batch_frames=None, warmup_frames=0, bins=20, min_batches=10):
+        config = sim.config
+        self.batch_frames = batch_frames or config["FPS"]
+        self.warmup_frames = warmup_frames
+        self.min_batches = min_batches
+        self.coefficients = []
+        self.batch_start = None
+
+        edge_bins = max(1, bins // 10)  # Leave out the temperature / velocity jump next to the walls
+        left, right = wall_temperature(config, "LEFT"), wall_temperature(config, "RIGHT")
+        if left is not None and right is not None and left != right:
+            # Heat flowing left to right: half of what the left wall gives plus half of what the right wall takes
+            def heat_flux(sim):
+                return (sim.wall_energy["LEFT"] - sim.wall_energy["RIGHT"]) / (2 * sim.height)
+            self.coefficients.append(TransportCoefficient(
+                "thermal_conductivity", heat_flux, temperature_profile, sim.width, edge_bins, bins))
+        if sim.lees_edwards:
+            def shear_flux(sim):
+                return sim.shear_momentum / sim.width
+            self.coefficients.append(TransportCoefficient(
+                "viscosity", shear_flux, velocity_profile, sim.height, 0, bins))
+        elif config["TOP_WALL"] in SHEAR_WALLS or config["BOTTOM_WALL"] in SHEAR_WALLS:
+            # x momentum flowing from the top to the bottom, averaged over the height: what the
+            # top wall gives less what the side walls take on its way down, and / or the same
+            # for the bottom wall. Averaged over the walls that shear, a specular wall gives none.
+            sides = [(side, sign) for side, sign in (("TOP", 1), ("BOTTOM", -1)) if config[f"{side}_WALL"] in SHEAR_WALLS]
+
+            def wall_shear_flux(sim):
+                flux = sum(sign * (sim.wall_momentum[side] + sim.side_momentum[side]) for side, sign in sides)
+                return flux / (len(sides) * sim.width)
+            self.coefficients.append(TransportCoefficient(
+                "viscosity", wall_shear_flux, velocity_profile, sim.height, edge_bins, bins))
+
+    def update(self, sim):
+        if not self.coefficients or sim.frame < self.warmup_frames:
+            return
+        if self.batch_start is None:
+            self.batch_start = sim.frame
+            for coefficient in self.coefficients:
+                coefficient.start_batch(sim)
+            return
+        for coefficient in self.coefficients:
+            coefficient.sample(sim)
+        if sim.frame - self.batch_start >= self.batch_frames:
+            for coefficient in self.coefficients:
+                coefficient.end_batch(sim)
+                coefficient.start_batch(sim)
+            self.batch_start = sim.frame
+
+    def estimates(self):
+        return {coefficient.name: coefficient.estimate() for coefficient in self.coefficients}
+
+    def precise_enough(self, target):
+        """True once every coefficient's 95% half width is below `target` times its value."""
+        if not self.coefficients:
+            return False
+        for value, half_width, batches in self.estimates().values():
+            if batches < self.min_batches or not half_width <= target * abs(value):
+                return False
+        return True
+
+
+def print_estimates(estimates):
+    for name, (value, half_width, batches) in estimates.items():
+        label = name.replace("_", " ").capitalize()
+        if math.isnan(value):
+            print(f"{label}: not enough data ({batches} batches)")
+        else:
+            print(f"{label}: {value:.4g} +/- {half_width:.2g} (95%, {batches} batches, pixel / frame units)")
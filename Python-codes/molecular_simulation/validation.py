@@ -0,0 +1,206 @@
+import math
+
+import numpy as np
+
+from .config import build_config
+from .engine import ArraySimulation
+from .observables import kinetic_energy, momentum, momentum_scale
+from .runner import make_simulation
+
+
+# --- Precision Check ---
+# Runs the same seeded start in float64 and float32 and reports how far the
+# single precision run drifts away, so it can be trusted for bigger systems.
+
+def precision_report(config, frames, seed=0, sample_every=60):
+    """Energy and momentum of a float32 run against the float64 run, every sample_every frames.
+
+    Also returns the memory of each run's dot state, by precision.
+    """
+    runs = {}
+    for precision in ("float64", "float32"):
+        values = {key: value for key, value in config.items() if key != "SCENARIO"}
+        values["PRECISION"] = precision
+        runs[precision] = ArraySimulation(build_config(config["SCENARIO"], values),
+                                          rng=np.random.default_rng(seed))
+    exact, single = runs["float64"], runs["float32"]
+    energy_0 = kinetic_energy(exact)[0]
+    scale_0 = momentum_scale(exact)[0]
+
+    rows = []
+    for frame in range(frames + 1):
+        if frame % sample_every == 0 or frame == frames:
+            energy_64, energy_32 = kinetic_energy(exact)[0], kinetic_energy(single)[0]
+            momentum_64, momentum_32 = momentum(exact)[0], momentum(single)[0]
+            rows.append({
+                "frame": frame,
+                "energy_drift_64": (energy_64 - energy_0) / energy_0,
+                "energy_drift_32": (energy_32 - energy_0) / energy_0,
+                "energy_difference": abs(energy_32 - energy_64) / energy_64,
+                "momentum_difference": float(np.hypot(*(momentum_32 - momentum_64))) / scale_0,
+            })
+        if frame < frames:
+            exact.step()
+            single.step()
+    return rows, {precision: sim.nbytes for precision, sim in runs.items()}
+
+
+def print_precision_report(rows, memory):
+    print(f"{'frame':>7} {'dE/E float64':>14} {'dE/E float32':>14} {'|E32-E64|/E':>13} {'|P32-P64|/P':>13}")
+    for row in rows:
+        print(f"{row['frame']:7} {row['energy_drift_64']:14.3e} {row['energy_drift_32']:14.3e} "
+              f"{row['energy_difference']:13.3e} {row['momentum_difference']:13.3e}")
+    print(f"State memory: {memory['float64'] / 1e6:.2f} MB in float64, {memory['float32'] / 1e6:.2f} MB in float32")
+
+
+# --- Engine Comparison ---
+# Runs small seeded copies of a scenario through the reference Dot loop and a fast
+# engine. Both start from the same state, so over a short horizon every dot can be
+# compared with itself. Collisions make the system chaotic: a rounding difference or
+# a cluster of overlapping dots resolved in another order grows until the runs have
+# nothing in common, so over a long horizon only the statistics (energy, momentum and
+# speed distribution, over several seeds) are compared.
+
+def small_config(config, num_dots):
+    """The scenario with `num_dots` dots, in a container scaled to keep the same density."""
+    if num_dots >= config["NUM_DOTS"]:
+        return config
+    scale = math.sqrt(num_dots / config["NUM_DOTS"])
+    return build_config(config["SCENARIO"], {
+        key: value for key, value in config.items()
+        if key not in ("SCENARIO", "CONTAINER_WIDTH", "CONTAINER_HEIGHT", "PARTITION_X", "CELL_SIZE", "HGRID_LEVELS")
+    }, {
+        "NUM_DOTS": num_dots,
+        "CONTAINER_WIDTH": int(config["CONTAINER_WIDTH"] * scale),
+        "CONTAINER_HEIGHT": int(config["CONTAINER_HEIGHT"] * scale),
+    })
+
+
+def _dot_state(sim):
+    # Snapshot in the order the dots were created, whatever order the engine keeps them in
+    state = sim.snapshot()
+    order = np.argsort(state["ids"])
+    return {key: np.asarray(state[key], dtype=np.float64)[order] for key in ("x", "y", "speed_x", "speed_y", "mass")}
+
+
+def compare_trajectories(config, engine, frames, seed=0, tolerance=1e-6):
+    """Per frame: the largest position / speed difference and the fraction of dots within `tolerance`."""
+    reference = make_simulation(config, "reference", rng=np.random.default_rng(seed))
+    fast = make_simulation(config, engine, rng=np.random.default_rng(seed))
+    rows = []
+    for frame in range(1, frames + 1):
+        reference.step()
+        fast.step()
+        a, b = _dot_state(reference), _dot_state(fast)
+        difference = np.max([np.abs(a[key] - b[key]) for key in ("x", "y", "speed_x", "speed_y")], axis=0)
+        rows.append({"frame": frame, "max_difference": float(difference.max()),
+                     "matching": float(np.mean(difference <= tolerance))})
+    return rows
+
+
+def _run_statistics(sim, frames, warmup_frames, sample_every):
+    energy, momentum_x, momentum_y, speeds = [], [], [], []
+    for frame in range(1, frames + 1):
+        sim.step()
+        if frame <= warmup_frames or frame % sample_every:
+            continue
+        state = _dot_state(sim)
+        mass, speed_x, speed_y = state["mass"], state["speed_x"], state["speed_y"]
+        speed = np.hypot(speed_x, speed_y)
+        scale = np.sum(mass * speed)
+        energy.append(0.5 * np.sum(mass * speed**2) / len(mass))
+        momentum_x.append(np.sum(mass * speed_x) / scale)
+        momentum_y.append(np.sum(mass * speed_y) / scale)
+        speeds.append(speed)
+    return {"energy": np.mean(energy), "momentum_x": np.mean(momentum_x), "momentum_y": np.mean(momentum_y),
+            "speeds": np.concatenate(speeds)}
+
+
+def ks_distance(a, b):
+    """Largest gap between the empirical distribution functions of two samples."""
+    a, b = np.sort(a), np.sort(b)
+    values = np.concatenate([a, b])
+    return float(np.max(np.abs(np.searchsorted(a, values, side="right") / len(a)
+                               - np.searchsorted(b, values, side="right") / len(b))))
+
+
+def compare_statistics(config, engine, frames, seeds=4, seed=0, warmup_frames=None, sample_every=10,
+                       energy_tolerance=0.02, momentum_tolerance=0.02, speed_tolerance=0.05, z=3.0):
+    """Energy per dot, momentum (as a fraction of sum |m v|) and speed distribution of both engines.
+
+    Every seed runs once per engine from the same start, the first `warmup_frames`
+    (default a quarter of the run) are left out. A mean passes when the engines differ
+    by less than `z` standard errors of the per seed differences plus the tolerance
+    (relative for the energy, absolute for the momentum). The speed distributions pass
+    when their Kolmogorov-Smirnov distance is below `speed_tolerance`.
+    """
+    warmup_frames = frames // 4 if warmup_frames is None else warmup_frames
+    runs = {}
+    for name in ("reference", engine):
+        runs[name] = [_run_statistics(make_simulation(config, name, rng=np.random.default_rng(seed + k)),
+                                      frames, warmup_frames, sample_every) for k in range(seeds)]
+
+    results = {}
+    for key in ("energy", "momentum_x", "momentum_y"):
+        reference = np.array([run[key] for run in runs["reference"]])
+        differences = np.array([run[key] for run in runs[engine]]) - reference
+        error = np.std(differences, ddof=1) / math.sqrt(seeds) if seeds > 1 else 0.0
+        tolerance = energy_tolerance * abs(reference.mean()) if key == "energy" else momentum_tolerance
+        difference = abs(differences.mean())
+        results[key] = {"reference": float(reference.mean()), engine: float(reference.mean() + differences.mean()),
+                        "difference": float(difference), "allowed": float(z * error + tolerance),
+                        "ok": bool(difference <= z * error + tolerance)}
+    distance = ks_distance(*(np.concatenate([run["speeds"] for run in runs[name]]) for name in runs))
+    results["speed_distribution"] = {"difference": distance, "allowed": speed_tolerance, "ok": distance <= speed_tolerance}
+    return results
+
+
+# Share of the dots a scenario may have apart from the reference over the short
+# horizon, for one whose engines can't follow the same order; every other scenario
+# has to match dot for dot. None needs it at the moment.
+MIN_MATCHING = {}
+
+
+def compare_engines(config, engine="array", num_dots=200, short_frames=30, long_frames=600, seeds=4, seed=0,
+                    tolerance=1e-6, min_matching=None):
+    """Short horizon trajectories and long horizon statistics of `engine` against the reference.
+
+    The trajectories pass when every dot (or the scenario's MIN_MATCHING, or
+    `min_matching`) is within `tolerance` of the reference on every frame of the
+    short horizon; the first frame that isn't fails them.
+    """
+    if min_matching is None:
+        min_matching = MIN_MATCHING.get(config["SCENARIO"], 1.0)
+    config = small_config(config, num_dots)
+    trajectory = compare_trajectories(config, engine, short_frames, seed, tolerance)
+    statistics = compare_statistics(config, engine, long_frames, seeds, seed)
+    failed_frame = next((row["frame"] for row in trajectory if row["matching"] < min_matching), None)
+    return {
+        "scenario": config["SCENARIO"],
+        "engine": engine,
+        "num_dots": config["NUM_DOTS"],
+        "trajectory": trajectory,
+        "min_matching": min_matching,
+        "failed_frame": failed_frame,
+        "trajectory_ok": failed_frame is None,
+        "statistics": statistics,
+        "ok": failed_frame is None and all(check["ok"] for check in statistics.values()),
+    }
+
+
+def print_engine_report(report):
+    trajectory = report["trajectory"]
+    diverged = next((row["frame"] for row in trajectory if row["matching"] < 1), None)
+    print(f"{report['scenario']}: {report['engine']} engine against the reference, {report['num_dots']} dots")
+    required = "every dot" if report["min_matching"] >= 1 else f"{report['min_matching']:.0%} of the dots"
+    failed = "" if report["failed_frame"] is None else f", failed at frame {report['failed_frame']}"
+    print(f"  trajectories: {'no dot apart' if diverged is None else f'first dot apart at frame {diverged}'}, "
+          f"{trajectory[-1]['matching']:.1%} of the dots match after {trajectory[-1]['frame']} frames "
+          f"(largest difference {trajectory[-1]['max_difference']:.2g}, {required} must match{failed})  "
+          f"{'ok' if report['trajectory_ok'] else 'FAIL'}")
+    for name, check in report["statistics"].items():
+        values = ""
+        if "reference" in check:
+            values = f"reference {check['reference']:.4g}, {report['engine']} {check[report['engine']]:.4g}, "
+        print(f"  {name.replace('_', ' ')}: {values}difference {check['difference']:.3g} "
+              f"(allowed {check['allowed']:.3g})  {'ok' if check['ok'] else 'FAIL'}")
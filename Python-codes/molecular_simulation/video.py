@@ -0,0 +1,19 @@
+import cv2
+
+
+# Video recording using OpenCV
+class VideoWriter:
+    def __init__(self, filename, fps, size):
+        self.filename = filename
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # Codec for .mp4
+        self.video = cv2.VideoWriter(filename, fourcc, fps, size)
+        if not self.video.isOpened():
+            raise OSError(f"Could not open {filename} for writing")
+        print(f"Recording video to {filename}...")
+
+    def write(self, frame_bgr):
+        self.video.write(frame_bgr)
+
+    def release(self):
+        self.video.release()  # Finalize the video file
+        print(f"Video saved to {self.filename}")
@@ -0,0 +1,98 @@
+import numpy as np
+
+SIDES = ("LEFT", "RIGHT", "TOP", "BOTTOM")
+
+
+# --- Wall Kernels ---
+# Every kernel handles all the dots that hit one wall in one masked operation.
+#   hit:      flat indices of the dots touching the wall
+#   position: flat coordinate across the wall (x for left / right, y for top / bottom)
+#   normal:   flat speed across the wall, tangent: flat speed along it
+#   limit:    the position of each dot when it just touches the wall
+#   randoms:  this step's (rows, hits) uniform numbers for random walls
+# Any kernel works on any side, the Wall object knows which way is inside.
+
+def flip_wall(wall, hit, position, normal, tangent, limit, mass, randoms):
+    normal[hit] *= -1
+
+
+def clamp_wall(wall, hit, position, normal, tangent, limit, mass, randoms):
+    position[hit] = limit[hit]  # Prevent sticking
+    normal[hit] *= -1
+
+
+def specular_wall(wall, hit, position, normal, tangent, limit, mass, randoms):
+    position[hit] = limit[hit]
+    normal[hit] = wall.inward * np.abs(normal[hit])
+
+
+def thermal_wall(wall, hit, position, normal, tangent, limit, mass, randoms):
+    # Hot / cold walls of the thermal-conductivity script: bounce, then a new random
+    # speed around the wall's target, keeping the direction
+    specular_wall(wall, hit, position, normal, tangent, limit, mass, randoms)
+    low, high = wall.speed_range
+    new_speed = np.maximum(low + (high - low) * randoms[0], 0.1)
+
+    current_speed = np.hypot(normal[hit], tangent[hit])
+    moving = current_speed > 1e-6
+    factor = new_speed[moving] / current_speed[moving]
+    normal[hit[moving]] *= factor
+    tangent[hit[moving]] *= factor
+
+    # A dot standing still gets a random direction
+    resting = ~moving
+    angle = 2 * np.pi * randoms[1][resting]
+    normal[hit[resting]] = new_speed[resting] * np.cos(angle)
+    tangent[hit[resting]] = new_speed[resting] * np.sin(angle)
+
+
+def moving_wall(wall, hit, position, normal, tangent, limit, mass, randoms):
+    # Bounce, and the dot leaves with the wall's speed along it (viscosity script)
+    specular_wall(wall, hit, position, normal, tangent, limit, mass, randoms)
+    tangent[hit] = wall.velocity
+
+
+def diffuse_wall(wall, hit, position, normal, tangent, limit, mass, randoms):
+    # Diffuse (Maxwell) wall: the dot forgets its speed and leaves with a new one drawn
+    # from the wall's temperature, the flux weighted distribution across the wall and
+    # a normal distribution around the wall's velocity along it.
+    position[hit] = limit[hit]
+    sigma = np.sqrt(wall.temperature / mass[hit])
+    normal[hit] = wall.inward * sigma * np.sqrt(-2 * np.log1p(-randoms[0]))
+    tangent[hit] = wall.velocity + sigma * np.sqrt(-2 * np.log1p(-randoms[1])) * np.cos(2 * np.pi * randoms[2])
+
+
+WALL_KERNELS = {
+    "flip": flip_wall,
+    "clamp": clamp_wall,
+    "specular": specular_wall,
+    "hot": thermal_wall,
+    "cold": thermal_wall,
+    "moving": moving_wall,
+    "diffuse": diffuse_wall,
+}
+
+# Uniform numbers a kernel uses per hit
+RANDOMS_PER_HIT = {"hot": 2, "cold": 2, "diffuse": 3}
+
+
+class Wall:
+    """One side of the container: the kernel for its hits and the kernel's settings."""
+
+    def __init__(self, config, side):
+        self.side = side
+        self.kind = config[f"{side}_WALL"]
+        self.kernel = WALL_KERNELS[self.kind]
+        self.axis = "x" if side in ("LEFT", "RIGHT") else "y"
+        self.inward = 1 if side in ("LEFT", "TOP") else -1
+        self.velocity = config[f"{side}_WALL_VELOCITY"]
+        self.temperature = config[f"{side}_WALL_TEMPERATURE"]
+        if self.kind in ("hot", "cold"):
+            target = config["HOT_WALL_TARGET_SPEED" if self.kind == "hot" else "COLD_WALL_TARGET_SPEED"]
+            self.speed_range = (target * (1 - config["SPEED_RANDOM_FACTOR"]),
+                                target * (1 + config["SPEED_RANDOM_FACTOR"]))
+
+
+def random_rows(config):
+    """Uniform numbers per dot and axis the walls need each step (0 when none are random)."""
+    return max(RANDOMS_PER_HIT.get(config[f"{side}_WALL"], 0) for side in SIDES)